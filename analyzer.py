@@ -0,0 +1,814 @@
+"""Headless transcript analysis pipeline.
+
+Everything needed to analyze transcripts without the Streamlit UI: model
+loading, the extraction, summary, sentiment and SOAP stages, and batch
+processing. Models are loaded once per process and shared by every
+``TranscriptAnalyzer``. The Streamlit app and the command-line entry point in
+``cli.py`` are both thin clients of this module.
+
+SpaCy and Transformers are imported lazily by the model loaders, so importing
+this module is cheap; ``TranscriptAnalyzer.start_loading`` loads both models
+concurrently on background threads.
+"""
+import logging
+import os
+import subprocess
+import sys
+from concurrent.futures import Future
+from contextlib import nullcontext
+from functools import lru_cache
+from itertools import islice, tee
+
+from batch_scheduler import BatchScheduler, length_ordered_batches
+from keyword_matcher import DEFAULT_LEXICON_PATH, medical_matcher
+from model_registry import ModelRegistry
+from near_duplicates import DuplicateIndex
+from result_cache import ResultCache, config_fingerprint
+from speaker_turns import DEFAULT_SPEAKER_LABELS
+from sentiment_backends import load_sentiment_pipeline
+from transcript_context import TranscriptContext, pack, parse_contexts
+from turn_cache import TurnCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'spacy_model': 'en_core_web_sm',  # Use the smaller model by default to save memory
+    'sentiment_model': 'distilbert-base-uncased',
+    'sentiment_backend': 'pytorch',  # pytorch, pytorch-int8 or onnx
+    'batch_size': 8,  # For processing larger batches; the starting size in adaptive mode
+    'adaptive_batching': True,  # Grow or shrink batches at runtime to meet the memory budget and latency target
+    'memory_budget_mb': 2048,  # Process RSS the batch pipeline aims to stay under
+    'target_batch_seconds': 2.0,  # Wall time the adaptive scheduler aims for per batch
+    'length_order_batches': 4,  # Batches read ahead and grouped by transcript length; 0 keeps input order
+    'read_ahead': 16,  # Transcripts read and decoded ahead of the batch pipeline on a background thread
+    'workers': 1,  # Worker processes for batch analysis; 1 runs in-process
+    'spacy_n_process': 1,  # Worker processes for SpaCy in batch mode
+    'max_text_length': 512,  # Limit text length for sentiment analysis
+    'sentiment_per_turn': False,  # Score each patient turn separately and aggregate
+    'chunked': False,  # Analyze long transcripts in windows instead of truncating them
+    'chunk_tokens': 384,  # Sentiment model tokens per window in chunked mode
+    'speaker_labels': DEFAULT_SPEAKER_LABELS,  # {speaker: [line prefixes before the colon]}; turns run to the next label
+    'lexicon_path': DEFAULT_LEXICON_PATH,  # Keyword lexicon file, reloaded when it changes
+    'incremental': True,  # Reuse per-turn results when a transcript is re-analyzed after an edit
+    'turn_cache_entries': 20000,  # Turns, keyword scans and sentiment texts kept for incremental runs
+    'prewarm_models': True,  # Run a dummy inference after loading to initialize kernels
+    'model_idle_timeout': 0,  # Unload a shared model unused for this many seconds, even while in use; 0 keeps it
+    'dedup': False,  # Analyze one transcript per cluster of near-duplicates in batches; the rest reuse its SpaCy and sentiment output
+    'dedup_threshold': 0.9,  # Estimated word 5-gram Jaccard similarity from which transcripts are near-duplicates
+    'dedup_max_entries': 10000,  # Cluster representatives (with their results) kept for matching
+    'result_cache': True,  # Persist full results across runs, keyed by content
+    'result_cache_path': os.path.join(os.path.expanduser("~"), ".cache", "physician-notetaker", "results.sqlite3"),
+    'result_cache_max_mb': 256,
+    'job_directory': os.path.join(os.path.expanduser("~"), ".cache", "physician-notetaker", "jobs"),
+    'checkpoint_every': 64,  # Transcripts per job checkpoint; a failing transcript is retried alone within its chunk
+    'job_max_attempts': 2,  # Times a failed transcript is analyzed before a job gives up on it
+    'result_store_path': os.path.join(os.path.expanduser("~"), ".cache", "physician-notetaker", "results_store")
+}
+
+
+# Load the SpaCy model, downloading it if it is missing, and add the component
+# that tags the lexicon's medical terms during the parse
+def load_spacy_model(model_name, lexicon_path=DEFAULT_LEXICON_PATH):
+    import spacy
+    from medical_terms import add_medical_terms
+    
+    try:
+        nlp = spacy.load(model_name)
+    except OSError:
+        logger.warning("SpaCy model '%s' not found. Downloading now...", model_name)
+        subprocess.run([sys.executable, "-m", "spacy", "download", model_name], check=False)
+        nlp = spacy.load(model_name)
+    return add_medical_terms(nlp, lexicon_path)
+
+# Load the Hugging Face sentiment pipeline with the given backend
+def load_sentiment_model(model_name, backend="pytorch"):
+    return load_sentiment_pipeline(model_name, backend)
+
+# Short transcript used to pre-warm freshly loaded models
+WARMUP_TEXT = "Patient: My neck pain started on September 1st, but it's getting better."
+
+def _load_and_warm(kind, model_name, prewarm, options):
+    if kind == "spacy":
+        model = load_spacy_model(model_name, **options)
+        if prewarm:
+            model(WARMUP_TEXT)
+    else:
+        model = load_sentiment_model(model_name, **options)
+        if prewarm:
+            model([WARMUP_TEXT])
+    return model
+
+# Every model loaded in this process, shared by all analyzers (and so by all
+# Streamlit sessions); models are loaded on background threads
+MODEL_REGISTRY = ModelRegistry(_load_and_warm)
+
+# Start loading a model on a background thread, once per process, and return
+# the future of its ``SharedModel``. Extra options (such as the sentiment
+# backend) are passed to the loader and identify the model too. A model
+# loaded this way, without an analyzer holding it, is unloaded once unused.
+def preload_model(kind, model_name, prewarm=False, **options):
+    return MODEL_REGISTRY.acquire(None, kind, model_name, prewarm, **options)
+
+# An already resolved future, for models handed to an analyzer directly
+def _resolved_future(model):
+    future = Future()
+    future.set_result(model)
+    return future
+
+# One result cache per file, shared by every analyzer in the process
+@lru_cache(maxsize=None)
+def open_result_cache(path, max_mb):
+    return ResultCache(path, max_bytes=int(max_mb * 1024 * 1024))
+
+# A transcript's result record: its filename, the "sequence" id its caller
+# tagged it with, if any, and ``fields``. Filenames need not be unique, so
+# callers that match results to transcripts out of order tag them.
+def result_record(transcript_data, fields):
+    record = {"filename": transcript_data["filename"]}
+    if "sequence" in transcript_data:
+        record["sequence"] = transcript_data["sequence"]
+    record.update(fields)
+    return record
+
+# Extraction of medical details; repeated transcripts are served from the
+# persistent result cache instead
+def extract_medical_details(context):
+    # The context parses the transcript (or its windows) with SpaCy once
+    entities = context.entities
+    
+    timeframes = []
+
+    # Extract entities (de-duplicated in order of appearance, so results do not
+    # depend on the process hash seed)
+    for entity in entities:
+        if entity.label in ["DATE", "TIME"]:
+            timeframes.append(entity.text)
+
+    # Medical terms tagged by the SpaCy parse, on token boundaries; with a
+    # pipeline that has no medical_terms component, the keyword scan
+    term_hits = context.term_hits if context.term_hits is not None else context.keyword_hits
+    symptoms = term_hits.labels("symptom")
+    treatments = term_hits.labels("treatment")
+    diagnosis = term_hits.labels("diagnosis")
+
+    return {
+        "Symptoms": symptoms,
+        "Treatment": treatments,
+        "Diagnosis": diagnosis,
+        "Timeframes": list(dict.fromkeys(timeframes))
+    }
+
+# Medical details of a near-duplicate without parsing it: the medical terms
+# of its own text, from a tokenizer-only pass or else the keyword scan, and
+# the timeframes (SpaCy entities) of the transcript whose result it reuses
+def duplicate_medical_details(context, reused_details):
+    term_hits = context.tokenized_term_hits
+    if term_hits is None:
+        term_hits = context.keyword_hits
+    return {
+        "Symptoms": term_hits.labels("symptom"),
+        "Treatment": term_hits.labels("treatment"),
+        "Diagnosis": term_hits.labels("diagnosis"),
+        "Timeframes": reused_details["Timeframes"]
+    }
+
+# Structured summary function
+def structured_summary(medical_details, context):
+    keyword_hits = context.keyword_hits
+    
+    # Earliest lexicon entry wins, otherwise fall back to the default
+    patient_name = keyword_hits.first("patient_name", "Unknown")
+    current_status = keyword_hits.first("status", "Unknown")
+    prognosis = keyword_hits.first("prognosis", "Unknown")
+    
+    return {
+        "Patient_Name": patient_name,
+        "Symptoms": medical_details["Symptoms"],
+        "Diagnosis": medical_details["Diagnosis"][0] if medical_details["Diagnosis"] else "Not specified",
+        "Treatment": medical_details["Treatment"],
+        "Current_Status": current_status,
+        "Prognosis": prognosis
+    }
+
+# Map raw sentiment labels to the desired format
+SENTIMENT_MAP = {
+    'POSITIVE': "Reassured",
+    'NEGATIVE': "Anxious",
+    'NEUTRAL': "Neutral"
+}
+
+# Run texts through the sentiment pipeline in padded minibatches. Texts are
+# sorted by token length so each minibatch pads to a similar length, and the
+# classifications are scattered back into input order. With a turn cache,
+# only texts not classified before by the model named ``model_id`` are run.
+def classify_in_batches(sentiment_model, texts, batch_size=8, turn_cache=None, model_id=""):
+    results = [None] * len(texts)
+    keys = None
+    if turn_cache is not None:
+        keys = [turn_cache.key("sentiment", model_id, text) for text in texts]
+        results = [turn_cache.get(key) for key in keys]
+    missing = [index for index, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+    
+    token_ids = sentiment_model.tokenizer([texts[index] for index in missing], truncation=True)["input_ids"]
+    order = [missing[position] for position in sorted(range(len(missing)), key=lambda position: len(token_ids[position]))]
+    
+    classifications = sentiment_model(
+        [texts[index] for index in order],
+        batch_size=batch_size,
+        truncation=True
+    )
+    
+    for index, classification in zip(order, classifications):
+        results[index] = classification
+        if keys is not None:
+            turn_cache.put(keys[index], classification)
+    return results
+
+# Combine per-turn classifications into one, weighting each turn by its length
+def aggregate_classifications(classifications, weights):
+    totals = {}
+    for classification, weight in zip(classifications, weights):
+        totals[classification['label']] = totals.get(classification['label'], 0.0) + weight * classification['score']
+    
+    label = max(totals, key=totals.get)
+    return {'label': label, 'score': totals[label] / sum(weights)}
+
+# The patient's turns packed into windows of at most ``budget`` tokens of the
+# sentiment model, cut at turn boundaries; a longer turn is split between words
+def patient_windows(context, tokenizer, budget):
+    turn_texts = [text for text in context.turns.texts("Patient") if text]
+    if not turn_texts:
+        return []
+    
+    pieces = []
+    sizes = []
+    for text, token_ids in zip(turn_texts, tokenizer(turn_texts)["input_ids"]):
+        if len(token_ids) <= budget:
+            pieces.append(text)
+            sizes.append(len(token_ids))
+            continue
+        words = text.split()
+        step = max(1, len(words) * budget // len(token_ids))
+        for index in range(0, len(words), step):
+            pieces.append(" ".join(words[index:index + step]))
+            sizes.append(budget)
+    return [" ".join(group) for group in pack(pieces, sizes, budget)]
+
+# Batched sentiment analysis over every transcript in a batch
+def analyze_sentiment_batch(contexts, sentiment_model, batch_size=8, max_text_length=512, per_turn=False,
+                            chunk_tokens=0, turn_cache=None, model_id=""):
+    # Collect the patient text of every transcript: as one blob or one entry
+    # per patient turn, each limited to max_text_length to prevent memory
+    # issues, or (with chunk_tokens) as token-budgeted windows covering all of it
+    texts = []
+    owners = []
+    for owner, context in enumerate(contexts):
+        if chunk_tokens:
+            patient_texts = patient_windows(context, sentiment_model.tokenizer, chunk_tokens)
+        elif per_turn:
+            patient_texts = [text for text in context.turns.texts("Patient") if text]
+        else:
+            # Only the first max_text_length characters are sliced out
+            patient_texts = [context.turns.joined("Patient", max_text_length)]
+        for text in patient_texts or [""]:
+            texts.append(text if chunk_tokens else text[:max_text_length])
+            owners.append(owner)
+    
+    classifications = classify_in_batches(sentiment_model, texts, batch_size, turn_cache, model_id)
+    
+    # Gather each transcript's classifications back together
+    grouped = [([], []) for _ in contexts]
+    for owner, text, classification in zip(owners, texts, classifications):
+        grouped[owner][0].append(classification)
+        grouped[owner][1].append(max(len(text), 1))
+    
+    results = []
+    for context, (transcript_classifications, weights) in zip(contexts, grouped):
+        classification = aggregate_classifications(transcript_classifications, weights)
+        
+        # Rule-based intent detection from the keyword hits in patient lines,
+        # checked in priority order
+        intent = context.patient_hits.first("intent", "Providing information")
+        
+        results.append({
+            "Sentiment": SENTIMENT_MAP.get(classification['label'], "Neutral"),
+            "Intent": intent,
+            "Confidence": classification['score']
+        })
+    return results
+
+# Optimized sentiment analysis for a single transcript
+def analyze_sentiment_and_intent(context, sentiment_model, max_text_length=512, per_turn=False, chunk_tokens=0,
+                                 turn_cache=None, model_id=""):
+    return analyze_sentiment_batch(
+        [context],
+        sentiment_model,
+        max_text_length=max_text_length,
+        per_turn=per_turn,
+        chunk_tokens=chunk_tokens,
+        turn_cache=turn_cache,
+        model_id=model_id
+    )[0]
+
+# SOAP Note Generation with more efficient text processing
+def generate_soap_note(summary, context):
+    keyword_hits = context.keyword_hits
+    
+    # Default values
+    history = "Unknown"
+    physical_exam = "Unknown"
+    assessment = "Unknown"
+    plan = "Unknown"
+    
+    # Extract history information
+    if keyword_hits.has("history"):
+        history = keyword_hits.first("history")
+        if keyword_hits.has("history_date"):
+            history += " in " + keyword_hits.first("history_date")
+    
+    # Check for physical examination
+    physical_exam = keyword_hits.first("examination", physical_exam)
+    
+    # Get assessment from summary
+    if summary["Diagnosis"] != "Not specified":
+        assessment = summary["Diagnosis"]
+    
+    # Treatment plan components
+    plan_components = keyword_hits.labels("plan")
+    
+    if plan_components:
+        plan = ", ".join(plan_components)
+    
+    return {
+        "Subjective": {
+            "Chief_Complaint": ", ".join(summary["Symptoms"]) if summary["Symptoms"] else "Not specified",
+            "History_of_Present_Illness": history
+        },
+        "Objective": {
+            "Physical_Exam": physical_exam,
+            "Observations": "Based on patient's statements"
+        },
+        "Assessment": {
+            "Diagnosis": summary["Diagnosis"],
+            "Severity": keyword_hits.first("severity", "Unknown")
+        },
+        "Plan": {
+            "Treatment": plan,
+            "Follow_Up": "As needed based on symptom progression"
+        }
+    }
+
+
+class TranscriptAnalyzer:
+    """Runs the analysis pipeline with the models named in a config dict.
+
+    The config is read on every call, so changes made to the dict (for
+    example from the Streamlit sidebar) take effect immediately. Models and
+    the result cache are shared through the per-process loaders above: the
+    analyzer holds the models its config names in ``MODEL_REGISTRY`` (or
+    ``registry``) and releases them when the config names others or the
+    analyzer is discarded. An optional ``profiling.StageProfiler`` records
+    the cost of every stage.
+    Models passed as ``nlp`` or ``sentiment_model`` are used instead of the
+    ones named in the config, for example the offline stand-ins in
+    ``benchmarks/stand_ins.py``.
+    """
+
+    def __init__(self, config=None, profiler=None, nlp=None, sentiment_model=None, registry=None):
+        self.config = config if config is not None else dict(DEFAULT_CONFIG)
+        self.profiler = profiler
+        self.registry = registry if registry is not None else MODEL_REGISTRY
+        self._nlp = nlp
+        self._sentiment_model = sentiment_model
+        self._turn_cache = None
+        self._scheduler = None
+        self._duplicate_index = None
+
+    # Acquire the model of ``kind`` the config names from the registry,
+    # releasing the one this analyzer held before, and return its future
+    def _model_future(self, kind):
+        if kind == "spacy":
+            model_name, options = self.config['spacy_model'], {"lexicon_path": self.config['lexicon_path']}
+        else:
+            model_name, options = self.config['sentiment_model'], {"backend": self.config['sentiment_backend']}
+        return self.registry.acquire(
+            self, kind, model_name, self.config['prewarm_models'], self.config['model_idle_timeout'], **options
+        )
+
+    # Kick off background loading of both models; returns immediately
+    def start_loading(self):
+        if self._nlp is not None:
+            spacy_future = _resolved_future(self._nlp)
+        else:
+            spacy_future = self._model_future("spacy")
+        if self._sentiment_model is not None:
+            sentiment_future = _resolved_future(self._sentiment_model)
+        else:
+            sentiment_future = self._model_future("sentiment")
+        return spacy_future, sentiment_future
+
+    # Each model property waits only for its own model to finish loading
+    @property
+    def nlp(self):
+        if self._nlp is not None:
+            return self._nlp
+        return self._model_future("spacy").result()
+
+    @property
+    def sentiment_model(self):
+        if self._sentiment_model is not None:
+            return self._sentiment_model
+        return self._model_future("sentiment").result()
+
+    @property
+    def cache(self):
+        if not self.config['result_cache']:
+            return None
+        return open_result_cache(self.config['result_cache_path'], self.config['result_cache_max_mb'])
+
+    # Per-turn results reused by ``analyze``, or None when incremental mode is off
+    @property
+    def turn_cache(self):
+        if not self.config['incremental']:
+            return None
+        if self._turn_cache is None:
+            self._turn_cache = TurnCache(self.config['turn_cache_entries'])
+        self._turn_cache.max_entries = self.config['turn_cache_entries']
+        return self._turn_cache
+
+    # Batch sizing for ``iter_results``, kept across runs so the sizes it
+    # learned carry over
+    @property
+    def scheduler(self):
+        if self._scheduler is None:
+            self._scheduler = BatchScheduler(self.config['batch_size'])
+        self._scheduler.configure(
+            self.config['batch_size'],
+            self.config['adaptive_batching'],
+            self.config['memory_budget_mb'],
+            self.config['target_batch_seconds']
+        )
+        return self._scheduler
+
+    # Near-duplicate index for ``iter_results``, or None when dedup is off;
+    # kept across runs, and replaced when the settings its results were
+    # produced with change
+    @property
+    def duplicate_index(self):
+        if not self.config['dedup']:
+            return None
+        fingerprint = self.fingerprint()
+        index = self._duplicate_index
+        if (index is None or index.fingerprint != fingerprint or index.threshold != self.config['dedup_threshold']
+                or index.speaker_labels != self.config['speaker_labels']):
+            index = self._duplicate_index = DuplicateIndex(
+                self.config['dedup_threshold'],
+                self.config['dedup_max_entries'],
+                self.config['speaker_labels'],
+                fingerprint
+            )
+        index.max_entries = self.config['dedup_max_entries']
+        return index
+
+    # Identifies the sentiment model in turn cache keys
+    def _sentiment_id(self):
+        if self._sentiment_model is not None:
+            return f"{type(self._sentiment_model).__name__}-{id(self._sentiment_model)}"
+        return f"{self.config['sentiment_model']}:{self.config['sentiment_backend']}"
+
+    # Load both models concurrently and wait for them
+    def load_models(self):
+        spacy_future, sentiment_future = self.start_loading()
+        return spacy_future.result(), sentiment_future.result()
+
+    def model_status(self):
+        status = {}
+        for label, future in zip(("SpaCy", "Sentiment"), self.start_loading()):
+            if not future.done():
+                status[label] = "Loading..."
+            elif future.exception() is not None:
+                status[label] = f"Failed: {future.exception()}"
+            else:
+                status[label] = "Ready"
+        return status
+
+    # The current keyword matcher; fetch it once per run so a lexicon reload
+    # never splits one run between two lexicons
+    @property
+    def matcher(self):
+        return medical_matcher(self.config['lexicon_path'])
+
+    def context(self, transcript_text, turn_cache=None, matcher=None):
+        return TranscriptContext(
+            transcript_text,
+            nlp=self.nlp,
+            matcher=matcher or self.matcher,
+            chunked=self.config['chunked'],
+            turn_cache=turn_cache,
+            speaker_labels=self.config['speaker_labels']
+        )
+
+    # Token budget of the sentiment windows, or 0 when chunked mode is off
+    def _chunk_tokens(self):
+        return self.config['chunk_tokens'] if self.config['chunked'] else 0
+
+    # Identifies the current settings and lexicon in result cache keys. SpaCy
+    # can tag a turn parsed on its own slightly differently than within the
+    # whole transcript, so turn-by-turn results are cached separately
+    def fingerprint(self, spacy_scope="document", matcher=None):
+        return config_fingerprint(self.config, (matcher or self.matcher).fingerprint, spacy_scope)
+
+    # Measures a stage for the given transcript id(s) when profiling is enabled
+    def _stage(self, name, transcripts=None):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name, transcripts)
+
+    # Returns (cache key, cached result or None); the key is None when caching is off
+    def _cache_lookup(self, transcript_text, cache, fingerprint, transcript_id=None):
+        if cache is None:
+            return None, None
+        with self._stage("cache", transcript_id):
+            key = cache.key(transcript_text, fingerprint)
+            return key, cache.get(key)
+
+    # Extraction, summary and SOAP stages for a context whose sentiment is known
+    def _run_stages(self, context, sentiment_analysis, transcript_id=None):
+        with self._stage("extract", transcript_id):
+            medical_details = extract_medical_details(context)
+        with self._stage("summary", transcript_id):
+            summary = structured_summary(medical_details, context)
+        with self._stage("soap", transcript_id):
+            soap_note = generate_soap_note(summary, context)
+        
+        return {
+            "medical_details": medical_details,
+            "summary": summary,
+            "sentiment_analysis": sentiment_analysis,
+            "soap_note": soap_note
+        }
+
+    # Result of a near-duplicate from the result it reuses: the SpaCy
+    # timeframes and the sentiment are kept, and the term and keyword scans,
+    # summary and SOAP note run on the duplicate's own text, so its patient
+    # and clinical fields are never another transcript's. With
+    # ``tokenize=False`` the SpaCy model is not used and terms come from the
+    # keyword scan.
+    def _rebuild_duplicate(self, transcript_data, reused, tokenize=True):
+        transcript_id = transcript_data["filename"]
+        context = TranscriptContext(
+            transcript_data["content"],
+            nlp=self.nlp if tokenize else None,
+            matcher=self.matcher,
+            chunked=self.config['chunked'],
+            speaker_labels=self.config['speaker_labels']
+        )
+        with self._stage("extract", transcript_id):
+            medical_details = duplicate_medical_details(context, reused["medical_details"])
+        with self._stage("summary", transcript_id):
+            summary = structured_summary(medical_details, context)
+        with self._stage("soap", transcript_id):
+            soap_note = generate_soap_note(summary, context)
+        
+        return {
+            "medical_details": medical_details,
+            "summary": summary,
+            "sentiment_analysis": reused["sentiment_analysis"],
+            "soap_note": soap_note
+        }
+
+    # _rebuild_duplicate for the isolated pipelines: a duplicate whose
+    # rebuild raises gets an error record instead of ending the run
+    def _rebuild_isolated(self, transcript_data, reused, tokenize=True):
+        try:
+            return self._rebuild_duplicate(transcript_data, reused, tokenize)
+        except Exception as exc:
+            return {"error": f"{type(exc).__name__}: {exc}"}
+
+    # Full pipeline for a single transcript. In incremental mode SpaCy
+    # entities, keyword hits and sentiment are cached per speaker turn, so
+    # re-analyzing an edited transcript only recomputes the changed turns.
+    def analyze(self, transcript_text, transcript_id=None):
+        turn_cache = self.turn_cache
+        matcher = self.matcher
+        cache = self.cache
+        fingerprint = self.fingerprint("turns" if turn_cache is not None else "document", matcher)
+        key, result = self._cache_lookup(transcript_text, cache, fingerprint, transcript_id)
+        if result is not None:
+            return result
+        
+        context = self.context(transcript_text, turn_cache, matcher)
+        sentiment_model = self.sentiment_model
+        # Parse up front so SpaCy is measured separately from the keyword rules
+        with self._stage("spacy", transcript_id):
+            context.entities
+        with self._stage("sentiment", transcript_id):
+            sentiment_analysis = analyze_sentiment_and_intent(
+                context,
+                sentiment_model,
+                self.config['max_text_length'],
+                self.config['sentiment_per_turn'],
+                self._chunk_tokens(),
+                turn_cache,
+                self._sentiment_id()
+            )
+        result = self._run_stages(context, sentiment_analysis, transcript_id)
+        
+        if cache is not None:
+            cache.put(key, result)
+        return result
+
+    # Streaming batch pipeline. Transcripts may be any iterable, including a
+    # lazy generator; results are yielded in input order as each batch
+    # completes, so memory stays flat however many transcripts are processed.
+    # With dedup on, near-duplicates of a transcript analyzed before reuse its
+    # SpaCy and sentiment output and are flagged with "duplicate_of" (see
+    # near_duplicates.py). A transcript's
+    # "sequence" id, if it has one, is copied to its result.
+    def iter_results(self, transcripts, progress_callback=None):
+        index = self.duplicate_index
+        if index is None:
+            return self._iter_analyzed(transcripts, progress_callback)
+        return index.deduplicate(
+            transcripts, self._iter_analyzed, progress_callback=progress_callback, rebuild=self._rebuild_duplicate
+        )
+    
+    # The pipeline behind iter_results. Transcripts found in the result cache
+    # skip SpaCy and sentiment entirely. Batch sizes come from the scheduler,
+    # which adapts them after every batch to the memory budget and latency
+    # target, and transcripts are batched with others of similar length, read
+    # a few batches ahead.
+    def _iter_analyzed(self, transcripts, progress_callback=None):
+        scheduler = self.scheduler
+        matcher = self.matcher
+        cache = self.cache
+        fingerprint = self.fingerprint(matcher=matcher)
+        nlp = self.nlp
+        chunked = self.config['chunked']
+        speaker_labels = self.config['speaker_labels']
+        
+        # Contexts share the run's model, lexicon and settings
+        def new_context(transcript_data):
+            return TranscriptContext(
+                transcript_data["content"], nlp=nlp, matcher=matcher, chunked=chunked, speaker_labels=speaker_labels
+            )
+        
+        # Batches of (input index, transcript, cache key, cached result),
+        # each input looked up once
+        batches = (
+            [
+                (index, transcript_data) + self._cache_lookup(
+                    transcript_data["content"], cache, fingerprint, transcript_data["filename"]
+                )
+                for index, transcript_data in batch
+            ]
+            for batch in length_ordered_batches(
+                transcripts,
+                lambda: scheduler.batch_size,
+                self.config['length_order_batches'],
+                key=lambda transcript_data: len(transcript_data["content"])
+            )
+        )
+        
+        # SpaCy worker processes start on every nlp.pipe call, so with more
+        # than one, every cache miss streams through a single call at the
+        # starting batch size; otherwise each batch is parsed on its own at
+        # its current size
+        stream = None
+        n_process = self.config['spacy_n_process']
+        if n_process > 1:
+            batches, to_parse = tee(batches)
+            stream = parse_contexts(
+                (
+                    new_context(transcript_data)
+                    for batch in to_parse
+                    for _, transcript_data, _, cached in batch
+                    if cached is None
+                ),
+                nlp,
+                batch_size=scheduler.batch_size,
+                n_process=n_process,
+                chunked=chunked
+            )
+        
+        finished = {}  # input index -> result, until every earlier result is yielded
+        next_index = 0
+        processed = 0
+        for batch in batches:
+            token = scheduler.start()
+            misses = [transcript_data for _, transcript_data, _, cached in batch if cached is None]
+            miss_ids = [transcript_data["filename"] for transcript_data in misses]
+            with self._stage("spacy", miss_ids):
+                if stream is not None:
+                    batch_contexts = list(islice(stream, len(misses)))
+                else:
+                    batch_contexts = list(parse_contexts(
+                        (new_context(transcript_data) for transcript_data in misses),
+                        nlp,
+                        batch_size=scheduler.batch_size,
+                        chunked=chunked
+                    ))
+            
+            # Sentiment runs once for the batch's misses in padded minibatches
+            sentiment_results = []
+            if batch_contexts:
+                sentiment_model = self.sentiment_model
+                with self._stage("sentiment", miss_ids):
+                    sentiment_results = analyze_sentiment_batch(
+                        batch_contexts,
+                        sentiment_model,
+                        scheduler.sentiment_batch_size,
+                        self.config['max_text_length'],
+                        self.config['sentiment_per_turn'],
+                        self._chunk_tokens()
+                    )
+            computed = zip(batch_contexts, sentiment_results)
+            
+            for index, transcript_data, key, result in batch:
+                if result is None:
+                    # Run analysis pipeline
+                    context, sentiment_analysis = next(computed)
+                    result = self._run_stages(context, sentiment_analysis, transcript_data["filename"])
+                    if cache is not None:
+                        cache.put(key, result)
+                
+                finished[index] = result_record(transcript_data, result)
+            
+            processed += len(batch)
+            
+            # Drop the finished batch before the scheduler reads RSS; it
+            # collects garbage only under memory pressure
+            del batch_contexts, sentiment_results, computed
+            scheduler.finish(token, len(batch))
+            del batch
+            
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+            
+            # Report progress as the number of transcripts processed
+            if progress_callback is not None:
+                progress_callback(processed)
+    
+    # Batch processing of an in-memory list, returning every result
+    def process_transcripts_in_batches(self, transcripts, progress_callback=None):
+        total = len(transcripts)
+        fraction_callback = None
+        if progress_callback is not None:
+            fraction_callback = lambda processed: progress_callback(min(1.0, processed / total))
+        return list(self.iter_results(transcripts, fraction_callback))
+
+    # Like process_transcripts_in_batches, but a transcript that raises is
+    # returned as a {"filename", "error"} record instead of failing the batch.
+    # Near-duplicates are found once, before the isolation retries, so a
+    # retried transcript is never matched with its own earlier result.
+    def process_isolated(self, transcripts):
+        index = self.duplicate_index
+        if index is None:
+            return self._process_isolated(transcripts)
+
+        # A generator, so the analysis is timed as the index reads results
+        def analyze(unique):
+            yield from self._process_isolated(list(unique))
+        return list(index.deduplicate(transcripts, analyze, rebuild=self._rebuild_isolated))
+    
+    def _process_isolated(self, transcripts):
+        try:
+            return list(self._iter_analyzed(transcripts))
+        except Exception as exc:
+            if len(transcripts) == 1:
+                return [result_record(transcripts[0], {"error": f"{type(exc).__name__}: {exc}"})]
+        # Retry one transcript at a time so one bad transcript fails alone
+        results = []
+        for transcript_data in transcripts:
+            results.extend(self._process_isolated([transcript_data]))
+        return results
+    
+    # Streaming form of process_isolated: transcripts are read and analyzed
+    # ``chunk_size`` at a time, and a transcript that raises is yielded as a
+    # {"filename", "error"} record. ``progress_callback`` gets the number of
+    # transcripts processed so far.
+    def iter_isolated(self, transcripts, chunk_size=64, progress_callback=None):
+        index = self.duplicate_index
+        if index is None:
+            return self._iter_isolated(transcripts, chunk_size, progress_callback)
+        return index.deduplicate(
+            transcripts,
+            lambda unique: self._iter_isolated(unique, chunk_size),
+            progress_callback=progress_callback,
+            rebuild=self._rebuild_isolated
+        )
+    
+    def _iter_isolated(self, transcripts, chunk_size, progress_callback=None):
+        transcripts = iter(transcripts)
+        processed = 0
+        while True:
+            chunk = list(islice(transcripts, chunk_size))
+            if not chunk:
+                return
+            yield from self._process_isolated(chunk)
+            processed += len(chunk)
+            if progress_callback is not None:
+                progress_callback(processed)
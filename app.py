@@ -1,13 +1,17 @@
 import streamlit as st
-import spacy
-import pandas as pd
 import json
 import os
-import time
-from functools import lru_cache
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-import psutil
+import tempfile
 import gc
+import hashlib
+import time
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from batch_scheduler import get_memory_usage
+from sentiment_backends import SENTIMENT_BACKENDS
+from batch_io import JsonlWriter, iter_transcripts, read_ahead, source_kind
+from batch_jobs import BatchJob
+from process_pool import ProcessPoolAnalyzer
+from profiling import StageProfiler
 
 # Set page configuration
 st.set_page_config(
@@ -77,310 +81,53 @@ perform sentiment analysis, and generate SOAP notes for physicians.
 
 # Initialize configuration in session state
 if 'config' not in st.session_state:
-    st.session_state.config = {
-        'spacy_model': 'en_core_web_sm',  # Use the smaller model by default to save memory
-        'sentiment_model': 'distilbert-base-uncased',
-        'batch_size': 8,  # For processing larger batches
-        'max_text_length': 512  # Limit text length for sentiment analysis
-    }
-
-# Initialize session state for models
-if 'models_loaded' not in st.session_state:
-    st.session_state.models_loaded = False
-    st.session_state.spacy_model = None
-    st.session_state.sentiment_model = None
-
-# Memory monitoring function
-def get_memory_usage():
-    process = psutil.Process(os.getpid())
-    memory_info = process.memory_info()
-    memory_usage_mb = memory_info.rss / 1024 / 1024
-    return memory_usage_mb
-
-# Function to ensure SpaCy model is installed
-@st.cache_resource
-def ensure_spacy_model(model_name):
-    try:
-        return spacy.load(model_name)
-    except OSError:
-        st.warning(f"SpaCy model '{model_name}' not found. Downloading now...")
-        os.system(f"python -m spacy download {model_name}")
-        return spacy.load(model_name)
+    st.session_state.config = dict(DEFAULT_CONFIG)
 
-# Load NLP models with caching
-@st.cache_resource
-def load_sentiment_model(model_name):
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
-    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+# Per-stage timings for everything analyzed in this session
+if 'profiler' not in st.session_state:
+    st.session_state.profiler = StageProfiler()
 
-def load_models():
-    with st.spinner('Loading NLP models... This may take a minute.'):
-        progress_bar = st.progress(0)
-        
-        # Monitor initial memory usage
-        initial_memory = get_memory_usage()
-        st.info(f"Initial memory usage: {initial_memory:.2f} MB")
-        
-        try:
-            # Load SpaCy model
-            progress_bar.progress(10)
-            st.session_state.spacy_model = ensure_spacy_model(st.session_state.config['spacy_model'])
-            progress_bar.progress(50)
-            
-            # Load Hugging Face sentiment model
-            progress_bar.progress(60)
-            st.session_state.sentiment_model = load_sentiment_model(st.session_state.config['sentiment_model'])
-            progress_bar.progress(90)
-            
-            # Force garbage collection
-            gc.collect()
-            
-            current_memory = get_memory_usage()
-            st.info(f"Memory usage after loading models: {current_memory:.2f} MB (Increase: {current_memory - initial_memory:.2f} MB)")
-            
-            st.session_state.models_loaded = True
-            progress_bar.progress(100)
-            time.sleep(0.5)
-            progress_bar.empty()
-            st.success("Models loaded successfully!")
-            
-        except Exception as e:
-            st.error(f"Failed to load models: {e}")
-            st.session_state.models_loaded = False
-
-# Optimized extraction function with LRU cache for repeated texts
-@lru_cache(maxsize=128)
-def extract_medical_details_cached(transcript_text):
-    # Process the document with SpaCy
-    doc = st.session_state.spacy_model(transcript_text)
-    
-    symptoms = []
-    treatments = []
-    diagnosis = []
-    timeframes = []
-
-    # Extract entities
-    for ent in doc.ents:
-        if ent.label_ in ["DATE", "TIME"]:
-            timeframes.append(ent.text)
-
-    # Rule-based extraction using lower-cased text for efficiency
-    text_lower = transcript_text.lower()
-    
-    # Keyword dictionaries for more organized extraction
-    symptom_keywords = {
-        "pain": "Pain/Discomfort",
-        "discomfort": "Pain/Discomfort",
-        "neck pain": "Neck pain",
-        "back pain": "Back pain",
-        "hit my head": "Head impact"
-    }
-    
-    treatment_keywords = {
-        "physiotherapy": "Physiotherapy sessions",
-        "painkiller": "Painkillers"
-    }
-    
-    diagnosis_keywords = {
-        "whiplash": "Whiplash injury"
-    }
-    
-    # Check for symptoms
-    for keyword, symptom in symptom_keywords.items():
-        if keyword in text_lower:
-            symptoms.append(symptom)
-    
-    # Check for treatments
-    for keyword, treatment in treatment_keywords.items():
-        if keyword in text_lower:
-            treatments.append(treatment)
-    
-    # Check for diagnoses
-    for keyword, diag in diagnosis_keywords.items():
-        if keyword in text_lower:
-            diagnosis.append(diag)
+# Initialize session state for models
+if 'analyzer' not in st.session_state:
+    st.session_state.analyzer = TranscriptAnalyzer(st.session_state.config, profiler=st.session_state.profiler)
 
-    return {
-        "Symptoms": list(set(symptoms)),
-        "Treatment": list(set(treatments)),
-        "Diagnosis": list(set(diagnosis)),
-        "Timeframes": list(set(timeframes))
-    }
+# Start loading both models on background threads right away; the page renders
+# without waiting, and each analysis only waits for the model it needs
+st.session_state.analyzer.start_loading()
 
-# Non-cached wrapper for the cached function
-def extract_medical_details(transcript_text):
-    # Trim text if it's too long to avoid memory issues
-    if len(transcript_text) > 10000:
-        transcript_text = transcript_text[:10000]
-    return extract_medical_details_cached(transcript_text)
+# The analyzer for a batch run: the session's own, or with several workers a
+# new worker pool around it, which the run closes when it ends so that no
+# session keeps idle worker processes with their own models
+def batch_analyzer():
+    workers = st.session_state.config['workers']
+    if workers == 1:
+        return st.session_state.analyzer
+    return ProcessPoolAnalyzer(
+        st.session_state.config,
+        workers=workers,
+        profiler=st.session_state.profiler,
+        analyzer=st.session_state.analyzer
+    )
 
-# Structured summary function
-def structured_summary(medical_details, transcript_text):
-    text_lower = transcript_text.lower()
-    
-    # Default values
-    patient_name = "Unknown"
-    current_status = "Unknown"
-    prognosis = "Unknown"
-    
-    # Extract patient name - using simple pattern matching
-    if "Ms. Jones" in transcript_text:
-        patient_name = "Ms. Jones"
-    
-    # Determine current status with more efficient checks
-    if "occasional backache" in text_lower:
-        current_status = "Occasional backache"
-    elif "better" in text_lower:
-        current_status = "Improving"
-    
-    # Determine prognosis
-    if "improving" in text_lower:
-        prognosis = "Improving, full recovery expected"
-    
-    return {
-        "Patient_Name": patient_name,
-        "Symptoms": medical_details["Symptoms"],
-        "Diagnosis": medical_details["Diagnosis"][0] if medical_details["Diagnosis"] else "Not specified",
-        "Treatment": medical_details["Treatment"],
-        "Current_Status": current_status,
-        "Prognosis": prognosis
-    }
+# Manifest of the batch job for these uploads and settings, so processing the
+# same uploads again, after a rerun or a lost connection, resumes that job
+def batch_job_path(uploaded_files, fingerprint):
+    digest = hashlib.sha256(fingerprint.encode("utf-8"))
+    for uploaded_file in uploaded_files:
+        digest.update(uploaded_file.name.encode("utf-8") + b"\0")
+        digest.update(uploaded_file.getbuffer())
+    return os.path.join(st.session_state.config['job_directory'], f"{digest.hexdigest()[:16]}.sqlite3")
 
-# Optimized sentiment analysis
-def analyze_sentiment_and_intent(patient_text):
-    # Extract only patient statements to reduce processing
-    patient_statements = []
-    for line in patient_text.split('\n'):
-        if line.strip().startswith("Patient:"):
-            patient_statements.append(line.strip()[8:].strip())
-    
-    patient_combined = " ".join(patient_statements)
-    
-    # Limit text length to prevent memory issues
-    if len(patient_combined) > st.session_state.config['max_text_length']:
-        patient_combined = patient_combined[:st.session_state.config['max_text_length']]
-    
-    # Sentiment analysis using the transformer model
-    classification = st.session_state.sentiment_model(patient_combined)
-    raw_label = classification[0]['label']
-    
-    # Map raw sentiment label to desired format
-    sentiment_map = {
-        'POSITIVE': "Reassured",
-        'NEGATIVE': "Anxious",
-        'NEUTRAL': "Neutral"
-    }
-    sentiment = sentiment_map.get(raw_label, "Neutral")
-    
-    # Rule-based intent detection - more efficient with a single pass
-    intent = "Providing information"  # Default
-    lowered_text = patient_combined.lower()
-    
-    # Check for intents in priority order
-    if any(word in lowered_text for word in ["worry", "anxious", "concern"]):
-        intent = "Seeking reassurance"
-    elif any(word in lowered_text for word in ["better", "improving", "helped"]):
-        intent = "Reporting improvement"
-    elif any(word in lowered_text for word in ["pain", "symptom"]):
-        intent = "Reporting symptoms"
-    
-    return {
-        "Sentiment": sentiment,
-        "Intent": intent,
-        "Confidence": classification[0]['score']
-    }
 
-# SOAP Note Generation with more efficient text processing
-def generate_soap_note(summary, transcript_text):
-    text_lower = transcript_text.lower()
-    
-    # Default values
-    history = "Unknown"
-    physical_exam = "Unknown"
-    assessment = "Unknown"
-    plan = "Unknown"
-    
-    # Extract history information
-    if "car accident" in text_lower:
-        history = "Patient involved in a car accident"
-        if "September" in transcript_text:
-            history += " in September"
-    
-    # Check for physical examination
-    if "physical examination" in text_lower:
-        physical_exam = "Physical examination mentioned, details not provided"
-    
-    # Get assessment from summary
-    if summary["Diagnosis"] != "Not specified":
-        assessment = summary["Diagnosis"]
-    
-    # Treatment plan components
-    plan_components = []
-    if "physiotherapy" in text_lower:
-        plan_components.append("Continue physiotherapy")
-    if "painkiller" in text_lower:
-        plan_components.append("Use painkillers as needed")
-    
-    if plan_components:
-        plan = ", ".join(plan_components)
-    
-    return {
-        "Subjective": {
-            "Chief_Complaint": ", ".join(summary["Symptoms"]) if summary["Symptoms"] else "Not specified",
-            "History_of_Present_Illness": history
-        },
-        "Objective": {
-            "Physical_Exam": physical_exam,
-            "Observations": "Based on patient's statements"
-        },
-        "Assessment": {
-            "Diagnosis": summary["Diagnosis"],
-            "Severity": "Improving based on patient statements" if "improving" in text_lower else "Unknown"
-        },
-        "Plan": {
-            "Treatment": plan,
-            "Follow_Up": "As needed based on symptom progression"
-        }
-    }
+# Columns of the batch results table
+SUMMARY_COLUMNS = [
+    "filename", "patient", "diagnosis", "symptoms", "sentiment", "confidence", "current_status", "duplicate_of"
+]
 
-# Batch processing function with memory optimization
-def process_transcripts_in_batches(transcripts, batch_size=8):
-    results = []
-    total = len(transcripts)
-    
-    for i in range(0, total, batch_size):
-        batch = transcripts[i:i+batch_size]
-        batch_results = []
-        
-        for transcript_data in batch:
-            content = transcript_data["content"]
-            filename = transcript_data["filename"]
-            
-            # Run analysis pipeline
-            medical_details = extract_medical_details(content)
-            summary = structured_summary(medical_details, content)
-            sentiment_analysis = analyze_sentiment_and_intent(content)
-            soap_note = generate_soap_note(summary, content)
-            
-            # Compile results
-            batch_results.append({
-                "filename": filename,
-                "medical_details": medical_details,
-                "summary": summary,
-                "sentiment_analysis": sentiment_analysis,
-                "soap_note": soap_note
-            })
-        
-        # Append batch results and force garbage collection
-        results.extend(batch_results)
-        gc.collect()
-        
-        # Update progress
-        progress = min(1.0, (i + len(batch)) / total)
-        st.progress(progress)
-    
-    return results
+# Columnar store of every batch run; pyarrow is imported on first use
+def result_store():
+    from result_store import ResultStore
+    return ResultStore(st.session_state.config['result_store_path'])
 
 # Advanced settings sidebar
 with st.sidebar:
@@ -394,12 +141,66 @@ with st.sidebar:
         help="Smaller model uses less memory but may be less accurate"
     )
     
+    sentiment_backend = st.selectbox(
+        "Sentiment Backend",
+        SENTIMENT_BACKENDS,
+        index=SENTIMENT_BACKENDS.index(st.session_state.config['sentiment_backend']),
+        help="Quantized int8 and ONNX Runtime backends are faster and smaller on CPU; ONNX needs optimum[onnxruntime]"
+    )
+    
+    workers = st.slider(
+        "Worker Processes",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=st.session_state.config['workers'],
+        help="Processes used for batch processing; each loads its own copy of the models, so more workers use more memory"
+    )
+    
+    unordered_results = st.checkbox(
+        "Show Results as They Complete",
+        value=False,
+        help="With several worker processes, list results in completion order instead of upload order"
+    )
+    
+    spacy_n_process = st.slider(
+        "SpaCy Worker Processes",
+        min_value=1,
+        max_value=8,
+        value=1,
+        help="Processes used to parse documents in batch mode; more workers use more memory"
+    )
+    
     batch_size = st.slider(
-        "Batch Processing Size",
+        "Batch Size",
         min_value=1,
-        max_value=20,
-        value=8,
-        help="Larger batch sizes process faster but use more memory"
+        max_value=64,
+        value=st.session_state.config['batch_size'],
+        help="Transcripts per batch; with an adaptive batch size, the size of the first batch"
+    )
+    
+    adaptive_batching = st.checkbox(
+        "Adaptive Batch Size",
+        value=st.session_state.config['adaptive_batching'],
+        help="Grow or shrink the batches after each one to stay within the memory budget and the time per batch"
+    )
+    
+    memory_budget_mb = st.number_input(
+        "Memory Budget (MB)",
+        min_value=256,
+        max_value=65536,
+        value=int(st.session_state.config['memory_budget_mb']),
+        step=256,
+        help="Memory batch processing aims to stay under; garbage is collected only when memory gets close to it"
+    )
+    
+    target_batch_seconds = st.slider(
+        "Target Time per Batch (s)",
+        min_value=0.5,
+        max_value=10.0,
+        value=float(st.session_state.config['target_batch_seconds']),
+        step=0.5,
+        disabled=not adaptive_batching,
+        help="Batches taking longer shrink; batches well under it grow"
     )
     
     max_text_length = st.slider(
@@ -410,19 +211,117 @@ with st.sidebar:
         help="Limit text length to prevent memory issues"
     )
     
+    sentiment_per_turn = st.checkbox(
+        "Score Patient Turns Separately",
+        value=False,
+        help="Score each patient turn and combine the results, weighted by length, instead of one truncated text"
+    )
+    
+    chunked = st.checkbox(
+        "Analyze Long Transcripts in Windows",
+        value=st.session_state.config['chunked'],
+        help="Analyze the whole transcript in windows cut at speaker turns instead of truncating it; "
+             "overrides the max text length and per-turn settings"
+    )
+    
+    chunk_tokens = st.slider(
+        "Window Size (tokens)",
+        min_value=64,
+        max_value=512,
+        value=st.session_state.config['chunk_tokens'],
+        step=32,
+        disabled=not chunked,
+        help="Sentiment model tokens per window; smaller windows use less memory"
+    )
+    
+    incremental = st.checkbox(
+        "Reuse Unchanged Turns",
+        value=st.session_state.config['incremental'],
+        help="When a transcript is edited and analyzed again, only re-analyze the speaker turns that changed"
+    )
+    
+    dedup = st.checkbox(
+        "Skip Near-Duplicates",
+        value=st.session_state.config['dedup'],
+        help="In batches, run SpaCy and the sentiment model on one transcript of each group of near-identical "
+             "ones and reuse their output for the others, flagged with duplicate_of"
+    )
+    
+    dedup_threshold = st.slider(
+        "Near-Duplicate Similarity",
+        min_value=0.5,
+        max_value=1.0,
+        value=float(st.session_state.config['dedup_threshold']),
+        step=0.05,
+        disabled=not dedup,
+        help="Share of overlapping five-word sequences from which two transcripts count as near-duplicates"
+    )
+    
     # Update configuration if changed
     if (spacy_model_option != st.session_state.config['spacy_model'] or
+        sentiment_backend != st.session_state.config['sentiment_backend'] or
+        workers != st.session_state.config['workers'] or
+        spacy_n_process != st.session_state.config['spacy_n_process'] or
         batch_size != st.session_state.config['batch_size'] or
-        max_text_length != st.session_state.config['max_text_length']):
+        adaptive_batching != st.session_state.config['adaptive_batching'] or
+        memory_budget_mb != st.session_state.config['memory_budget_mb'] or
+        target_batch_seconds != st.session_state.config['target_batch_seconds'] or
+        max_text_length != st.session_state.config['max_text_length'] or
+        sentiment_per_turn != st.session_state.config['sentiment_per_turn'] or
+        chunked != st.session_state.config['chunked'] or
+        chunk_tokens != st.session_state.config['chunk_tokens'] or
+        incremental != st.session_state.config['incremental'] or
+        dedup != st.session_state.config['dedup'] or
+        dedup_threshold != st.session_state.config['dedup_threshold']):
         
+        model_changed = (spacy_model_option != st.session_state.config['spacy_model'] or
+                         sentiment_backend != st.session_state.config['sentiment_backend'])
         st.session_state.config['spacy_model'] = spacy_model_option
+        st.session_state.config['sentiment_backend'] = sentiment_backend
+        st.session_state.config['workers'] = workers
+        st.session_state.config['spacy_n_process'] = spacy_n_process
         st.session_state.config['batch_size'] = batch_size
+        st.session_state.config['adaptive_batching'] = adaptive_batching
+        st.session_state.config['memory_budget_mb'] = memory_budget_mb
+        st.session_state.config['target_batch_seconds'] = target_batch_seconds
         st.session_state.config['max_text_length'] = max_text_length
+        st.session_state.config['sentiment_per_turn'] = sentiment_per_turn
+        st.session_state.config['chunked'] = chunked
+        st.session_state.config['chunk_tokens'] = chunk_tokens
+        st.session_state.config['incremental'] = incremental
+        st.session_state.config['dedup'] = dedup
+        st.session_state.config['dedup_threshold'] = dedup_threshold
         
-        # Reset models if SpaCy model changed
-        if spacy_model_option != st.session_state.config['spacy_model']:
-            st.session_state.models_loaded = False
-            st.warning("Model configuration changed. Models will reload on next analysis.")
+        # Start loading the new model in the background if it changed
+        if model_changed:
+            st.session_state.analyzer.start_loading()
+            st.info("Model configuration changed. The new model is loading in the background.")
+    
+    # Background model loading
+    st.subheader("Model Status")
+    for model_label, model_status in st.session_state.analyzer.model_status().items():
+        st.caption(f"{model_label}: {model_status}")
+    # One copy of each model serves every session on this server
+    for shared_model in st.session_state.analyzer.registry.stats():
+        if shared_model["holders"]:
+            st.caption(f"{shared_model['model']}: shared by {shared_model['holders']} session(s)")
+    # Edits to the lexicon file are picked up without a restart
+    st.caption(f"Lexicon: {st.session_state.analyzer.matcher.terms} terms")
+    
+    # Persistent result cache statistics
+    st.subheader("Result Cache")
+    result_cache = st.session_state.analyzer.cache
+    if result_cache is not None:
+        cache_stats = result_cache.stats()
+        hits_col, misses_col = st.columns(2)
+        hits_col.metric("Cache Hits", cache_stats["hits"])
+        misses_col.metric("Cache Misses", cache_stats["misses"])
+        st.caption(f"{cache_stats['entries']} cached results, {cache_stats['size_mb']:.1f} MB")
+        if st.button("Clear Result Cache"):
+            result_cache.clear()
+            st.success("Result cache cleared")
+    else:
+        st.caption("Result cache is disabled")
     
     # Memory monitoring
     if st.button("Check Memory Usage"):
@@ -437,7 +336,7 @@ with st.sidebar:
         st.success(f"Memory freed: {before - after:.2f} MB")
 
 # Main application logic
-tab1, tab2= st.tabs(["📋 Transcript Analysis", "📊 Batch Processing"])
+tab1, tab2, tab3 = st.tabs(["📋 Transcript Analysis", "📊 Batch Processing", "⏱️ Performance"])
 
 with tab1:
     # Input section
@@ -481,20 +380,27 @@ Physician: That's encouraging. Let's go ahead and do a physical examination to c
         transcript = st.text_area("Medical Transcript", height=300, 
                                 placeholder="Enter physician-patient conversation...")
     
-    # Load models when needed
-    if not st.session_state.models_loaded and (transcript.strip() != ""):
-        load_models()
-    
     # Process transcript button
-    analyze_button = st.button("Analyze Transcript", type="primary", disabled=not st.session_state.models_loaded)
+    analyze_button = st.button("Analyze Transcript", type="primary")
     
     if analyze_button and transcript:
         with st.spinner('Analyzing transcript...'):
             # Run the analysis pipeline
-            medical_details = extract_medical_details(transcript)
-            summary = structured_summary(medical_details, transcript)
-            sentiment_analysis = analyze_sentiment_and_intent(transcript)
-            soap_note = generate_soap_note(summary, transcript)
+            turn_cache = st.session_state.analyzer.turn_cache
+            before = turn_cache.stats() if turn_cache is not None else None
+            start_time = time.perf_counter()
+            result_json = st.session_state.analyzer.analyze(transcript, transcript_id="transcript")
+            elapsed = time.perf_counter() - start_time
+            if before is not None:
+                after = turn_cache.stats()
+                reused = after["hits"] - before["hits"]
+                total = reused + after["misses"] - before["misses"]
+                if total:
+                    st.caption(f"Analyzed in {elapsed * 1000:.0f} ms, reusing {reused} of {total} cached turn results")
+            medical_details = result_json["medical_details"]
+            summary = result_json["summary"]
+            sentiment_analysis = result_json["sentiment_analysis"]
+            soap_note = result_json["soap_note"]
             
             # Display results
             st.markdown("<div class='subheader-text'>Analysis Results</div>", unsafe_allow_html=True)
@@ -553,16 +459,11 @@ Physician: That's encouraging. Let's go ahead and do a physical examination to c
                 st.markdown("</div>", unsafe_allow_html=True)
             
             # Option to download results as JSON
-            result_json = {
-                "medical_details": medical_details,
-                "summary": summary,
-                "sentiment_analysis": sentiment_analysis,
-                "soap_note": soap_note
-            }
-            
+            with st.session_state.profiler.stage("serialization", "transcript"):
+                result_data = json.dumps(result_json, indent=4)
             st.download_button(
                 label="Download Results as JSON",
-                data=json.dumps(result_json, indent=4),
+                data=result_data,
                 file_name="medical_analysis_results.json",
                 mime="application/json",
             )
@@ -570,47 +471,201 @@ Physician: That's encouraging. Let's go ahead and do a physical examination to c
 with tab2:
     st.markdown("<div class='subheader-text'>Batch Processing</div>", unsafe_allow_html=True)
     st.markdown("""
-    Upload multiple transcripts for batch processing. Each transcript should be a separate text file.
+    Upload multiple transcripts for batch processing: separate text files, JSON Lines files with one
+    transcript per line, or zip and tar.gz archives of either.
     """)
     
-    uploaded_files = st.file_uploader("Upload transcript files", accept_multiple_files=True, type=['txt'])
+    uploaded_files = st.file_uploader(
+        "Upload transcript files", accept_multiple_files=True, type=['txt', 'jsonl', 'zip', 'gz', 'tgz', 'tar']
+    )
     
     if uploaded_files:
-        if not st.session_state.models_loaded:
-            load_models()
-        
-        process_batch = st.button("Process Batch", type="primary", disabled=not st.session_state.models_loaded)
+        process_batch = st.button("Process Batch", type="primary")
         
         if process_batch:
             with st.spinner('Processing files...'):
-                # Prepare transcripts for batch processing
-                transcripts = []
-                for uploaded_file in uploaded_files:
-                    content = uploaded_file.read().decode("utf-8")
-                    filename = uploaded_file.name.split('.')[0]
-                    transcripts.append({"filename": filename, "content": content})
+                # Uploads are unpacked and decoded lazily, a few transcripts ahead of
+                # the pipeline; unreadable files are reported with the failures
+                failures = []
+                transcripts = read_ahead(
+                    iter_transcripts(
+                        uploaded_files,
+                        on_error=lambda filename, message: failures.append({"filename": filename, "error": message})
+                    ),
+                    st.session_state.config['read_ahead']
+                )
                 
-                # Process in batches
-                results = process_transcripts_in_batches(transcripts, st.session_state.config['batch_size'])
+                # Each result is checkpointed to the job's manifest as soon as it is
+                # produced; once the job has run, every result of it, this run's and
+                # earlier runs', is written to a JSONL file and to the result store
+                if st.session_state.get('batch_results_path'):
+                    try:
+                        os.remove(st.session_state.batch_results_path)
+                    except OSError:
+                        pass
+                results_file = tempfile.NamedTemporaryFile(
+                    mode="w", suffix=".jsonl", prefix="batch_analysis_", delete=False, encoding="utf-8"
+                )
+                st.session_state.batch_results_path = results_file.name
                 
-                # Display batch results
-                st.success(f"Processed {len(results)} files successfully!")
+                # Archives and JSON Lines files hold an unknown number of transcripts
+                total = None
+                if all(source_kind(uploaded_file.name) == "text" for uploaded_file in uploaded_files):
+                    total = len(uploaded_files)
+                progress_bar = st.progress(0.0)
+                analyzer = batch_analyzer()
+                scheduler = None
+                if isinstance(analyzer, ProcessPoolAnalyzer):
+                    analyzer.ordered = not unordered_results
+                else:
+                    scheduler = analyzer.scheduler
+                    first_batch = scheduler.batches
+                duplicate_index = analyzer.duplicate_index
+                dedup_before = dict(duplicate_index.counters) if duplicate_index is not None else None
+                store = result_store()
+                config = st.session_state.config
+                try:
+                    with BatchJob(
+                        batch_job_path(uploaded_files, analyzer.fingerprint()),
+                        analyzer.fingerprint(),
+                        config['checkpoint_every'],
+                        config['job_max_attempts']
+                    ) as job:
+                        earlier = job.progress()
+                        if earlier['done'] or earlier['failed']:
+                            st.info(
+                                f"Resuming an earlier run of this batch: {earlier['done']} transcripts already done"
+                            )
+                        for _ in job.run(
+                            analyzer,
+                            transcripts,
+                            progress_callback=lambda processed: progress_bar.progress(
+                                min(1.0, processed / total) if total else 0.0, text=f"Processed {processed} transcripts"
+                            )
+                        ):
+                            pass
+                        with JsonlWriter(results_file, profiler=st.session_state.profiler) as writer, \
+                                store.writer(job.job_id) as store_writer:
+                            for result in job.results():
+                                writer.write(result)
+                                store_writer.write(result)
+                        job_failures = job.failures()
+                finally:
+                    if analyzer is not st.session_state.analyzer:
+                        analyzer.close()
+                results_file.close()
                 
-                # Create a DataFrame for display
-                results_df = pd.DataFrame({
-                    "Filename": [r["filename"] for r in results],
-                    "Patient": [r["summary"]["Patient_Name"] for r in results],
-                    "Diagnosis": [r["summary"]["Diagnosis"] for r in results],
-                    "Sentiment": [r["sentiment_analysis"]["Sentiment"] for r in results],
-                    "Current Status": [r["summary"]["Current_Status"] for r in results]
-                })
+                # Display batch results, read back from the store through a memory map
+                st.success(f"Processed {store_writer.count} files successfully!")
+                for failure in failures:
+                    st.error(f"{failure['filename']}: {failure['error']}")
+                for filename, error, attempts in job_failures:
+                    st.error(f"{filename}: {error} (after {attempts} attempt{'s' if attempts != 1 else ''})")
+                if duplicate_index is not None:
+                    dedup_stats = duplicate_index.stats(since=dedup_before)
+                    if dedup_stats["duplicates"]:
+                        st.caption(
+                            f"Near-duplicates: {dedup_stats['duplicates']} of {dedup_stats['transcripts']} transcripts "
+                            f"({dedup_stats['dedup_ratio']:.0%}; {dedup_stats['exact']} exact, {dedup_stats['near']} "
+                            f"near) reused the SpaCy and sentiment output of an earlier transcript, saving about "
+                            f"{max(0.0, dedup_stats['seconds_saved']):.1f}s of analysis. Their rows name that "
+                            f"transcript under duplicate_of."
+                        )
                 
-                st.dataframe(results_df, use_container_width=True)
+                run_table = store.query(run_id=store_writer.run_id, columns=SUMMARY_COLUMNS)
+                st.dataframe(run_table.to_pandas(), use_container_width=True)
                 
                 # Option to download batch results
-                st.download_button(
-                    label="Download Batch Results as JSON",
-                    data=json.dumps(results, indent=4),
-                    file_name="batch_analysis_results.json",
-                    mime="application/json",
-                )
+                with open(st.session_state.batch_results_path, "rb") as results_file:
+                    st.download_button(
+                        label="Download Batch Results as JSONL",
+                        data=results_file,
+                        file_name="batch_analysis_results.jsonl",
+                        mime="application/x-ndjson",
+                    )
+                if store_writer.count:
+                    with open(store_writer.path, "rb") as part_file:
+                        st.download_button(
+                            label="Download Batch Results as Arrow",
+                            data=part_file,
+                            file_name="batch_analysis_results.arrow",
+                            mime="application/vnd.apache.arrow.file",
+                        )
+                
+                # Why the batch sizes changed during the run
+                if scheduler is None:
+                    st.caption("With several worker processes, each worker sizes its own batches")
+                elif scheduler.decisions_since(first_batch):
+                    import pandas as pd
+                    decisions_df = pd.DataFrame(scheduler.decisions_since(first_batch)).set_index("batch")
+                    with st.expander("Batch Scheduler Decisions"):
+                        gc_runs = int(decisions_df["gc_freed_mb"].notna().sum())
+                        st.caption(
+                            f"{len(decisions_df)} batches; batch size {decisions_df['transcripts'].iloc[0]} → "
+                            f"{decisions_df['batch_size'].iloc[-1]}, sentiment batch size "
+                            f"{decisions_df['sentiment_batch_size'].iloc[-1]}; peak memory "
+                            f"{decisions_df['rss_mb'].max():.0f} MB of {scheduler.memory_budget_mb:.0f} MB; "
+                            f"garbage collected {gc_runs} times"
+                        )
+                        st.line_chart(decisions_df[["batch_size", "sentiment_batch_size"]])
+                        st.dataframe(decisions_df, use_container_width=True)
+    
+    # Query every stored batch run without loading the whole store
+    st.markdown("#### Search Stored Results")
+    store = result_store()
+    stored_count = store.count()
+    if stored_count:
+        st.caption(f"{stored_count} results from {len(store.run_ids())} batch runs")
+        diagnosis_col, symptom_col = st.columns(2)
+        diagnosis_filter = diagnosis_col.selectbox("Diagnosis", ["Any"] + store.distinct("diagnoses"))
+        symptom_filter = symptom_col.selectbox("Symptom", ["Any"] + store.distinct("symptoms"))
+        matches = store.query(
+            diagnosis=None if diagnosis_filter == "Any" else diagnosis_filter,
+            symptom=None if symptom_filter == "Any" else symptom_filter,
+            columns=["run_id"] + SUMMARY_COLUMNS
+        )
+        st.caption(f"{matches.num_rows} matching results")
+        st.dataframe(matches.to_pandas(), use_container_width=True)
+    else:
+        st.caption("No batch results stored yet")
+
+with tab3:
+    st.markdown("<div class='subheader-text'>Performance</div>", unsafe_allow_html=True)
+    st.markdown("""
+    Wall time, CPU time and memory change of each pipeline stage, per transcript, for every analysis in this session.
+    Batched stages (SpaCy and sentiment in batch mode) are split evenly across the transcripts in the batch.
+    """)
+    
+    profiler = st.session_state.profiler
+    stage_rows = profiler.summary()
+    if stage_rows:
+        import pandas as pd
+        stages_df = pd.DataFrame(stage_rows).set_index("stage")
+        
+        st.markdown("#### Wall Time (ms per transcript)")
+        st.dataframe(stages_df[["count", "wall_p50_ms", "wall_p95_ms", "wall_p99_ms", "total_wall_s"]], use_container_width=True)
+        
+        st.markdown("#### CPU Time (ms per transcript)")
+        st.dataframe(stages_df[["count", "cpu_p50_ms", "cpu_p95_ms", "cpu_p99_ms", "total_cpu_s"]], use_container_width=True)
+        
+        st.markdown("#### Memory (RSS change per transcript)")
+        st.dataframe(stages_df[["count", "rss_delta_mean_mb", "rss_delta_max_mb"]], use_container_width=True)
+        
+        json_col, prometheus_col, reset_col = st.columns(3)
+        json_col.download_button(
+            label="Export Profile as JSON",
+            data=profiler.to_json(),
+            file_name="stage_profile.json",
+            mime="application/json",
+        )
+        prometheus_col.download_button(
+            label="Export Prometheus Metrics",
+            data=profiler.to_prometheus(),
+            file_name="stage_profile.prom",
+            mime="text/plain",
+        )
+        if reset_col.button("Reset Profile"):
+            profiler.reset()
+            st.rerun()
+    else:
+        st.info("No measurements yet. Analyze a transcript or process a batch to collect stage timings.")
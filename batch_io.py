@@ -0,0 +1,311 @@
+"""Streaming input and output for batch analysis.
+
+Transcripts are read lazily, one at a time, and results are appended to a
+JSON Lines sink as soon as they are produced, so a batch never holds more
+than the transcripts and results currently in flight.
+
+``iter_transcripts`` reads these inputs:
+
+- ``.txt`` files, one transcript each,
+- JSON Lines files (``.jsonl``), one transcript per line as
+  ``{"filename", "content"}`` (or ``"text"``) or a plain string,
+- zip and tar archives (``.zip``, ``.tar``, ``.tar.gz``, ``.tgz``) of such
+  files,
+- directories of any of these, walked recursively.
+
+Archive members are decompressed one at a time, and tar archives are read as
+a stream, so memory does not depend on the size of the input. The encoding of
+each file is detected while it is decoded. ``read_ahead`` reads a bounded
+number of transcripts ahead on a background thread, so reading overlaps with
+analysis.
+"""
+import codecs
+import io
+import json
+import logging
+import os
+import queue
+import sys
+import tarfile
+import threading
+import zipfile
+from contextlib import nullcontext
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_BYTES = 1 << 16
+
+# Byte order marks, UTF-32 before the UTF-16 mark it starts with
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16")
+]
+
+# Used from the first byte that is not valid UTF-8 onwards
+FALLBACK_ENCODING = "cp1252"
+
+
+# "text", "jsonl", "zip", "tar", or None for files that hold no transcripts
+def source_kind(name):
+    name = name.lower()
+    if os.path.basename(name).startswith("."):
+        return None
+    if name.endswith(".txt"):
+        return "text"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if name.endswith(".zip"):
+        return "zip"
+    if name.endswith((".tar", ".tar.gz", ".tgz")):
+        return "tar"
+    return None
+
+
+# A transcript's name: its path relative to ``root`` (the directory it was
+# found in), or its file name, with the extension and "/" separators
+def transcript_name(path, root=None):
+    name = os.path.relpath(path, root) if root is not None else os.path.basename(path)
+    return name.replace(os.sep, "/")
+
+
+# The encoding of a byte stream that starts with ``head``: from its byte order
+# mark, UTF-16 if every other byte is zero, otherwise UTF-8
+def sniff_encoding(head):
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if head.startswith(mark):
+            return encoding
+    sample = head[:512]
+    if len(sample) >= 4:
+        if not sample[1::2].strip(b"\0") and sample[0::2].strip(b"\0"):
+            return "utf-16-le"
+        if not sample[0::2].strip(b"\0") and sample[1::2].strip(b"\0"):
+            return "utf-16-be"
+    return "utf-8"
+
+
+# Decode a binary stream chunk by chunk with an incremental decoder for the
+# sniffed encoding. UTF-8 text that turns out to be invalid continues in
+# cp1252 from the first invalid byte; the text before it reads the same in
+# both.
+def read_text(stream, chunk_size=READ_CHUNK_BYTES):
+    chunk = stream.read(chunk_size)
+    while 0 < len(chunk) < 4:
+        # Enough bytes for any byte order mark
+        more = stream.read(chunk_size)
+        if not more:
+            break
+        chunk += more
+    encoding = sniff_encoding(chunk)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pieces = []
+    while True:
+        final = not chunk
+        try:
+            pieces.append(decoder.decode(chunk, final))
+        except UnicodeDecodeError as exc:
+            if encoding != "utf-8":
+                raise
+            pieces.append(exc.object[:exc.start].decode("utf-8"))
+            encoding = FALLBACK_ENCODING
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            pieces.append(decoder.decode(exc.object[exc.start:], final))
+        if final:
+            return "".join(pieces)
+        chunk = stream.read(chunk_size)
+
+
+# Transcripts from files, directories, archives and JSON Lines files, read
+# lazily, one at a time, as {"filename", "content"} dicts. Each source is a
+# path or an open binary file with a ``name`` (such as a Streamlit upload).
+# A file or line that cannot be read is reported to
+# ``on_error(filename, message)``, or logged, and skipped. Transcripts are
+# named by their path relative to the directory or archive they were found
+# in (``visits/2024/notes.txt``), or by their file name, and JSON Lines
+# records without a filename by the file's name and line number
+# (``feed.jsonl:3``).
+def iter_transcripts(sources, on_error=None):
+    for source in sources:
+        if not isinstance(source, (str, os.PathLike)):
+            yield from _iter_stream(source.name, transcript_name(source.name), source, on_error)
+        elif os.path.isdir(source):
+            yield from _iter_directory(source, on_error)
+        else:
+            yield from _iter_file(source, transcript_name(source), on_error)
+
+
+def _iter_file(path, name, on_error):
+    try:
+        stream = open(path, "rb")
+    except OSError as exc:
+        _report(on_error, name, exc)
+        return
+    with stream:
+        yield from _iter_stream(os.fspath(path), name, stream, on_error)
+
+
+def _iter_directory(directory, on_error):
+    for root, directories, files in os.walk(directory):
+        directories.sort()
+        for file_name in sorted(files):
+            if source_kind(file_name) is not None:
+                path = os.path.join(root, file_name)
+                yield from _iter_file(path, transcript_name(path, directory), on_error)
+
+
+# ``path`` decides how the stream is read; ``name`` is what its transcripts
+# and errors are reported as
+def _iter_stream(path, name, stream, on_error):
+    kind = source_kind(path)
+    try:
+        if kind == "text":
+            yield {"filename": name, "content": read_text(stream)}
+        elif kind == "jsonl":
+            yield from _iter_jsonl(name, stream, on_error)
+        elif kind == "zip":
+            # Members are listed from the central directory and decompressed one at a time
+            with zipfile.ZipFile(stream) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and source_kind(info.filename) in ("text", "jsonl"):
+                        with archive.open(info) as member:
+                            yield from _iter_stream(info.filename, info.filename, member, on_error)
+        elif kind == "tar":
+            # Read as a stream: each member is decompressed as it is reached
+            with tarfile.open(fileobj=stream, mode="r|*") as archive:
+                for info in archive:
+                    if info.isfile() and source_kind(info.name) in ("text", "jsonl"):
+                        yield from _iter_stream(info.name, info.name, archive.extractfile(info), on_error)
+        else:
+            _report(on_error, name, "unsupported file type")
+    except (OSError, EOFError, UnicodeError, zipfile.BadZipFile, tarfile.TarError) as exc:
+        _report(on_error, name, exc)
+
+
+# The first bytes of a stream, without consuming them
+def _peek(stream, size):
+    if hasattr(stream, "peek"):
+        return stream.peek(size)[:size]
+    position = stream.tell()
+    head = stream.read(size)
+    stream.seek(position)
+    return head
+
+
+def _iter_jsonl(name, stream, on_error):
+    lines = io.TextIOWrapper(stream, encoding=sniff_encoding(_peek(stream, 512)), errors="replace")
+    try:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            filename = f"{name}:{number}"
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                _report(on_error, filename, exc)
+                continue
+            if isinstance(record, dict):
+                filename = str(record.get("filename") or filename)
+                record = record.get("content", record.get("text"))
+            if not isinstance(record, str):
+                _report(on_error, filename, "expected a string or a 'content' string")
+                continue
+            yield {"filename": filename, "content": record}
+    finally:
+        # Leave the stream open for its owner
+        lines.detach()
+
+
+def _report(on_error, filename, error):
+    message = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else error
+    if on_error is None:
+        logger.warning("Skipped %s: %s", filename, message)
+    else:
+        on_error(filename, message)
+
+
+# Iterate over ``items`` while a background thread reads up to ``size`` of
+# them ahead, so reading and decompressing overlap with analysis. An error
+# raised while reading is raised here. Stopping early stops the thread and
+# closes ``items``.
+def read_ahead(items, size=16):
+    if size <= 0:
+        yield from items
+        return
+    buffer = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    end = object()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as exc:
+            put((end, exc))
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, name="transcript-reader", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+class JsonlWriter:
+    """Incremental JSON Lines sink; each record is written as soon as it arrives.
+
+    ``target`` is a path, ``"-"`` for stdout, or an open text file. With a
+    ``profiling.StageProfiler``, each write is recorded as the
+    "serialization" stage of the record's transcript.
+    """
+
+    def __init__(self, target, profiler=None):
+        if target == "-":
+            self.file, self._owned = sys.stdout, False
+        elif isinstance(target, (str, os.PathLike)):
+            self.file, self._owned = open(target, "w", encoding="utf-8"), True
+        else:
+            self.file, self._owned = target, False
+        self.profiler = profiler
+        self.count = 0
+
+    def write(self, record):
+        stage = nullcontext()
+        if self.profiler is not None:
+            stage = self.profiler.stage("serialization", record.get("filename"))
+        with stage:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+        self.count += 1
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,257 @@
+"""Resumable batch jobs, checkpointed to a SQLite manifest.
+
+A ``BatchJob`` records every transcript of a batch in a manifest file, keyed
+by a hash of its filename and text, with its status (a transcript read again
+within a run is a separate item, keyed by how many times it was read):
+
+- pending: read from the inputs but not analyzed yet (or not checkpointed
+  before the run was interrupted),
+- done: analyzed; the result is stored in the manifest,
+- failed: analysis raised; the error and the number of attempts are stored,
+  along with the transcript text so it can be retried without the inputs.
+
+``run`` analyzes the transcripts that are not done yet and checkpoints their
+results every ``checkpoint_every`` transcripts, in one transaction each. A
+run that is interrupted (a crash, Ctrl-C, a Streamlit rerun) loses at most
+the transcripts since the last checkpoint: running the job again over the same
+inputs skips everything already done. Failed transcripts are left out of the
+main pass and retried afterwards, one at a time, until they have been
+attempted ``max_attempts`` times. ``results`` returns every result of the job,
+across all its runs, in the order the transcripts were first read.
+
+The manifest remembers the fingerprint of the settings the job was started
+with (see ``result_cache.config_fingerprint``); resuming it with different
+settings raises ``ValueError`` rather than mixing results.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+class BatchJob:
+    """A batch job's manifest and checkpoints; see the module docstring."""
+
+    def __init__(self, path, fingerprint="", checkpoint_every=64, max_attempts=2):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.max_attempts = max(1, max_attempts)
+        self.skipped = 0  # transcripts found done by this run
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS job (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "id TEXT PRIMARY KEY, position INTEGER NOT NULL, filename TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, content TEXT, result BLOB, "
+            "run INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS items_position ON items (position)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS items_status ON items (status)")
+
+        settings = dict(self._connection.execute("SELECT name, value FROM job").fetchall())
+        if not settings:
+            settings = {
+                # Sorts in the order jobs started, like result store run ids
+                "job_id": f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}",
+                "fingerprint": fingerprint,
+                "created_at": str(time.time()),
+                "runs": "0"
+            }
+            self._connection.executemany("INSERT INTO job (name, value) VALUES (?, ?)", settings.items())
+        elif fingerprint and settings["fingerprint"] != fingerprint:
+            self._connection.close()
+            raise ValueError(
+                f"Job {path} was started with different analysis settings; "
+                "resume it with the same settings or start a new job"
+            )
+        self.job_id = settings["job_id"]
+        # Each run tags the items it reads, so repeats within a run are told apart
+        self.run_number = int(settings["runs"]) + 1
+        self._connection.execute("UPDATE job SET value = ? WHERE name = 'runs'", (str(self.run_number),))
+        self._next_position = self._connection.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM items"
+        ).fetchone()[0]
+        self._in_flight = {}  # sequence id -> (item id, text) of each transcript being analyzed
+        self._sequence = 0
+        self._uncommitted = 0
+        self._in_transaction = False
+
+    # The item id of the ``occurrence``-th repeat of a transcript in one run
+    @staticmethod
+    def key(filename, transcript_text, occurrence=0):
+        digest = hashlib.sha256(filename.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(transcript_text.encode("utf-8"))
+        if occurrence:
+            digest.update(f"\0{occurrence}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _begin(self):
+        if not self._in_transaction:
+            self._connection.execute("BEGIN")
+            self._in_transaction = True
+
+    # Commit everything recorded since the last checkpoint
+    def checkpoint(self):
+        with self._lock:
+            if self._in_transaction:
+                self._connection.execute("COMMIT")
+                self._in_transaction = False
+            self._uncommitted = 0
+
+    # The transcripts that still need analyzing, registered in the manifest
+    # as they are read and tagged with a "sequence" id for ``record``; done
+    # and failed ones are skipped
+    def pending(self, transcripts):
+        for transcript_data in transcripts:
+            filename, content = transcript_data["filename"], transcript_data["content"]
+            with self._lock:
+                self._begin()
+                # Items already read by this run are earlier repeats of the transcript
+                occurrence = 0
+                item_id = self.key(filename, content)
+                row = self._connection.execute("SELECT status, run FROM items WHERE id = ?", (item_id,)).fetchone()
+                while row is not None and row[1] == self.run_number:
+                    occurrence += 1
+                    item_id = self.key(filename, content, occurrence)
+                    row = self._connection.execute(
+                        "SELECT status, run FROM items WHERE id = ?", (item_id,)
+                    ).fetchone()
+                if row is None:
+                    self._connection.execute(
+                        "INSERT INTO items (id, position, filename, status, run, updated_at) "
+                        "VALUES (?, ?, ?, 'pending', ?, ?)",
+                        (item_id, self._next_position, filename, self.run_number, time.time())
+                    )
+                    self._next_position += 1
+                else:
+                    self._connection.execute("UPDATE items SET run = ? WHERE id = ?", (self.run_number, item_id))
+                    if row[0] == "done":
+                        self.skipped += 1
+                        continue
+                    if row[0] == "failed":
+                        continue
+                    # Otherwise pending since an interrupted run
+            yield self._send(item_id, transcript_data)
+
+    def _send(self, item_id, transcript_data):
+        sequence = self._sequence
+        self._sequence += 1
+        self._in_flight[sequence] = (item_id, transcript_data["content"])
+        return dict(transcript_data, sequence=sequence)
+
+    # Store one result of a transcript handed out by ``pending`` or
+    # ``retry_failed``, found by its sequence id, and checkpoint every
+    # ``checkpoint_every`` results. Returns the result without the id.
+    def record(self, result):
+        item_id, content = self._in_flight.pop(result["sequence"])
+        result = {name: value for name, value in result.items() if name != "sequence"}
+        with self._lock:
+            self._begin()
+            if "error" in result:
+                self._connection.execute(
+                    "UPDATE items SET status = 'failed', attempts = attempts + 1, error = ?, content = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (result["error"], content, time.time(), item_id)
+                )
+            else:
+                self._connection.execute(
+                    "UPDATE items SET status = 'done', attempts = attempts + 1, error = NULL, content = NULL, "
+                    "result = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(result).encode("utf-8"), time.time(), item_id)
+                )
+            self._uncommitted += 1
+            if self._uncommitted >= self.checkpoint_every:
+                self.checkpoint()
+        return result
+
+    # Failed transcripts with attempts left, in input order
+    def retry_failed(self):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, filename, content FROM items WHERE status = 'failed' AND attempts < ? "
+                "ORDER BY position",
+                (self.max_attempts,)
+            ).fetchall()
+        for item_id, filename, content in rows:
+            yield self._send(item_id, {"filename": filename, "content": content})
+
+    # Analyze every transcript not done yet with ``analyzer`` (anything with
+    # ``iter_isolated`` that copies each transcript's "sequence" id to its
+    # result), then retry the failed ones one at a time. Yields the
+    # results of this run as they are checkpointed; ``progress_callback``
+    # gets the number of transcripts done or failed so far, this run's and
+    # earlier runs' alike.
+    def run(self, analyzer, transcripts, progress_callback=None):
+        def report(_):
+            if progress_callback is not None:
+                progress = self.progress()
+                progress_callback(progress["done"] + progress["failed"])
+
+        try:
+            for result in analyzer.iter_isolated(self.pending(transcripts), self.checkpoint_every, report):
+                yield self.record(result)
+            self.checkpoint()
+            for transcript_data in self.retry_failed():
+                for result in analyzer.iter_isolated([transcript_data], 1, report):
+                    yield self.record(result)
+        finally:
+            self._in_flight.clear()
+            self.checkpoint()
+
+    # Every result of the job in input order, failed transcripts as
+    # {"filename", "error"} records; transcripts not analyzed yet are left out
+    def results(self, page_size=256):
+        position = -1
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT position, filename, status, error, result FROM items "
+                    "WHERE position > ? AND status != 'pending' ORDER BY position LIMIT ?",
+                    (position, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for position, filename, status, error, result in rows:
+                if status == "done":
+                    yield json.loads(result)
+                else:
+                    yield {"filename": filename, "error": error}
+
+    # (filename, error, attempts) of every failed transcript, in input order
+    def failures(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT filename, error, attempts FROM items WHERE status = 'failed' ORDER BY position"
+            ).fetchall()
+
+    # Number of transcripts read so far, by status
+    def progress(self):
+        with self._lock:
+            counts = dict(self._connection.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall())
+        progress = {status: counts.get(status, 0) for status in ("done", "failed", "pending")}
+        progress["total"] = sum(progress.values())
+        return progress
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self.checkpoint()
+                self._connection.close()
+                self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,181 @@
+"""Adaptive batch sizing for the batch pipeline, driven by RSS and latency.
+
+``BatchScheduler`` picks the number of transcripts in the next batch (also
+the SpaCy ``nlp.pipe`` batch size) and the number of texts per sentiment
+model call. After each batch it reads the process RSS and the batch's wall
+time, and applies additive-increase/multiplicative-decrease:
+
+- RSS over the memory budget: collect garbage and halve both sizes.
+- RSS over ``gc_threshold`` of the budget: collect garbage, and halve both
+  sizes if RSS is still over the threshold afterwards.
+- A batch slower than the latency target: shrink the batch in proportion
+  to the overshoot.
+- A batch well within the target: grow both sizes by ``increase``, as long
+  as the RSS projected from the last batch's growth stays under the
+  threshold.
+
+Garbage is collected only in the first two cases, never unconditionally.
+Every decision is kept, with its reason, in ``decisions``. With
+``adaptive=False`` the sizes stay fixed and only the memory-pressure
+garbage collection applies.
+
+Batches may run on several threads at once (the HTTP service's executor):
+``start`` returns a token with the batch's own start time and RSS, and
+decisions are made under a lock.
+"""
+import gc
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+import psutil
+
+
+# Memory monitoring function
+def get_memory_usage():
+    process = psutil.Process(os.getpid())
+    memory_info = process.memory_info()
+    memory_usage_mb = memory_info.rss / 1024 / 1024
+    return memory_usage_mb
+
+
+# Batches of (input index, item), ``batch_size()`` items each. Items are read
+# ``window_batches`` batches ahead and sorted by ``key`` within that window,
+# so a batch holds items of similar length and pads less; a batch never spans
+# two windows. With ``window_batches`` 0 the input order is kept.
+def length_ordered_batches(items, batch_size, window_batches, key):
+    items = iter(items)
+    offset = 0
+    while True:
+        window = list(islice(items, max(1, batch_size()) * max(1, window_batches)))
+        if not window:
+            return
+        order = list(range(len(window)))
+        if window_batches:
+            order.sort(key=lambda index: key(window[index]))
+        position = 0
+        while position < len(order):
+            size = max(1, batch_size())
+            yield [(offset + index, window[index]) for index in order[position:position + size]]
+            position += size
+        offset += len(window)
+
+
+class BatchScheduler:
+    """AIMD controller for the batch and sentiment batch sizes; see the module docstring."""
+
+    def __init__(self, batch_size=8, sentiment_batch_size=None, adaptive=True, memory_budget_mb=2048,
+                 target_seconds=2.0, min_batch_size=1, max_batch_size=256, max_sentiment_batch_size=64,
+                 increase=2, gc_threshold=0.85, history=500, memory_usage=get_memory_usage):
+        self.batch_size = batch_size
+        self.sentiment_batch_size = sentiment_batch_size or batch_size
+        self.adaptive = adaptive
+        self.memory_budget_mb = memory_budget_mb
+        self.target_seconds = target_seconds
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_sentiment_batch_size = max_sentiment_batch_size
+        self.increase = increase
+        self.gc_threshold = gc_threshold
+        self.memory_usage = memory_usage
+        self.decisions = deque(maxlen=history)
+        self.batches = 0
+        self.gc_runs = 0
+        self._configured_size = batch_size
+        self._lock = threading.Lock()
+
+    # Apply settings that may have changed since the last run. A new starting
+    # batch size resets both sizes; a fixed scheduler always uses it.
+    def configure(self, batch_size, adaptive, memory_budget_mb, target_seconds):
+        with self._lock:
+            if batch_size != self._configured_size or not adaptive:
+                self.batch_size = self.sentiment_batch_size = batch_size
+                self._configured_size = batch_size
+            self.adaptive = adaptive
+            self.memory_budget_mb = memory_budget_mb
+            self.target_seconds = target_seconds
+
+    # The token ``finish`` takes: the RSS and time the batch started at
+    def start(self):
+        return self.memory_usage(), time.perf_counter()
+
+    # Record a finished batch of ``transcripts``, started at ``token``, and
+    # choose the next sizes; returns the decision
+    def finish(self, token, transcripts):
+        rss_before, started = token
+        seconds = time.perf_counter() - started
+        rss = self.memory_usage()
+        growth_per_transcript = max(0.0, rss - rss_before) / max(1, transcripts)
+        with self._lock:
+            return self._decide(transcripts, seconds, rss, growth_per_transcript)
+
+    def _decide(self, transcripts, seconds, rss, growth_per_transcript):
+        budget = self.memory_budget_mb
+        threshold = budget * self.gc_threshold
+        batch_size, sentiment_batch_size = self.batch_size, self.sentiment_batch_size
+        freed = None
+
+        if rss > threshold:
+            freed = self._collect()
+            rss -= freed
+        if rss > threshold:
+            action = "shrink"
+            over = "budget" if rss > budget else f"{self.gc_threshold:.0%} of the budget"
+            reason = f"RSS {rss:.0f} MB over {over} ({budget:.0f} MB) after GC"
+            batch_size = max(self.min_batch_size, batch_size // 2)
+            sentiment_batch_size = max(1, sentiment_batch_size // 2)
+        elif seconds > self.target_seconds:
+            action = "shrink"
+            reason = f"batch took {seconds:.2f}s, over the {self.target_seconds:.2f}s target"
+            batch_size = max(self.min_batch_size, min(batch_size - 1, int(batch_size * self.target_seconds / seconds)))
+        elif rss + growth_per_transcript * self.increase > threshold:
+            action = "hold"
+            reason = f"RSS {rss:.0f} MB leaves no room to grow within the {budget:.0f} MB budget"
+        elif seconds > self.target_seconds * 0.8:
+            action = "hold"
+            reason = f"batch took {seconds:.2f}s, close to the {self.target_seconds:.2f}s target"
+        else:
+            action = "grow"
+            reason = f"batch took {seconds:.2f}s of {self.target_seconds:.2f}s, RSS {rss:.0f} MB of {budget:.0f} MB"
+            batch_size = min(self.max_batch_size, batch_size + self.increase)
+            sentiment_batch_size = min(self.max_sentiment_batch_size, sentiment_batch_size + self.increase)
+            if (batch_size, sentiment_batch_size) == (self.batch_size, self.sentiment_batch_size):
+                action = "hold"
+                reason = "at the largest batch sizes"
+
+        if not self.adaptive:
+            action = "fixed"
+            batch_size, sentiment_batch_size = self.batch_size, self.sentiment_batch_size
+            reason = "adaptive batching is off" + ("; GC ran under memory pressure" if freed is not None else "")
+        elif freed is not None and action != "shrink":
+            reason = f"GC freed {freed:.0f} MB; " + reason
+
+        decision = {
+            "batch": self.batches,
+            "transcripts": transcripts,
+            "seconds": round(seconds, 4),
+            "ms_per_transcript": round(seconds * 1000 / max(1, transcripts), 2),
+            "rss_mb": round(rss, 1),
+            "gc_freed_mb": None if freed is None else round(freed, 1),
+            "action": action,
+            "reason": reason,
+            "batch_size": batch_size,
+            "sentiment_batch_size": sentiment_batch_size
+        }
+        self.decisions.append(decision)
+        self.batches += 1
+        self.batch_size, self.sentiment_batch_size = batch_size, sentiment_batch_size
+        return decision
+
+    # Collect garbage and return the RSS it released, in MB
+    def _collect(self):
+        before = self.memory_usage()
+        gc.collect()
+        self.gc_runs += 1
+        return max(0.0, before - self.memory_usage())
+
+    # Decisions for batches numbered ``first`` and later
+    def decisions_since(self, first):
+        return [decision for decision in self.decisions if decision["batch"] >= first]
@@ -0,0 +1,128 @@
+"""Batch throughput, GC runs and padding with fixed vs. adaptive batch sizes.
+
+Runs the batch pipeline over synthetic transcripts of very different
+lengths with:
+
+- a fixed batch size and a garbage collection after every batch (the
+  behaviour before the scheduler),
+- a fixed batch size, collecting garbage only under memory pressure, with
+  and without ordering by length,
+- the adaptive scheduler, with and without ordering by length.
+
+The stand-in sentiment model charges ``--call-cost-ms`` per model call and
+``--token-cost-us`` per padded token, so batching and padding show up in the
+timings as they would with a real model. Then checks that the scheduler
+shrinks batches when RSS is over the budget or batches are over the latency
+target, and grows them when there is room. Fails if a check does not hold or
+any variant's results differ.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_adaptive_batching
+"""
+import argparse
+import random
+import sys
+import time
+from itertools import islice
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from benchmarks.generator import generate_transcript
+from benchmarks.stand_ins import StandInSentimentPipeline, stand_in_nlp
+
+
+class PaddedSentiment(StandInSentimentPipeline):
+    """Stand-in sentiment model that pads each minibatch and charges for every token."""
+
+    def __init__(self, call_cost, token_cost):
+        super().__init__()
+        self.call_cost = call_cost
+        self.token_cost = token_cost
+        self.tokens = 0
+        self.padded = 0
+
+    def __call__(self, texts, batch_size=8, truncation=False):
+        lengths = iter(len(ids) for ids in self.tokenizer(texts, truncation=truncation)["input_ids"])
+        while True:
+            minibatch = list(islice(lengths, batch_size))
+            if not minibatch:
+                break
+            self.tokens += sum(minibatch)
+            self.padded += max(minibatch) * len(minibatch)
+            time.sleep(self.call_cost + max(minibatch) * len(minibatch) * self.token_cost)
+        return super().__call__(texts, batch_size, truncation)
+
+
+def run(config, corpus, call_cost=0.0, token_cost=0.0):
+    sentiment_model = PaddedSentiment(call_cost, token_cost)
+    pipeline = TranscriptAnalyzer(config, nlp=stand_in_nlp(), sentiment_model=sentiment_model)
+    start = time.perf_counter()
+    results = list(pipeline.iter_results(corpus))
+    elapsed = time.perf_counter() - start
+    return pipeline.scheduler, sentiment_model, results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--target-seconds", type=float, default=0.25)
+    parser.add_argument("--call-cost-ms", type=float, default=5.0)
+    parser.add_argument("--token-cost-us", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [
+        {"filename": f"synthetic_{index:06d}", "content": generate_transcript(rng, turns=rng.choice([5, 20, 80, 200]))}
+        for index in range(args.transcripts)
+    ]
+    config = dict(
+        DEFAULT_CONFIG, result_cache=False, batch_size=args.batch_size, target_batch_seconds=args.target_seconds
+    )
+    costs = (args.call_cost_ms / 1e3, args.token_cost_us / 1e6)
+
+    variants = [
+        ("fixed, GC every batch", dict(config, adaptive_batching=False, memory_budget_mb=0, length_order_batches=0)),
+        ("fixed, GC under pressure", dict(config, adaptive_batching=False, length_order_batches=0)),
+        ("fixed, length order", dict(config, adaptive_batching=False)),
+        ("adaptive, input order", dict(config, length_order_batches=0)),
+        ("adaptive, length order", config)
+    ]
+    print(f"{args.transcripts} transcripts, starting batch size {args.batch_size}, "
+          f"target {args.target_seconds:.2f}s per batch")
+    print(f"{'variant':<26} {'docs/s':>8} {'GC runs':>8} {'batches':>8} {'final size':>11} {'padding':>8}")
+    status = 0
+    reference = None
+    for label, variant_config in variants:
+        scheduler, sentiment_model, results, elapsed = run(variant_config, corpus, *costs)
+        padding = 1 - sentiment_model.tokens / max(1, sentiment_model.padded)
+        print(f"{label:<26} {len(corpus) / elapsed:>8.1f} {scheduler.gc_runs:>8} {scheduler.batches:>8} "
+              f"{scheduler.batch_size:>5}/{scheduler.sentiment_batch_size:<5} {padding:>8.1%}")
+        reference = reference or results
+        if results != reference:
+            print(f"FAIL: {label} results differ", file=sys.stderr)
+            status = 1
+
+    # The scheduler reacts to memory pressure and to slow and fast batches
+    sample = corpus[:120]
+    checks = [
+        ("RSS over budget shrinks batches", dict(config, memory_budget_mb=1),
+         lambda scheduler: scheduler.batch_size == 1 and scheduler.gc_runs == scheduler.batches),
+        ("slow batches shrink", dict(config, target_batch_seconds=1e-6),
+         lambda scheduler: scheduler.batch_size == 1 and scheduler.gc_runs == 0),
+        ("fast batches grow", dict(config, target_batch_seconds=60.0),
+         lambda scheduler: scheduler.batch_size > args.batch_size and scheduler.gc_runs == 0)
+    ]
+    for label, check_config, holds in checks:
+        scheduler = run(check_config, sample)[0]
+        outcome = "ok" if holds(scheduler) else "FAIL"
+        print(f"{label:<34} {outcome:<5} final batch size {scheduler.batch_size}, {scheduler.gc_runs} GC runs; "
+              f"last: {scheduler.decisions[-1]['reason']}")
+        if outcome == "FAIL":
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
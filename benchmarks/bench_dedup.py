@@ -0,0 +1,142 @@
+"""Near-duplicate detection: how many copies are caught and how much time it saves.
+
+Builds a feed of ``--transcripts`` synthetic transcripts in which a share
+(``--duplicate-share``) are copies of an earlier transcript:
+
+- re-exports: a header line added and whitespace changed,
+- edits: one to three words replaced,
+- follow-ups: one turn rewritten, as in a templated follow-up visit.
+
+The feed is analyzed with deduplication on and off, with the offline
+stand-in models unless ``--real-models`` is given; the stand-in sentiment
+model takes ``--model-ms`` per text, about what the real models take per
+transcript on a CPU. Reports, per kind of copy,
+the share flagged as a duplicate, how often a duplicate's result equals the
+result of analyzing the copy itself, and the wall time, dedup ratio and
+estimated time saved of both runs. Fails if a transcript that is not a copy
+is flagged, if a re-export is missed, or if fewer than 90% of edits are
+caught.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_dedup --transcripts 2000
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from benchmarks.generator import FILLER_WORDS, generate_corpus, generate_turn
+from benchmarks.stand_ins import StandInSentimentPipeline, stand_in_nlp
+
+KINDS = ("re-export", "edit", "follow-up")
+
+
+class SlowSentiment(StandInSentimentPipeline):
+    def __init__(self, seconds_per_text):
+        super().__init__()
+        self.seconds_per_text = seconds_per_text
+
+    def __call__(self, texts, batch_size=8, truncation=False):
+        time.sleep(self.seconds_per_text * (1 if isinstance(texts, str) else len(texts)))
+        return super().__call__(texts, batch_size, truncation)
+
+
+def copy_of(text, kind, rng):
+    if kind == "re-export":
+        return f"Exported {rng.randint(1, 28):02d}/03/2024 by records\n\n" + text.replace("\n", "\r\n  ")
+    lines = text.split("\n")
+    if kind == "edit":
+        for _ in range(rng.randint(1, 3)):
+            index = rng.randrange(len(lines))
+            words = lines[index].split(" ")
+            words[rng.randrange(1, len(words))] = rng.choice(FILLER_WORDS)
+            lines[index] = " ".join(words)
+    else:
+        index = rng.randrange(len(lines))
+        lines[index] = generate_turn(rng, lines[index].split(":", 1)[0])
+    return "\n".join(lines)
+
+
+# The feed, and the kind of copy each transcript is (None for originals)
+def build_feed(count, duplicate_share, seed):
+    rng = random.Random(seed)
+    originals = generate_corpus(count, seed=seed)
+    feed, kinds = [], []
+    for index in range(count):
+        if feed and rng.random() < duplicate_share:
+            kind = KINDS[index % len(KINDS)]
+            source = rng.choice([item for item, item_kind in zip(feed[-200:], kinds[-200:]) if item_kind is None]
+                                or feed[-1:])
+            feed.append({"filename": f"copy_{index:06d}", "content": copy_of(source["content"], kind, rng)})
+            kinds.append(kind)
+        else:
+            feed.append(next(originals))
+            kinds.append(None)
+    return feed, kinds
+
+
+def run(config, feed, models):
+    analyzer = TranscriptAnalyzer(config, nlp=models[0], sentiment_model=models[1])
+    start = time.perf_counter()
+    results = list(analyzer.iter_results(feed))
+    elapsed = time.perf_counter() - start
+    index = analyzer.duplicate_index
+    return results, elapsed, index.stats() if index is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=2000)
+    parser.add_argument("--duplicate-share", type=float, default=0.4)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_CONFIG['dedup_threshold'])
+    parser.add_argument("--real-models", action="store_true", help="Use the configured models instead of stand-ins")
+    parser.add_argument("--model-ms", type=float, default=10.0, help="Time the stand-in models take per transcript")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    feed, kinds = build_feed(args.transcripts, args.duplicate_share, args.seed)
+    models = (None, None)
+    if not args.real_models:
+        models = (stand_in_nlp(), SlowSentiment(args.model_ms / 1000))
+    config = dict(DEFAULT_CONFIG, result_cache=False, dedup=True, dedup_threshold=args.threshold)
+    # Warm up the lexicon and models so neither timed run pays for loading them
+    run(dict(config, dedup=False), feed[:50], models)
+    baseline, baseline_seconds, _ = run(dict(config, dedup=False), feed, models)
+    results, seconds, stats = run(config, feed, models)
+
+    print(f"{len(feed)} transcripts, {sum(kind is not None for kind in kinds)} copies, threshold {args.threshold}")
+    print(f"{'kind':<12} {'count':>6} {'flagged':>8} {'same result':>12}")
+    flagged, same, counts = Counter(), Counter(), Counter(kinds)
+    for result, expected, kind in zip(results, baseline, kinds):
+        if "duplicate_of" in result:
+            flagged[kind] += 1
+            same[kind] += {**result, "duplicate_of": None} == {**expected, "duplicate_of": None}
+    for kind in KINDS + (None,):
+        label = kind or "original"
+        print(f"{label:<12} {counts[kind]:>6} {flagged[kind] / max(1, counts[kind]):>8.1%} "
+              f"{same[kind] / max(1, flagged[kind]):>12.1%}")
+    print(f"dedup off: {baseline_seconds:.2f}s; dedup on: {seconds:.2f}s "
+          f"({stats['dedup_ratio']:.1%} deduplicated: {stats['exact']} exact, {stats['near']} near; "
+          f"estimated {stats['seconds_saved']:.2f}s saved, {stats['match_seconds']:.2f}s spent matching)")
+
+    status = 0
+    if [result["filename"] for result in results] != [item["filename"] for item in feed]:
+        print("FAIL: results out of input order", file=sys.stderr)
+        status = 1
+    if flagged[None]:
+        print(f"FAIL: {flagged[None]} transcripts that are not copies flagged as duplicates", file=sys.stderr)
+        status = 1
+    if flagged["re-export"] < counts["re-export"]:
+        print("FAIL: re-exports missed", file=sys.stderr)
+        status = 1
+    if flagged["edit"] < 0.9 * counts["edit"]:
+        print("FAIL: fewer than 90% of edits caught", file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
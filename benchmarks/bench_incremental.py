@@ -0,0 +1,81 @@
+"""Re-analysis time of an edited transcript, full vs. incremental.
+
+Analyzes a long synthetic transcript, changes one word in a single patient
+turn and analyzes it again, once from scratch and once reusing the per-turn
+results of the first run. Fails if the incremental result differs from the
+full one. Uses the offline stand-in models unless ``--real-models`` is given;
+with the real models SpaCy may tag a turn on its own slightly differently than
+within the whole transcript, so the comparison is skipped.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_incremental --turns 400
+"""
+import argparse
+import random
+import sys
+import time
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from benchmarks.generator import generate_transcript
+from benchmarks.stand_ins import stand_in_models
+
+
+# The transcript with one word of one patient turn changed
+def edit_one_turn(text, rng):
+    lines = text.split("\n")
+    patient_lines = [index for index, line in enumerate(lines) if line.startswith("Patient:")]
+    index = rng.choice(patient_lines)
+    lines[index] += " Actually, it was worse yesterday."
+    return "\n".join(lines)
+
+
+def best_time(function, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--real-models", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    original = generate_transcript(rng, turns=args.turns)
+    config = dict(DEFAULT_CONFIG, result_cache=False, chunked=True, sentiment_per_turn=True)
+    models = {}
+    if not args.real_models:
+        models["nlp"], models["sentiment_model"] = stand_in_models()
+
+    full = TranscriptAnalyzer(dict(config, incremental=False), **models)
+    incremental = TranscriptAnalyzer(dict(config, incremental=True), **models)
+    full.load_models()
+    incremental.load_models()
+
+    # Each incremental repeat edits a fresh copy of the warmed-up original
+    edits = [edit_one_turn(original, rng) for _ in range(args.repeats)]
+    full_time, expected = best_time(lambda: full.analyze(edits[-1]), args.repeats)
+    incremental.analyze(original)
+    pending = iter(edits)
+    incremental_time, result = best_time(lambda: incremental.analyze(next(pending)), args.repeats)
+    stats = incremental.turn_cache.stats()
+
+    print(f"{'full':<12} {full_time * 1000:>9.1f} ms")
+    print(f"{'incremental':<12} {incremental_time * 1000:>9.1f} ms  "
+          f"({full_time / incremental_time:.1f}x, {stats['hits']} turn results reused)")
+    if not args.real_models and result != expected:
+        print("FAIL: incremental result differs from the full analysis", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
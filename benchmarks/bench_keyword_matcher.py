@@ -0,0 +1,102 @@
+"""Keyword matching throughput against lexicon size.
+
+Compares the per-keyword ``keyword in text_lower`` scans the pipeline used to
+run with the single-pass Aho-Corasick matcher, for lexicons grown from the
+built-in medical vocabulary up to tens of thousands of synthetic terms.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_keyword_matcher
+"""
+import argparse
+import random
+import string
+import time
+
+from keyword_matcher import DEFAULT_LEXICON_PATH, KeywordMatcher, ahocorasick, read_lexicon
+
+TURNS = [
+    "Physician: How are you feeling today?",
+    "Patient: I'm doing better, but I still have some discomfort now and then.",
+    "Physician: Are you still taking the painkillers?",
+    "Patient: Only when the neck pain gets bad, maybe twice a week.",
+    "Physician: And the physiotherapy sessions?",
+    "Patient: They helped a lot with the stiffness after the car accident.",
+    "Physician: Any worry about driving since then?",
+    "Patient: A little concern at first, but it's improving.",
+]
+
+
+def make_transcript(rng, turns):
+    return "\n".join(rng.choice(TURNS) for _ in range(turns))
+
+
+def make_lexicon(rng, extra_terms):
+    lexicon, _ = read_lexicon(DEFAULT_LEXICON_PATH)
+    synthetic = lexicon.setdefault("synthetic", {})
+    while len(synthetic) < extra_terms:
+        words = [
+            "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+            for _ in range(rng.randint(1, 3))
+        ]
+        synthetic[" ".join(words)] = "Synthetic term"
+    return lexicon
+
+
+def naive_scan(lexicon, text):
+    text_lower = text.lower()
+    found = []
+    for category, keywords in lexicon.items():
+        for keyword, label in keywords.items():
+            if keyword.lower() in text_lower:
+                found.append((category, label))
+    return found
+
+
+def measure(function, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 100, 1000, 5000, 20000])
+    parser.add_argument("--transcripts", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [make_transcript(rng, args.turns) for _ in range(args.transcripts)]
+    megabytes = sum(len(text) for text in texts) / 1e6
+
+    print(f"{args.transcripts} transcripts, {megabytes:.2f} MB total")
+    header = f"{'terms':>8} {'naive MB/s':>12} {'python AC MB/s':>15}"
+    if ahocorasick is not None:
+        header += f" {'pyahocorasick MB/s':>19}"
+    print(header)
+
+    for size in args.sizes:
+        lexicon = make_lexicon(rng, size)
+        terms = sum(len(keywords) for keywords in lexicon.values())
+
+        naive = measure(lambda text: naive_scan(lexicon, text), texts, args.repeat)
+        python_matcher = KeywordMatcher(lexicon, accelerated=False)
+        python_ac = measure(python_matcher.scan, texts, args.repeat)
+
+        row = f"{terms:>8} {megabytes / naive:>12.2f} {megabytes / python_ac:>15.2f}"
+        if ahocorasick is not None:
+            native_matcher = KeywordMatcher(lexicon)
+            native = measure(native_matcher.scan, texts, args.repeat)
+            row += f" {megabytes / native:>19.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Load time and match throughput of a large lexicon file.
+
+Writes the built-in lexicon grown to ``--terms`` terms (synthetic labels with
+one to three synonyms each) as a lexicon file, then compares rebuilding the
+matcher in memory with compiling the on-disk index once and memory-mapping
+it, and measures a hot reload after the file changes. Fails if the
+memory-mapped matcher finds different hits than the in-memory one.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_lexicon --terms 50000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_keyword_matcher import make_transcript
+from keyword_matcher import (
+    DEFAULT_LEXICON_PATH, KeywordMatcher, LexiconWatcher, ahocorasick, load_lexicon, read_lexicon
+)
+
+
+def write_lexicon(path, rng, terms):
+    with open(DEFAULT_LEXICON_PATH, encoding="utf-8") as lexicon_file:
+        document = json.load(lexicon_file)
+    synthetic = document["categories"].setdefault("synthetic", [])
+    seen = set()
+    count = 0
+    while count < terms:
+        synonyms = []
+        for _ in range(rng.randint(1, 3)):
+            term = " ".join(
+                "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+                for _ in range(rng.randint(1, 3))
+            )
+            if term not in seen:
+                seen.add(term)
+                synonyms.append(term)
+        synthetic.append({"label": f"Synthetic term {len(synthetic)}", "terms": synonyms})
+        count += len(synonyms)
+    with open(path, "w", encoding="utf-8") as lexicon_file:
+        json.dump(document, lexicon_file)
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def throughput(matcher, texts, megabytes, repeat):
+    best = min(timed(lambda: [matcher.scan(text) for text in texts])[0] for _ in range(repeat))
+    return megabytes / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--terms", type=int, default=50000)
+    parser.add_argument("--transcripts", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [make_transcript(rng, args.turns) for _ in range(args.transcripts)]
+    megabytes = sum(len(text) for text in texts) / 1e6
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lexicon.json")
+        cache_dir = os.path.join(directory, "index")
+        write_lexicon(path, rng, args.terms)
+        lexicon, case_sensitive = read_lexicon(path)
+        terms = sum(len(keywords) for keywords in lexicon.values())
+        print(f"{terms} terms, {os.path.getsize(path) / 1e6:.1f} MB lexicon file; "
+              f"{args.transcripts} transcripts, {megabytes:.2f} MB")
+        print(f"{'matcher':<28} {'load s':>8} {'MB/s':>8}")
+
+        variants = [("in-memory, python", False)]
+        if ahocorasick is not None:
+            variants.append(("in-memory, pyahocorasick", True))
+        reference = None
+        for label, accelerated in variants:
+            load, matcher = timed(lambda: KeywordMatcher(*read_lexicon(path), accelerated=accelerated))
+            print(f"{label:<28} {load:>8.3f} {throughput(matcher, texts, megabytes, args.repeat):>8.1f}")
+            reference = reference or matcher
+
+        compile_time, _ = timed(lambda: load_lexicon(path, cache_dir, accelerated=False))
+        print(f"{'compile index (once)':<28} {compile_time:>8.3f}")
+        variants = [("mmap index, python", False)]
+        if ahocorasick is not None:
+            variants.append(("mmap index, pyahocorasick", True))
+        status = 0
+        for label, accelerated in variants:
+            load, matcher = timed(lambda: load_lexicon(path, cache_dir, accelerated=accelerated))
+            print(f"{label:<28} {load:>8.3f} {throughput(matcher, texts, megabytes, args.repeat):>8.1f}")
+            if any(matcher.scan(text).hits != reference.scan(text).hits for text in texts):
+                print(f"FAIL: {label} finds different hits than the in-memory matcher", file=sys.stderr)
+                status = 1
+
+        # Hot reload: one more synonym, picked up by the watcher
+        watcher = LexiconWatcher(path, cache_dir, check_interval=0)
+        with open(path, encoding="utf-8") as lexicon_file:
+            document = json.load(lexicon_file)
+        document["categories"]["symptom"][0]["terms"].append("soreness")
+        with open(path, "w", encoding="utf-8") as lexicon_file:
+            json.dump(document, lexicon_file)
+        reload_time, reloaded = timed(watcher.reload)
+        print(f"{'hot reload after an edit':<28} {reload_time:>8.3f}")
+        if not reloaded or not watcher.current().scan("some soreness").hits:
+            print("FAIL: the edited lexicon was not reloaded", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
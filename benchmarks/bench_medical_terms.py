@@ -0,0 +1,97 @@
+"""Medical terms from the spaCy ``medical_terms`` component vs. the keyword scan.
+
+Parses synthetic transcripts with ``nlp.pipe`` and finds their symptom,
+treatment and diagnosis terms two ways: a separate keyword scan after the
+parse, and the ``medical_terms`` component during the parse. Reports docs/sec
+for both and the keyword-scan hits that fall inside a longer word with a
+different meaning (such as "pain" in "painkillers"), which the component does
+not report. Fails if the component tags a term off token boundaries, or if its
+hits differ between 1 and 2 processes.
+
+Uses the offline stand-in pipeline unless ``--model`` names a spaCy model.
+Run from the repository root:
+
+    python -m benchmarks.bench_medical_terms
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+
+import spacy
+
+from benchmarks.bench_keyword_matcher import make_transcript
+from benchmarks.stand_ins import stand_in_nlp
+from keyword_matcher import medical_matcher
+from medical_terms import TERM_CATEGORIES, add_medical_terms
+from transcript_context import MAX_SPACY_CHARS, MEDICAL_TERMS_COMPONENT, unused_spacy_components
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", help="spaCy model to load instead of the stand-in pipeline")
+    parser.add_argument("--transcripts", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [make_transcript(rng, args.turns)[:MAX_SPACY_CHARS] for _ in range(args.transcripts)]
+    nlp = add_medical_terms(spacy.load(args.model)) if args.model else stand_in_nlp()
+    matcher = medical_matcher()
+    disabled = unused_spacy_components(nlp)
+    print(f"{len(texts)} transcripts, model {args.model or 'stand-in'}")
+
+    # Keyword scan after the parse
+    def scan():
+        docs = nlp.pipe(texts, batch_size=args.batch_size, disable=disabled + [MEDICAL_TERMS_COMPONENT])
+        return [
+            [hit for hit in matcher.scan(doc.text) if hit.category in TERM_CATEGORIES]
+            for doc in docs
+        ]
+
+    # Terms tagged during the parse
+    def component(n_process=1):
+        docs = nlp.pipe(texts, batch_size=args.batch_size, n_process=n_process, disable=disabled)
+        return [(doc, doc._.medical_terms["hits"]) for doc in docs]
+
+    scan_time, scanned = timed(scan)
+    component_time, tagged = timed(component)
+    print(f"{'nlp.pipe + keyword scan':<32} {len(texts) / scan_time:>8.1f} docs/sec")
+    print(f"{'nlp.pipe with medical_terms':<32} {len(texts) / component_time:>8.1f} docs/sec")
+
+    status = 0
+    in_word = Counter()
+    for scan_hits, (doc, hits) in zip(scanned, tagged):
+        for hit in scan_hits:
+            # Partial matches of a tagged term with the same label are not
+            # false positives ("painkiller" within "painkillers")
+            if not any(start <= hit.start and hit.end <= end and label == hit.label
+                       for start, end, _, _, label, _ in hits):
+                word = doc.char_span(hit.start, hit.end, alignment_mode="expand").text
+                in_word[f"{hit.keyword!r} in {word!r} -> {hit.label}"] += 1
+        for start, end, keyword, *_ in hits:
+            if doc.char_span(start, end) is None:
+                print(f"FAIL: {keyword!r} at {start}:{end} is not on token boundaries", file=sys.stderr)
+                status = 1
+    print(f"keyword-scan hits inside longer words: {sum(in_word.values())}")
+    for example, count in in_word.most_common(5):
+        print(f"  {count:>6}  {example}")
+
+    _, parallel = timed(lambda: component(n_process=2))
+    if [hits for _, hits in parallel] != [hits for _, hits in tagged]:
+        print("FAIL: medical_terms hits differ between 1 and 2 processes", file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
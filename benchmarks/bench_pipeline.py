@@ -0,0 +1,206 @@
+"""Per-stage and end-to-end pipeline benchmarks with baseline comparison.
+
+Times ``extract_medical_details``, ``structured_summary``,
+``analyze_sentiment_and_intent``, ``generate_soap_note`` and end-to-end
+``TranscriptAnalyzer.process_transcripts_in_batches`` over a seeded synthetic
+corpus (``benchmarks/generator.py``). By default the models are replaced by the
+offline stand-ins in ``benchmarks/stand_ins.py``, so the suite needs no
+downloads; ``--real-models`` loads the configured models instead.
+
+Each measurement is the best of ``--repeat`` runs (as with ``timeit``, the
+minimum is the least noisy estimate), reported per transcript. ``--save``
+writes the results to a baseline file; ``--compare`` checks them against a
+baseline and exits non-zero when any benchmark is more than ``--tolerance``
+slower.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_pipeline --save
+    python -m benchmarks.bench_pipeline --compare
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from analyzer import (
+    DEFAULT_CONFIG,
+    TranscriptAnalyzer,
+    analyze_sentiment_and_intent,
+    extract_medical_details,
+    generate_soap_note,
+    structured_summary,
+)
+from benchmarks.generator import generate_corpus
+from benchmarks.stand_ins import StandInSentimentPipeline, stand_in_nlp
+from transcript_context import TranscriptContext, parse_contexts
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline_baseline.json")
+
+# Workload settings recorded with the results; comparisons warn when they differ
+WORKLOAD_KEYS = ("transcripts", "turns", "patient_ratio", "keyword_density", "batch_size", "seed", "real_models")
+
+
+# Best wall time of ``run(setup())`` over ``repeat`` runs, divided by
+# ``items``; ``setup`` runs outside the timed region
+def measure(run, setup, repeat, items):
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / items
+
+
+def run_benchmarks(args):
+    config = dict(
+        DEFAULT_CONFIG,
+        batch_size=args.batch_size,
+        result_cache=False,
+        prewarm_models=False
+    )
+    if args.real_models:
+        analyzer = TranscriptAnalyzer(config)
+    else:
+        analyzer = TranscriptAnalyzer(config, nlp=stand_in_nlp(), sentiment_model=StandInSentimentPipeline())
+    nlp, sentiment_model = analyzer.load_models()
+
+    corpus = list(generate_corpus(
+        args.transcripts,
+        seed=args.seed,
+        turns=args.turns,
+        patient_ratio=args.patient_ratio,
+        keyword_density=args.keyword_density
+    ))
+    count = len(corpus)
+
+    # Parse once; every stage benchmark gets fresh contexts sharing these Docs
+    docs = [
+        context.doc for context in parse_contexts(
+            (TranscriptContext(item["content"], nlp=nlp) for item in corpus), nlp, batch_size=args.batch_size
+        )
+    ]
+
+    def fresh_contexts():
+        contexts = []
+        for item, doc in zip(corpus, docs):
+            context = TranscriptContext(item["content"], nlp=nlp)
+            context.doc = doc
+            contexts.append(context)
+        return contexts
+
+    # Inputs for the later stages, computed once outside the timings
+    prepared = fresh_contexts()
+    details = [extract_medical_details(context) for context in prepared]
+    summaries = [structured_summary(detail, context) for detail, context in zip(details, prepared)]
+    max_text_length = config['max_text_length']
+
+    benchmarks = {
+        # Includes the keyword scan, which the context runs on first use
+        "extract_medical_details": (
+            lambda contexts: [extract_medical_details(context) for context in contexts],
+            fresh_contexts
+        ),
+        "structured_summary": (
+            lambda state: [structured_summary(detail, context) for detail, context in state],
+            lambda: list(zip(details, prepared))
+        ),
+        "analyze_sentiment_and_intent": (
+            lambda contexts: [
+                analyze_sentiment_and_intent(context, sentiment_model, max_text_length) for context in contexts
+            ],
+            lambda: prepared
+        ),
+        "generate_soap_note": (
+            lambda state: [generate_soap_note(summary, context) for summary, context in state],
+            lambda: list(zip(summaries, prepared))
+        ),
+        "process_transcripts_in_batches": (
+            analyzer.process_transcripts_in_batches,
+            lambda: corpus
+        )
+    }
+
+    results = {}
+    for name, (run, setup) in benchmarks.items():
+        per_item = measure(run, setup, args.repeat, count)
+        results[name] = {"per_item_us": per_item * 1e6, "items_per_s": 1 / per_item if per_item else 0.0}
+        print(f"{name:<32} {per_item * 1e6:>12.1f} us/transcript {1 / per_item:>12.1f} transcripts/s")
+    return results
+
+
+# Flags benchmarks slower than the baseline by more than ``tolerance``;
+# returns the names of the regressions
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'benchmark':<32} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            print(f"{name:<32} {'-':>12} {result['per_item_us']:>12.1f}      new")
+            continue
+        before = baseline["results"][name]["per_item_us"]
+        change = result["per_item_us"] / before - 1 if before else 0.0
+        status = ""
+        if change > tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif change < -tolerance:
+            status = "improved"
+        print(f"{name:<32} {before:>12.1f} {result['per_item_us']:>12.1f} {change:>+8.1%} {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--patient-ratio", type=float, default=0.5)
+    parser.add_argument("--keyword-density", type=float, default=0.3)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CONFIG['batch_size'])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--real-models", action="store_true",
+                        help="Use the configured SpaCy and sentiment models instead of offline stand-ins")
+    parser.add_argument("--save", nargs="?", const=BASELINE_PATH, help="Write results to a baseline file")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, help="Compare results with a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Slowdown, as a fraction of the baseline, reported as a regression")
+    args = parser.parse_args()
+
+    workload = {key: getattr(args, key) for key in WORKLOAD_KEYS}
+    print(", ".join(f"{key}={value}" for key, value in workload.items()))
+    results = run_benchmarks(args)
+
+    status = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["workload"] != workload:
+            print("WARNING: the baseline was recorded with a different workload", file=sys.stderr)
+        if baseline["machine"] != platform.platform():
+            print("WARNING: the baseline was recorded on a different machine", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"FAIL: {len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}: "
+                  f"{', '.join(regressions)}", file=sys.stderr)
+            status = 1
+        else:
+            print("OK: no regressions")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as baseline_file:
+            json.dump({
+                "workload": workload,
+                "machine": platform.platform(),
+                "python": platform.python_version(),
+                "results": results
+            }, baseline_file, indent=2)
+        print(f"Saved baseline to {args.save}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Batch throughput of the in-process pipeline vs. the process pool.
+
+Analyzes a seeded synthetic corpus in-process and then with
+``ProcessPoolAnalyzer`` at increasing worker counts, and reports transcripts per
+second once the workers have loaded their models (pool start-up is reported
+separately). Uses the offline stand-in models unless ``--real-models`` is
+given; stand-ins are cheap, so the real models show the speed-up better.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_process_pool --workers 1 2 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from benchmarks.generator import generate_corpus
+from benchmarks.stand_ins import stand_in_models
+from process_pool import ProcessPoolAnalyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CONFIG['batch_size'])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--real-models", action="store_true")
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIG, batch_size=args.batch_size, result_cache=False)
+    models_factory = None if args.real_models else stand_in_models
+    corpus = list(generate_corpus(args.transcripts, seed=args.seed, turns=args.turns))
+
+    if args.real_models:
+        analyzer = TranscriptAnalyzer(config)
+    else:
+        nlp, sentiment_model = stand_in_models()
+        analyzer = TranscriptAnalyzer(config, nlp=nlp, sentiment_model=sentiment_model)
+    analyzer.load_models()
+    start = time.perf_counter()
+    expected = list(analyzer.iter_results(corpus))
+    elapsed = time.perf_counter() - start
+    print(f"{'in-process':<16} {len(corpus) / elapsed:>10.1f} transcripts/s")
+
+    for workers in args.workers:
+        with ProcessPoolAnalyzer(config, workers=workers, models_factory=models_factory) as pool:
+            # One small batch so every worker has loaded its models
+            start = time.perf_counter()
+            list(pool.iter_results(corpus[:workers * args.batch_size]))
+            startup = time.perf_counter() - start
+
+            start = time.perf_counter()
+            results = list(pool.iter_results(corpus))
+            elapsed = time.perf_counter() - start
+        label = f"{workers} workers"
+        print(f"{label:<16} {len(corpus) / elapsed:>10.1f} transcripts/s  (start-up {startup:.1f}s)")
+        if results != expected:
+            print(f"FAIL: results with {workers} workers differ from the in-process results", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
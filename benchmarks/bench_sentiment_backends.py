@@ -0,0 +1,112 @@
+"""Compare sentiment inference backends on a fixed transcript set.
+
+Each backend (fp32 PyTorch, int8-quantized PyTorch, ONNX Runtime) runs in its
+own fresh process on the same seeded synthetic transcripts and reports:
+
+* load time and RSS increase after loading;
+* single-text latency (median and p95);
+* batched throughput through ``classify_in_batches``;
+* label agreement with the fp32 PyTorch baseline.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_sentiment_backends
+"""
+import argparse
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from analyzer import DEFAULT_CONFIG, classify_in_batches
+from batch_scheduler import get_memory_usage
+from benchmarks.bench_keyword_matcher import make_transcript
+from sentiment_backends import SENTIMENT_BACKENDS, load_sentiment_pipeline
+from transcript_context import TranscriptContext
+
+
+def patient_texts(count, turns, seed, max_text_length):
+    rng = random.Random(seed)
+    return [
+        TranscriptContext(make_transcript(rng, turns)).patient_text[:max_text_length]
+        for _ in range(count)
+    ]
+
+
+def measure_backend(args):
+    texts = patient_texts(args.transcripts, args.turns, args.seed, args.max_text_length)
+
+    memory_before = get_memory_usage()
+    start = time.perf_counter()
+    model = load_sentiment_pipeline(args.model, args.worker)
+    load_time = time.perf_counter() - start
+    memory_loaded = get_memory_usage()
+
+    # Warm-up, then single-text latency
+    model(texts[:2])
+    latencies = []
+    for text in texts:
+        start = time.perf_counter()
+        model(text)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    start = time.perf_counter()
+    classifications = classify_in_batches(model, texts, args.batch_size)
+    batched = time.perf_counter() - start
+
+    return {
+        "load_s": load_time,
+        "rss_mb": memory_loaded - memory_before,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "throughput": len(texts) / batched,
+        "labels": [classification["label"] for classification in classifications]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=DEFAULT_CONFIG['sentiment_model'])
+    parser.add_argument("--backends", nargs="+", default=list(SENTIMENT_BACKENDS), choices=SENTIMENT_BACKENDS)
+    parser.add_argument("--transcripts", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CONFIG['batch_size'])
+    parser.add_argument("--max-text-length", type=int, default=DEFAULT_CONFIG['max_text_length'])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--worker", choices=SENTIMENT_BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure_backend(args)))
+        return 0
+
+    reports = {}
+    for backend in args.backends:
+        command = [sys.executable, "-m", "benchmarks.bench_sentiment_backends", "--worker", backend]
+        for option in ("model", "transcripts", "turns", "batch_size", "max_text_length", "seed"):
+            command += ["--" + option.replace("_", "-"), str(getattr(args, option))]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{backend}: failed\n{completed.stderr.strip().splitlines()[-1]}", file=sys.stderr)
+            continue
+        reports[backend] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    baseline = reports.get("pytorch", {}).get("labels")
+    print(f"{args.transcripts} transcripts, model {args.model}")
+    print(f"{'backend':<14} {'load s':>7} {'RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>8} {'agreement':>10}")
+    for backend, report in reports.items():
+        if baseline:
+            matches = sum(label == expected for label, expected in zip(report["labels"], baseline))
+            agreement = f"{100.0 * matches / len(baseline):.1f}%"
+        else:
+            agreement = "n/a"
+        print(f"{backend:<14} {report['load_s']:>7.2f} {report['rss_mb']:>8.1f} {report['p50_ms']:>8.2f} "
+              f"{report['p95_ms']:>8.2f} {report['throughput']:>8.1f} {agreement:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""spaCy parsing throughput: one document at a time vs. batched ``nlp.pipe``.
+
+Parses a few hundred synthetic transcripts the way the batch pipeline does
+(entity components only) at 1, 2, 4 and 8 worker processes, and reports
+documents per second next to the old one-call-per-document loop.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_spacy_pipe
+"""
+import argparse
+import random
+import time
+
+import spacy
+
+from benchmarks.bench_keyword_matcher import make_transcript
+from transcript_context import MAX_SPACY_CHARS, unused_spacy_components
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="en_core_web_sm")
+    parser.add_argument("--transcripts", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [make_transcript(rng, args.turns)[:MAX_SPACY_CHARS] for _ in range(args.transcripts)]
+    nlp = spacy.load(args.model)
+    disabled = unused_spacy_components(nlp)
+    print(f"{len(texts)} transcripts, model {args.model}, disabled: {', '.join(disabled) or 'none'}")
+
+    start = time.perf_counter()
+    for text in texts:
+        nlp(text)
+    elapsed = time.perf_counter() - start
+    print(f"{'nlp(text), full pipeline':<32} {len(texts) / elapsed:>8.1f} docs/sec")
+
+    for n_process in args.processes:
+        start = time.perf_counter()
+        for _ in nlp.pipe(texts, batch_size=args.batch_size, n_process=n_process, disable=disabled):
+            pass
+        elapsed = time.perf_counter() - start
+        label = f"nlp.pipe, n_process={n_process}"
+        print(f"{label:<32} {len(texts) / elapsed:>8.1f} docs/sec")
+
+
+if __name__ == "__main__":
+    main()
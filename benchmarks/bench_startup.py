@@ -0,0 +1,93 @@
+"""Cold-start benchmark: time-to-first-render and time-to-first-result.
+
+Every measurement runs in a fresh interpreter so imports and model loads are
+cold (apart from the OS page cache). Reported times are medians over
+``--runs`` runs, measured from interpreter start.
+
+* first render: the Streamlit script finishes its first run (via
+  ``streamlit.testing``), with models still loading in the background;
+* models ready: both background model loads have finished;
+* first result: one transcript analyzed through ``TranscriptAnalyzer``,
+  with models loaded one after the other (the old start-up path) or
+  concurrently by the warm pool, with and without pre-warming.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RENDER_SCRIPT = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+AppTest.from_file("app.py", default_timeout=600).run()
+render = time.perf_counter() - start
+import analyzer
+for future in analyzer.MODEL_REGISTRY.futures():
+    future.result()
+print(json.dumps({"first render": render, "models ready": time.perf_counter() - start}))
+"""
+
+RESULT_SCRIPT = """
+import time
+start = time.perf_counter()
+import analyzer
+config = dict(analyzer.DEFAULT_CONFIG, result_cache=False, prewarm_models={prewarm})
+if {sequential}:
+    analyzer.preload_model("spacy", config['spacy_model'], lexicon_path=config['lexicon_path']).result()
+    analyzer.preload_model("sentiment", config['sentiment_model'], backend=config['sentiment_backend']).result()
+transcript_analyzer = analyzer.TranscriptAnalyzer(config)
+transcript_analyzer.start_loading()
+transcript_analyzer.analyze({transcript!r})
+print(json.dumps({{"first result": time.perf_counter() - start}}))
+"""
+
+TRANSCRIPT = (
+    "Physician: How are you feeling today?\n"
+    "Patient: I'm doing better, but I still have some neck pain since the car accident in September.\n"
+    "Physician: Are the painkillers and physiotherapy helping?\n"
+    "Patient: Yes, it's improving.\n"
+)
+
+
+def run(script, runs):
+    timings = {}
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", "import json\n" + script],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        for name, value in json.loads(output.strip().splitlines()[-1]).items():
+            timings.setdefault(name, []).append(value)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = list(run(RENDER_SCRIPT, args.runs).items())
+    for label, sequential, prewarm in [
+        ("sequential load", True, False),
+        ("warm pool", False, False),
+        ("warm pool + pre-warm", False, True),
+    ]:
+        script = RESULT_SCRIPT.format(sequential=sequential, prewarm=prewarm, transcript=TRANSCRIPT)
+        for name, value in run(script, args.runs).items():
+            rows.append((f"{name} ({label})", value))
+
+    for name, value in rows:
+        print(f"{name:<40} {value:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Speaker-turn segmentation of a multi-megabyte transcript: line loop vs. offsets.
+
+Builds one synthetic transcript of about ``--megabytes`` MB whose turns are
+wrapped onto lines of ``--wrap-width`` characters, and segments it with:
+
+- the line-by-line loop the pipeline used before ``speaker_turns``, which
+  keeps only the labelled first line of each turn,
+- ``speaker_turns.segment`` on the whole text,
+- ``speaker_turns.TurnSegmenter`` fed ``--chunk-kb`` KB at a time.
+
+Reports the time, the peak memory allocated while segmenting, and the share
+of the patient's words each one keeps. Fails unless the streamed turns equal
+the whole-text turns, and unless the patient's words match those of the same
+transcript without wrapping.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_turn_segmentation --megabytes 8
+"""
+import argparse
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_transcript
+from speaker_turns import TurnSegmenter, segment
+
+LINE_PATTERN = re.compile(r"^\s*(Physician|Patient):")
+
+
+# The former segmentation: one turn per labelled line, continuations dropped
+def line_turns(text):
+    turns = []
+    offset = 0
+    for line in text.split("\n"):
+        match = LINE_PATTERN.match(line)
+        if match:
+            turns.append((match.group(1), offset, offset + len(line), line[match.end():].strip()))
+        offset += len(line) + 1
+    return turns
+
+
+def streamed(text, chunk_size):
+    segmenter = TurnSegmenter()
+    tables = [segmenter.feed(text[start:start + chunk_size]) for start in range(0, len(text), chunk_size)]
+    tables.append(segmenter.close())
+    return tables
+
+
+# Best wall time of ``repeats`` runs of ``function()``, then the peak memory
+# it allocates (MB), traced in a separate run since tracing slows it down
+def measured(function, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        del result
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def words(texts):
+    return [word for text in texts for word in text.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=8.0)
+    parser.add_argument("--wrap-width", type=int, default=60)
+    parser.add_argument("--chunk-kb", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # ~110 characters per turn
+    turns = int(args.megabytes * 1024 * 1024 / 110)
+    words_per_turn = (6, 20)
+    unwrapped = generate_transcript(random.Random(args.seed), turns=turns, words_per_turn=words_per_turn)
+    text = generate_transcript(
+        random.Random(args.seed), turns=turns, words_per_turn=words_per_turn, wrap_width=args.wrap_width
+    )
+    expected = words(segment(unwrapped).texts("Patient"))
+    print(f"{len(text) / 1024 / 1024:.1f} MB, {turns} turns wrapped at {args.wrap_width} characters, "
+          f"{text.count(chr(10)) + 1} lines")
+
+    variants = [
+        ("line loop", lambda: line_turns(text),
+         lambda turns: [turn[3] for turn in turns if turn[0] == "Patient"]),
+        ("segment", lambda: segment(text), lambda table: table.texts("Patient")),
+        (f"streamed, {args.chunk_kb} KB pieces", lambda: streamed(text, args.chunk_kb * 1024),
+         lambda tables: [turn_text for table in tables for turn_text in table.texts("Patient")])
+    ]
+    print(f"{'variant':<28} {'seconds':>8} {'peak MB':>8} {'patient words kept':>19}")
+    results = {}
+    for label, run, patient_texts in variants:
+        elapsed, peak, result = measured(run)
+        kept = len(words(patient_texts(result)))
+        print(f"{label:<28} {elapsed:>8.3f} {peak:>8.1f} {kept / max(1, len(expected)):>19.1%}")
+        results[label] = (result, patient_texts(result))
+
+    status = 0
+    table, patient = results["segment"]
+    tables, streamed_patient = results[variants[2][0]]
+    if [turn for piece in tables for turn in piece] != list(table) or streamed_patient != patient:
+        print("FAIL: streamed turns differ from whole-text turns", file=sys.stderr)
+        status = 1
+    if words(patient) != expected:
+        print("FAIL: wrapped patient turns lost words", file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
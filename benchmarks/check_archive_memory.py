@@ -0,0 +1,161 @@
+"""Check that a multi-gigabyte transcript archive is analyzed at flat memory.
+
+Writes a synthetic archive (``--format`` tar.gz, zip or jsonl) holding
+``--gigabytes`` GB of transcripts of about ``--transcript-kb`` KB each,
+without holding it in memory. Some members are encoded as cp1252 or UTF-16
+so encoding detection is exercised. The archive is then streamed through
+``batch_io.iter_transcripts`` and ``read_ahead`` into
+``TranscriptAnalyzer.iter_results`` with the offline stand-in models, and
+RSS is sampled as results are written. The batch size is fixed, since
+adaptive batching would legitimately grow memory up to its budget. Checks
+that:
+
+- every transcript is read, with the text it was written with,
+- after the warm-up, RSS stays within ``--max-growth-mb`` of its level then.
+
+Exits non-zero if a check fails. Run from the repository root (use a smaller
+``--gigabytes`` for a quick run):
+
+    python -m benchmarks.check_archive_memory --gigabytes 2
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from batch_io import JsonlWriter, iter_transcripts, read_ahead
+from batch_scheduler import get_memory_usage
+from benchmarks.generator import generate_transcript
+from benchmarks.stand_ins import stand_in_models
+
+# Distinct transcripts the archive cycles through
+POOL_SIZE = 32
+
+# Non-ASCII text every transcript ends with, so a wrong decoding shows
+ACCENTED_TURN = "Patient: The café near the clinic, naïve as it sounds, helped."
+
+
+# The member's text and how it is encoded: mostly UTF-8, every 7th cp1252,
+# every 11th UTF-16 with a byte order mark
+def member(pool, index):
+    text = pool[index % len(pool)]
+    encoding = "cp1252" if index % 7 == 3 else "utf-16" if index % 11 == 5 else "utf-8"
+    return f"transcript_{index:07d}", text, encoding
+
+
+def write_archive(path, archive_format, pool, count):
+    if archive_format == "tar.gz":
+        with tarfile.open(path, "w:gz", compresslevel=1) as archive:
+            for index in range(count):
+                name, text, encoding = member(pool, index)
+                data = text.encode(encoding)
+                info = tarfile.TarInfo(f"transcripts/{name}.txt")
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+    elif archive_format == "zip":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            for index in range(count):
+                name, text, encoding = member(pool, index)
+                archive.writestr(f"transcripts/{name}.txt", text.encode(encoding))
+    else:
+        # JSON Lines are UTF-8 throughout
+        with open(path, "w", encoding="utf-8") as output_file:
+            for index in range(count):
+                name, text, _ = member(pool, index)
+                output_file.write(json.dumps({"filename": name, "content": text}) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gigabytes", type=float, default=2.0, help="Uncompressed size of the archive")
+    parser.add_argument("--format", choices=["tar.gz", "zip", "jsonl"], default="tar.gz")
+    parser.add_argument("--transcript-kb", type=float, default=64.0)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CONFIG['batch_size'])
+    parser.add_argument("--read-ahead", type=int, default=DEFAULT_CONFIG['read_ahead'])
+    parser.add_argument("--warmup", type=float, default=0.05,
+                        help="Fraction of transcripts processed before the RSS baseline is taken")
+    parser.add_argument("--max-growth-mb", type=float, default=64.0)
+    parser.add_argument("--directory", help="Where to write the archive (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # ~110 characters per turn
+    turns = max(1, int(args.transcript_kb * 1024 / 110))
+    pool = [generate_transcript(rng, turns=turns) + "\n" + ACCENTED_TURN for _ in range(POOL_SIZE)]
+    count = max(1, int(args.gigabytes * 1024 ** 3 / (sum(map(len, pool)) / len(pool))))
+
+    directory = tempfile.TemporaryDirectory(dir=args.directory)
+    path = os.path.join(directory.name, f"transcripts.{args.format}")
+    start = time.perf_counter()
+    write_archive(path, args.format, pool, count)
+    print(f"Wrote {count} transcripts ({args.gigabytes:.1f} GB) to a {os.path.getsize(path) / 1024 ** 2:.0f} MB "
+          f"{args.format} file in {time.perf_counter() - start:.0f}s")
+
+    failures = []
+    mismatched = []
+
+    # Compares each transcript with the text it was written with as it passes
+    def checked(transcripts):
+        for transcript_data in transcripts:
+            index = int(transcript_data["filename"].rsplit("_", 1)[1].split(".")[0])
+            if transcript_data["content"] != pool[index % len(pool)]:
+                mismatched.append(transcript_data["filename"])
+            yield transcript_data
+
+    nlp, sentiment_model = stand_in_models()
+    config = dict(DEFAULT_CONFIG, result_cache=False, dedup=False, batch_size=args.batch_size,
+                  adaptive_batching=False)
+    analyzer = TranscriptAnalyzer(config, nlp=nlp, sentiment_model=sentiment_model)
+    warmup_count = max(1, int(count * args.warmup))
+    baseline = None
+    peak = 0.0
+    start = time.perf_counter()
+    transcripts = read_ahead(
+        iter_transcripts([path], on_error=lambda filename, message: failures.append((filename, message))),
+        args.read_ahead
+    )
+    with JsonlWriter(os.devnull) as writer:
+        for result in analyzer.iter_results(checked(transcripts)):
+            writer.write(result)
+            if writer.count == warmup_count:
+                baseline = get_memory_usage()
+            elif baseline is not None and writer.count % 200 == 0:
+                peak = max(peak, get_memory_usage())
+                print(f"{writer.count:>8} transcripts  RSS {peak:.1f} MB", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    directory.cleanup()
+
+    baseline = baseline if baseline is not None else get_memory_usage()
+    peak = max(peak, get_memory_usage())
+    growth = peak - baseline
+    print(f"Analyzed {writer.count} transcripts in {elapsed:.0f}s "
+          f"({writer.count / elapsed:.1f}/s, {args.gigabytes * 1024 / elapsed:.1f} MB/s)")
+    print(f"RSS after warm-up: {baseline:.1f} MB, peak: {peak:.1f} MB, growth: {growth:.1f} MB")
+
+    status = 0
+    for filename, message in failures[:5]:
+        print(f"FAIL: could not read {filename}: {message}", file=sys.stderr)
+    if writer.count != count or failures:
+        print(f"FAIL: read {writer.count} of {count} transcripts", file=sys.stderr)
+        status = 1
+    if mismatched:
+        print(f"FAIL: {len(mismatched)} transcripts decoded wrongly, e.g. {mismatched[0]}", file=sys.stderr)
+        status = 1
+    if growth > args.max_growth_mb:
+        print(f"FAIL: RSS grew by more than {args.max_growth_mb:.0f} MB", file=sys.stderr)
+        status = 1
+    if not status:
+        print("OK: every transcript read correctly, memory stayed bounded")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Check that a batch job survives a crash and resumes where it stopped.
+
+Runs a ``batch_jobs.BatchJob`` over ``--transcripts`` synthetic transcripts
+with the offline stand-in models, in a child process that is killed
+(``os._exit``) after ``--crash-after`` results, then resumes the job in this
+process. One transcript always makes the sentiment model raise, and one
+fails on its first two attempts only. Checks that:
+
+- the resumed run skips every transcript checkpointed before the crash and
+  loses at most ``--checkpoint-every`` of them,
+- the job's results equal those of an uninterrupted run, in input order,
+- the always-failing transcript is reported with its error after
+  ``--max-attempts`` attempts, without failing any other transcript,
+- the flaky transcript succeeds when failed transcripts are retried,
+- resuming a finished job analyzes nothing,
+- resuming with different settings is refused.
+
+Exits non-zero if a check fails. Run from the repository root:
+
+    python -m benchmarks.check_resumable_jobs
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from batch_jobs import BatchJob
+from benchmarks.generator import generate_corpus
+from benchmarks.stand_ins import StandInSentimentPipeline, stand_in_nlp
+
+ALWAYS_FAILS = "Patient: This line always breaks the sentiment model."
+FLAKY = "Patient: This line breaks the sentiment model twice."
+
+
+class FailingSentiment(StandInSentimentPipeline):
+    """Raises for ``ALWAYS_FAILS``, and for ``FLAKY`` on its first two calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+
+    def __call__(self, texts, batch_size=8, truncation=False):
+        for text in [texts] if isinstance(texts, str) else texts:
+            if ALWAYS_FAILS[len("Patient: "):] in text:
+                raise RuntimeError("sentiment model failed")
+            if FLAKY[len("Patient: "):] in text:
+                self.calls[FLAKY] += 1
+                if self.calls[FLAKY] <= 2:
+                    raise RuntimeError("sentiment model failed transiently")
+        return super().__call__(texts, batch_size, truncation)
+
+
+def corpus(count):
+    transcripts = list(generate_corpus(count, seed=3))
+    for index, marker in ((count // 3, ALWAYS_FAILS), (2 * count // 3, FLAKY)):
+        # First, so it is within the text the sentiment model sees
+        transcripts[index] = dict(transcripts[index], content=marker + "\n" + transcripts[index]["content"])
+    return transcripts
+
+
+def analyzer(sentiment_model=None):
+    config = dict(DEFAULT_CONFIG, result_cache=False, adaptive_batching=False)
+    return TranscriptAnalyzer(config, nlp=stand_in_nlp(), sentiment_model=sentiment_model or FailingSentiment())
+
+
+# Child process: run the job and die without closing it after ``crash_after`` results
+def crash(args):
+    session = analyzer()
+    job = BatchJob(args.job, session.fingerprint(), args.checkpoint_every, args.max_attempts)
+    for produced, _ in enumerate(job.run(session, corpus(args.transcripts)), 1):
+        if produced == args.crash_after:
+            os._exit(0)
+    os._exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=600)
+    parser.add_argument("--crash-after", type=int, default=250)
+    parser.add_argument("--checkpoint-every", type=int, default=64)
+    parser.add_argument("--max-attempts", type=int, default=2)
+    parser.add_argument("--job", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.job:
+        crash(args)
+
+    failures = []
+
+    def check(label, holds, detail=""):
+        print(f"{'ok' if holds else 'FAIL':<5} {label}{': ' + detail if detail else ''}")
+        if not holds:
+            failures.append(label)
+
+    transcripts = corpus(args.transcripts)
+    reference = list(analyzer(StandInSentimentPipeline()).iter_isolated(transcripts))
+    reference[args.transcripts // 3] = None  # the always-failing transcript
+
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, "job.sqlite3")
+    child = subprocess.run(
+        [sys.executable, "-m", "benchmarks.check_resumable_jobs", "--job", path,
+         "--transcripts", str(args.transcripts), "--crash-after", str(args.crash_after),
+         "--checkpoint-every", str(args.checkpoint_every), "--max-attempts", str(args.max_attempts)]
+    )
+    check("child process killed mid-run", child.returncode == 0, f"exit status {child.returncode}")
+
+    session = analyzer()
+    with BatchJob(path, session.fingerprint(), args.checkpoint_every, args.max_attempts) as job:
+        checkpointed = job.progress()
+        start = time.perf_counter()
+        resumed = list(job.run(session, transcripts))
+        elapsed = time.perf_counter() - start
+        lost = args.crash_after - job.skipped
+        print(f"Crashed after {args.crash_after} results; {checkpointed['done']} done and "
+              f"{checkpointed['failed']} failed at the last checkpoint. Resumed run: {job.skipped} skipped, "
+              f"{len(resumed)} analyzed in {elapsed:.1f}s")
+        check("checkpointed transcripts skipped", 0 <= lost <= args.checkpoint_every,
+              f"{lost} results since the last checkpoint redone")
+        check("nothing else analyzed twice", len(resumed) + job.skipped <= args.transcripts + args.max_attempts)
+
+        results = list(job.results())
+        failed = [result for result in results if "error" in result]
+        check("every transcript in the results, in input order",
+              [result["filename"] for result in results] == [item["filename"] for item in transcripts])
+        check("same results as an uninterrupted run",
+              all(expected is None or result == expected for result, expected in zip(results, reference)))
+        check("only the always-failing transcript failed",
+              [result["filename"] for result in failed] == [transcripts[args.transcripts // 3]["filename"]],
+              "; ".join(f"{result['filename']}: {result['error']}" for result in failed))
+        attempts = [attempts for _, _, attempts in job.failures()]
+        check("failed transcript attempted max-attempts times", attempts == [args.max_attempts],
+              f"{attempts} attempts")
+        check("flaky transcript succeeded on retry", "error" not in results[2 * args.transcripts // 3])
+
+    with BatchJob(path, session.fingerprint(), args.checkpoint_every, args.max_attempts) as job:
+        again = list(job.run(session, transcripts))
+        check("finished job analyzes nothing", not again and job.skipped == args.transcripts - 1,
+              f"{len(again)} analyzed, {job.skipped} skipped")
+
+    try:
+        BatchJob(path, "other settings").close()
+        refused = False
+    except ValueError:
+        refused = True
+    check("different settings refused", refused)
+    directory.cleanup()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Check that two callers of the HTTP service never share a result.
+
+Starts the service in-process with its default settings (``service.py`` run
+without options, the result cache left off) and the offline stand-in
+models, then posts two near-identical transcripts about different patients
+as two callers: concurrently, so they land in one micro-batch, one after the
+other, and within one bulk request. Checks that:
+
+- the pair is a near-duplicate at the default threshold, so the check
+  would catch a shared near-duplicate index,
+- no result is flagged with ``duplicate_of``,
+- each result equals that of analyzing its transcript alone in a fresh
+  analyzer,
+- ``GET /stats`` reports no near-duplicate index.
+
+Exits non-zero if a check fails. Run from the repository root:
+
+    python -m benchmarks.check_service_isolation
+"""
+import argparse
+import asyncio
+import sys
+
+import aiohttp
+from aiohttp import web
+
+from analyzer import TranscriptAnalyzer
+from benchmarks.generator import generate_corpus
+from benchmarks.stand_ins import stand_in_models
+from service import build_config, build_parser, create_app
+
+
+# A transcript naming Ms. Jones and whiplash, and a copy about another
+# patient with another diagnosis
+def transcript_pair(seed):
+    text = next(
+        item["content"] for item in generate_corpus(50, seed=seed)
+        if "Ms. Jones" in item["content"] and "whiplash" in item["content"].lower()
+    )
+    copy = text.replace("Ms. Jones", "Mr. Smith").replace("whiplash", "sprain").replace("Whiplash", "Sprain")
+    return {"filename": "jones", "content": text}, {"filename": "smith", "content": copy}
+
+
+def analyzed_alone(config, transcript_data):
+    nlp, sentiment_model = stand_in_models()
+    analyzer = TranscriptAnalyzer(dict(config, dedup=False), nlp=nlp, sentiment_model=sentiment_model)
+    return analyzer.process_isolated([transcript_data])[0]
+
+
+async def post(session, url, transcript_data):
+    async with session.post(f"{url}/analyze", json={
+        "filename": transcript_data["filename"], "text": transcript_data["content"]
+    }) as response:
+        return await response.json()
+
+
+async def main_async(args):
+    config = dict(build_config(build_parser().parse_args([])), result_cache=False)
+    pair = transcript_pair(args.seed)
+    expected = [analyzed_alone(config, transcript_data) for transcript_data in pair]
+
+    nlp, sentiment_model = stand_in_models()
+    probe = TranscriptAnalyzer(dict(config, dedup=True), nlp=nlp, sentiment_model=sentiment_model)
+    probe_results = probe.process_isolated(list(pair))
+
+    nlp, sentiment_model = stand_in_models()
+    analyzer = TranscriptAnalyzer(config, nlp=nlp, sentiment_model=sentiment_model)
+    analyzer.load_models()
+    app = create_app(analyzer, max_batch_size=16, max_wait=args.max_wait_ms / 1000)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}"
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            runs = {"concurrent": await asyncio.gather(*(post(session, url, item) for item in pair))}
+            runs["sequential"] = [await post(session, url, item) for item in pair]
+            async with session.post(f"{url}/analyze/batch", json={"transcripts": list(pair)}) as response:
+                runs["bulk"] = (await response.json())["results"]
+            async with session.get(f"{url}/stats") as response:
+                stats = await response.json()
+    finally:
+        await runner.cleanup()
+
+    failures = 0
+
+    def check(label, holds, detail=""):
+        nonlocal failures
+        failures += not holds
+        print(f"{'ok' if holds else 'FAIL':<5} {label}{': ' + detail if detail else ''}")
+
+    similarity = probe_results[1].get("duplicate_of", {}).get("similarity")
+    check("pair is a near-duplicate at the default threshold", similarity is not None, f"similarity {similarity}")
+    for name, results in runs.items():
+        check(f"{name}: no result flagged as a duplicate", not any("duplicate_of" in result for result in results))
+        check(f"{name}: each result equals analyzing it alone", results == expected,
+              ", ".join(f"{result['filename']}: {result['summary']['Patient_Name']}" for result in results))
+    check("/stats reports no near-duplicate index", "dedup" not in stats)
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-wait-ms", type=float, default=50.0,
+                        help="Micro-batch wait, long enough for both concurrent requests to share a batch")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
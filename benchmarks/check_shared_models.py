@@ -0,0 +1,174 @@
+"""Check that concurrent sessions share one copy of each model.
+
+Simulates ``--sessions`` Streamlit sessions, each with its own
+``TranscriptAnalyzer`` and config, analyzing transcripts at the same time on
+separate threads against one ``ModelRegistry``. The stand-in models carry
+``--model-mb`` MB of ballast, so a second copy of a model would show up in
+RSS. Checks that:
+
+- each model is loaded exactly once and every session gets the same instance,
+- RSS grows by less than half a model over the single-session level,
+- no model is ever called by two sessions at once,
+- every session gets the single-session results,
+- switching the sentiment backend loads the new model once and unloads the
+  old one when no session holds it any more, as does discarding sessions,
+- an idle model is evicted and loaded again on the next use.
+
+Exits non-zero if any check fails. Run from the repository root:
+
+    python -m benchmarks.check_shared_models --sessions 8
+"""
+import argparse
+import gc
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from spacy.language import Language
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from batch_scheduler import get_memory_usage
+from benchmarks.generator import generate_corpus
+from benchmarks.stand_ins import StandInSentimentPipeline, stand_in_nlp
+from model_registry import ModelRegistry
+
+
+class ConcurrencyProbe:
+    """Counts the callers inside a model at the same time."""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        # Widen the window in which an unserialized call would overlap
+        time.sleep(0.0005)
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.active -= 1
+
+
+PROBES = {"spacy": ConcurrencyProbe(), "sentiment": ConcurrencyProbe()}
+
+
+@Language.component("concurrency_probe")
+def concurrency_probe(doc):
+    with PROBES["spacy"]:
+        return doc
+
+
+class ProbedSentiment(StandInSentimentPipeline):
+    def __call__(self, texts, batch_size=8, truncation=False):
+        with PROBES["sentiment"]:
+            return super().__call__(texts, batch_size, truncation)
+
+
+def ballast(megabytes):
+    # Written to, so every page is resident
+    return bytearray(b"\x01") * int(megabytes * 1024 * 1024)
+
+
+def stand_in_loader(model_mb):
+    def load(kind, model_name, prewarm, options):
+        if kind == "spacy":
+            model = stand_in_nlp()
+            # Named like an entity component, so batch parsing keeps it enabled
+            model.add_pipe("concurrency_probe", name="ner")
+        else:
+            model = ProbedSentiment()
+        model.ballast = ballast(model_mb)
+        return model
+    return load
+
+
+# One session: its own analyzer and config, analyzing one transcript at a
+# time and then a batch
+def run_session(registry, config, corpus):
+    session = TranscriptAnalyzer(dict(config), registry=registry)
+    results = [session.analyze(transcript_data["content"]) for transcript_data in corpus[:5]]
+    results.extend(session.iter_results(corpus))
+    return session, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--transcripts", type=int, default=60)
+    parser.add_argument("--model-mb", type=float, default=150.0)
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(label, holds, detail=""):
+        print(f"{'ok' if holds else 'FAIL':<5} {label}{': ' + detail if detail else ''}")
+        if not holds:
+            failures.append(label)
+
+    registry = ModelRegistry(stand_in_loader(args.model_mb), unload_delay=0, sweep_interval=3600)
+    config = dict(DEFAULT_CONFIG, result_cache=False, incremental=False, prewarm_models=False)
+    corpus = list(generate_corpus(args.transcripts, seed=1))
+    baseline = get_memory_usage()
+
+    reference_session, reference = run_session(registry, config, corpus)
+    single = get_memory_usage()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        runs = list(executor.map(lambda _: run_session(registry, config, corpus), range(args.sessions)))
+    sessions = [reference_session] + [session for session, _ in runs]
+    concurrent = get_memory_usage()
+
+    stats = registry.stats()
+    print(f"{args.sessions} concurrent sessions, {len(corpus)} transcripts each; models: "
+          + ", ".join(f"{row['kind']} ({row['holders']} holders, {row['calls']} calls, "
+                      f"{row['lock_wait_s']:.2f}s waiting for the lock)" for row in stats))
+    print(f"RSS: {baseline:.0f} MB before, {single:.0f} MB with one session, {concurrent:.0f} MB with all")
+    check("each model loaded once", len(stats) == 2 and all(row["loads"] == 1 for row in stats))
+    check("one instance per model", all(
+        session.nlp is sessions[0].nlp and session.sentiment_model is sessions[0].sentiment_model
+        for session in sessions
+    ))
+    check("RSS bounded", concurrent - single < args.model_mb / 2, f"grew {concurrent - single:.0f} MB")
+    check("no concurrent calls into a model", all(probe.max_active == 1 for probe in PROBES.values()),
+          ", ".join(f"{kind} max {probe.max_active}" for kind, probe in PROBES.items()))
+    check("same results in every session", all(results == reference for _, results in runs))
+
+    # Every session switches the sentiment backend; the old model goes once
+    # the last session lets go of it
+    for session in sessions:
+        session.config['sentiment_backend'] = "pytorch-int8"
+        session.sentiment_model
+    registry.evict()
+    gc.collect()
+    switched = get_memory_usage()
+    states = {(row["kind"], row["options"].get("backend")): row for row in registry.stats()}
+    check("new backend loaded once", states.get(("sentiment", "pytorch-int8"), {}).get("loads") == 1)
+    check("old backend unloaded", ("sentiment", "pytorch") not in states,
+          f"RSS {concurrent:.0f} -> {switched:.0f} MB")
+
+    # Discarded sessions release their models
+    del sessions, session, runs, reference_session
+    gc.collect()
+    registry.evict()
+    released = get_memory_usage()
+    check("models unloaded with the last session", not registry.stats(), f"RSS {released:.0f} MB")
+
+    # Idle eviction
+    idle_session = TranscriptAnalyzer(dict(config, model_idle_timeout=0.2), registry=registry)
+    idle_session.analyze(corpus[0]["content"])
+    loaded = {row["kind"]: row["loads"] for row in registry.stats()}
+    time.sleep(0.3)
+    evicted = registry.evict()
+    idle_session.analyze(corpus[0]["content"])
+    reloaded = {row["kind"]: row["loads"] - loaded[row["kind"]] for row in registry.stats()}
+    check("idle models evicted and reloaded", len(evicted) == 2 and reloaded == {"spacy": 1, "sentiment": 1},
+          f"{len(evicted)} evicted, reloads {reloaded}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
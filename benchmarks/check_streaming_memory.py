@@ -0,0 +1,84 @@
+"""Check that streaming batch analysis runs at flat memory.
+
+Feeds lazily generated synthetic transcripts through
+``TranscriptAnalyzer.iter_results`` into a JSONL sink and samples RSS as it
+goes, with the offline stand-in models unless ``--real-models`` is given.
+The result cache and near-duplicate detection are off, so every transcript
+goes through the pipeline, and the batch size is fixed, since adaptive
+batching would legitimately grow memory up to its budget. After a warm-up
+period (model caches, allocator pools) RSS must stay
+within ``--max-growth-mb`` of the post-warm-up level; the script exits
+non-zero otherwise.
+
+Run from the repository root (use a smaller ``--transcripts`` for a quick run):
+
+    python -m benchmarks.check_streaming_memory --transcripts 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from batch_io import JsonlWriter
+from batch_scheduler import get_memory_usage
+from benchmarks.bench_keyword_matcher import make_transcript
+from benchmarks.stand_ins import stand_in_models
+
+
+def generate_transcripts(count, turns, seed):
+    rng = random.Random(seed)
+    for index in range(count):
+        yield {"filename": f"synthetic_{index:06d}", "content": make_transcript(rng, turns)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=100000)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CONFIG['batch_size'])
+    parser.add_argument("--warmup", type=float, default=0.05,
+                        help="Fraction of transcripts processed before the RSS baseline is taken")
+    parser.add_argument("--max-growth-mb", type=float, default=64.0)
+    parser.add_argument("--real-models", action="store_true", help="Use the configured models instead of stand-ins")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    nlp, sentiment_model = (None, None) if args.real_models else stand_in_models()
+    config = dict(DEFAULT_CONFIG, result_cache=False, dedup=False, batch_size=args.batch_size,
+                  adaptive_batching=False)
+    analyzer = TranscriptAnalyzer(config, nlp=nlp, sentiment_model=sentiment_model)
+    analyzer.load_models()
+
+    warmup_count = max(1, int(args.transcripts * args.warmup))
+    baseline = None
+    peak = 0.0
+    start = time.perf_counter()
+
+    with JsonlWriter(os.devnull) as writer:
+        results = analyzer.iter_results(generate_transcripts(args.transcripts, args.turns, args.seed))
+        for result in results:
+            writer.write(result)
+            if writer.count == warmup_count:
+                baseline = get_memory_usage()
+            elif baseline is not None and writer.count % 500 == 0:
+                peak = max(peak, get_memory_usage())
+                print(f"{writer.count:>8} transcripts  RSS {peak:.1f} MB", file=sys.stderr)
+
+    peak = max(peak, get_memory_usage())
+    elapsed = time.perf_counter() - start
+    growth = peak - baseline
+    print(f"Processed {writer.count} transcripts in {elapsed:.1f}s "
+          f"({writer.count / elapsed:.1f}/s)")
+    print(f"RSS after warm-up: {baseline:.1f} MB, peak: {peak:.1f} MB, growth: {growth:.1f} MB")
+
+    if growth > args.max_growth_mb:
+        print(f"FAIL: RSS grew by more than {args.max_growth_mb:.0f} MB", file=sys.stderr)
+        return 1
+    print("OK: memory stayed bounded")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Seeded generator of synthetic Physician/Patient transcripts.
+
+Transcripts are built from neutral filler words with lexicon keywords and
+date phrases mixed in, so the same seed always yields the same corpus. The
+number of turns, words per turn, share of patient turns and keyword density
+are all configurable, and turns can be wrapped onto several lines:
+
+    from benchmarks.generator import generate_corpus
+    corpus = list(generate_corpus(100, seed=0, turns=40, keyword_density=0.5))
+"""
+import random
+import textwrap
+
+from keyword_matcher import DEFAULT_LEXICON_PATH, read_lexicon
+
+# Filler vocabulary that does not contain any lexicon keyword
+FILLER_WORDS = [
+    "the", "a", "and", "then", "after", "before", "we", "I", "you", "it", "was", "is", "have", "had",
+    "some", "really", "quite", "morning", "evening", "work", "home", "drive", "drove", "walk", "sleep",
+    "week", "day", "days", "time", "doctor", "clinic", "appointment", "question", "answer", "family",
+    "usually", "sometimes", "often", "since", "still", "just", "about", "around", "during", "little",
+    "notice", "noticed", "feel", "felt", "think", "thought", "told", "asked", "went", "came", "back",
+    "routine", "office", "traffic", "weekend", "exercise", "stairs", "chair", "desk", "phone", "car"
+]
+
+# Phrases the SpaCy entity components tag as DATE or TIME
+DATE_PHRASES = ["on September 1st", "four weeks ago", "last Tuesday", "around 12:30", "two months ago"]
+
+# Every keyword in the lexicon, in its original casing, without duplicates
+LEXICON_KEYWORDS = list(dict.fromkeys(
+    keyword for keywords in read_lexicon(DEFAULT_LEXICON_PATH)[0].values() for keyword in keywords
+))
+
+
+def generate_turn(rng, speaker, words_per_turn=(6, 20), keyword_density=0.3, keywords=LEXICON_KEYWORDS):
+    words = [rng.choice(FILLER_WORDS) for _ in range(rng.randint(*words_per_turn))]
+    # ``keyword_density`` is the chance that a turn mentions a lexicon keyword;
+    # a few turns mention more than one
+    while rng.random() < keyword_density:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        keyword_density /= 2
+    if rng.random() < 0.1:
+        words.append(rng.choice(DATE_PHRASES))
+    sentence = " ".join(words)
+    ending = "?" if speaker == "Physician" and rng.random() < 0.6 else "."
+    return f"{speaker}: {sentence[0].upper()}{sentence[1:]}{ending}"
+
+
+# One transcript; ``patient_ratio`` is the share of turns spoken by the
+# patient. With ``wrap_width`` each turn is wrapped onto lines of at most that
+# many characters, continuing without a speaker label.
+def generate_transcript(rng, turns=30, patient_ratio=0.5, keyword_density=0.3, words_per_turn=(6, 20),
+                        wrap_width=0):
+    lines = []
+    for _ in range(turns):
+        speaker = "Patient" if rng.random() < patient_ratio else "Physician"
+        turn = generate_turn(rng, speaker, words_per_turn, keyword_density)
+        lines.append(textwrap.fill(turn, wrap_width) if wrap_width else turn)
+    return "\n".join(lines)
+
+
+# Lazily yield ``count`` transcripts as {"filename", "content"} dicts
+def generate_corpus(count, seed=0, **options):
+    rng = random.Random(seed)
+    for index in range(count):
+        yield {"filename": f"synthetic_{index:06d}", "content": generate_transcript(rng, **options)}
@@ -0,0 +1,124 @@
+"""Load test for the HTTP analysis service.
+
+Sends ``POST /analyze`` requests with synthetic transcripts at each
+concurrency level and reports throughput, latency percentiles and the mean
+micro-batch size the service formed. Without ``--url`` the service is started
+in-process on a free port with the offline stand-in models (or the
+configured models with ``--real-models``); with ``--url`` an already running
+service is tested.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test_service --concurrency 1 4 16 64
+    python -m benchmarks.load_test_service --url http://localhost:8080
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from benchmarks.generator import generate_corpus
+from benchmarks.stand_ins import stand_in_models
+from profiling import percentile
+from service import create_app
+
+
+async def run_level(session, url, corpus, concurrency, requests):
+    latencies = []
+    failures = 0
+    next_index = 0
+
+    async def client():
+        nonlocal next_index, failures
+        while next_index < requests:
+            transcript_data = corpus[next_index % len(corpus)]
+            next_index += 1
+            start = time.perf_counter()
+            async with session.post(f"{url}/analyze", json={
+                "filename": transcript_data["filename"], "text": transcript_data["content"]
+            }) as response:
+                await response.read()
+                if response.status != 200:
+                    failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with session.get(f"{url}/stats") as response:
+        before = await response.json()
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    async with session.get(f"{url}/stats") as response:
+        after = await response.json()
+
+    batches = after["batches"] - before["batches"]
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "batch": (after["transcripts"] - before["transcripts"]) / batches if batches else 0.0,
+        "failures": failures
+    }
+
+
+async def main_async(args):
+    corpus = list(generate_corpus(200, seed=args.seed, turns=args.turns))
+    runner = None
+    url = args.url
+    if url is None:
+        # Each run uses fresh transcripts, so the result cache is left off
+        config = dict(DEFAULT_CONFIG, batch_size=args.max_batch_size, result_cache=False)
+        if args.real_models:
+            analyzer = TranscriptAnalyzer(config)
+        else:
+            nlp, sentiment_model = stand_in_models()
+            analyzer = TranscriptAnalyzer(config, nlp=nlp, sentiment_model=sentiment_model)
+        analyzer.load_models()
+        app = create_app(analyzer, args.max_batch_size, args.max_wait_ms / 1000, args.executor_workers)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}"
+
+    print(f"{'concurrency':>11} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'batch':>7} {'failed':>7}")
+    status = 0
+    try:
+        connector = aiohttp.TCPConnector(limit=max(args.concurrency))
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for concurrency in args.concurrency:
+                level = await run_level(session, url, corpus, concurrency, args.requests)
+                print(f"{concurrency:>11} {level['throughput']:>9.1f} {level['p50'] * 1000:>9.1f} "
+                      f"{level['p95'] * 1000:>9.1f} {level['p99'] * 1000:>9.1f} {level['batch']:>7.1f} "
+                      f"{level['failures']:>7}")
+                if level["failures"]:
+                    status = 1
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Test a running service instead of starting one")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=500, help="Requests per concurrency level")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--executor-workers", type=int, default=1)
+    parser.add_argument("--real-models", action="store_true")
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""Lightweight local stand-ins for the pipeline's models.
+
+The benchmarks use these in place of the SpaCy and Transformers models so
+they run offline, without downloads or a GPU, and measure the pipeline's own
+code. They implement just the interface the pipeline calls:
+
+- ``stand_in_nlp()``: a blank SpaCy pipeline with an ``entity_ruler`` that
+  tags the generator's date and time phrases, and the ``medical_terms``
+  component.
+- ``StandInSentimentPipeline``: a callable with a ``tokenizer``, returning
+  ``{"label", "score"}`` dicts from a small word list.
+
+``stand_in_models`` returns both, as the ``models_factory`` of a
+``process_pool.ProcessPoolAnalyzer``.
+"""
+import spacy
+
+from medical_terms import add_medical_terms
+
+POSITIVE_WORDS = {"better", "improving", "helped", "good", "fine"}
+NEGATIVE_WORDS = {"pain", "worry", "anxious", "concern", "discomfort", "bad"}
+
+# Entity patterns for the date and time phrases in ``benchmarks.generator``
+ENTITY_PATTERNS = [
+    {"label": "DATE", "pattern": "September 1st"},
+    {"label": "DATE", "pattern": "four weeks ago"},
+    {"label": "DATE", "pattern": "last Tuesday"},
+    {"label": "DATE", "pattern": "two months ago"},
+    {"label": "TIME", "pattern": "12:30"}
+]
+
+
+def stand_in_nlp():
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns(ENTITY_PATTERNS)
+    return add_medical_terms(nlp)
+
+
+class StandInTokenizer:
+    """Whitespace tokenizer returning one (fake) id per word."""
+
+    def __init__(self, max_length=512):
+        self.max_length = max_length
+
+    def __call__(self, texts, truncation=False):
+        if isinstance(texts, str):
+            texts = [texts]
+        input_ids = []
+        for text in texts:
+            ids = [len(word) for word in text.split()]
+            input_ids.append(ids[:self.max_length] if truncation else ids)
+        return {"input_ids": input_ids}
+
+
+class StandInSentimentPipeline:
+    """Word-count sentiment classifier with the text-classification pipeline's call signature."""
+
+    def __init__(self):
+        self.tokenizer = StandInTokenizer()
+
+    def __call__(self, texts, batch_size=8, truncation=False):
+        if isinstance(texts, str):
+            texts = [texts]
+        results = []
+        for text in texts:
+            words = text.lower().split()
+            positive = sum(word.strip(".,?!") in POSITIVE_WORDS for word in words)
+            negative = sum(word.strip(".,?!") in NEGATIVE_WORDS for word in words)
+            label = "POSITIVE" if positive >= negative else "NEGATIVE"
+            score = (max(positive, negative) + 1) / (positive + negative + 2)
+            results.append({"label": label, "score": score})
+        return results
+
+
+def stand_in_models():
+    return stand_in_nlp(), StandInSentimentPipeline()
@@ -0,0 +1,233 @@
+"""Command-line batch analysis of medical transcripts.
+
+Analyzes every transcript in the given files, directories, zip or tar
+archives, JSON Lines files or glob patterns and writes one JSON result per line
+(JSON Lines), without starting the Streamlit UI:
+
+    python cli.py transcripts/ -o results.jsonl
+    python cli.py archive.tar.gz transcripts.jsonl -o results.jsonl
+    python cli.py "archive/2024-*/*.txt" --batch-size 16 --spacy-workers 4
+    python cli.py transcripts/ --workers 16 -o results.jsonl
+
+``--profile`` and ``--metrics`` write per-stage timings as JSON and in the
+Prometheus text format (for node_exporter's textfile collector). ``--store``
+also appends the results to a columnar result store (``result_store.py``),
+queryable by diagnosis or symptom across runs.
+
+``--job`` makes the run a resumable job (``batch_jobs.py``): results are
+checkpointed to a manifest as they complete, and running the same command
+again after an interruption skips every transcript already done:
+
+    python cli.py archive.tar.gz --job nightly.job -o results.jsonl
+"""
+import argparse
+import glob
+import os
+import sys
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from batch_jobs import BatchJob
+from batch_io import JsonlWriter, iter_transcripts, read_ahead, source_kind
+from process_pool import ProcessPoolAnalyzer
+from profiling import StageProfiler
+from sentiment_backends import SENTIMENT_BACKENDS
+from speaker_turns import speaker_label, with_speaker_labels
+
+
+# Expand glob patterns into a sorted, de-duplicated list of directories and
+# readable files; directories and archives are read lazily by batch_io
+def resolve_inputs(inputs):
+    paths = []
+    for pattern in inputs:
+        paths.extend(
+            path for path in glob.glob(pattern)
+            if os.path.isdir(path) or (os.path.isfile(path) and source_kind(path) is not None)
+        )
+    return sorted(set(paths))
+
+
+# Write through a temporary file so scrapers never read a partial file
+def write_atomically(path, text):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w", encoding="utf-8") as output_file:
+        output_file.write(text)
+    os.replace(temporary_path, path)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Analyze medical transcripts and write JSON Lines results.")
+    parser.add_argument("inputs", nargs="+",
+                        help="Transcript .txt files, .jsonl files, .zip/.tar.gz archives, directories, or glob patterns")
+    parser.add_argument("-o", "--output", default="-", help="Output JSONL file (default: stdout)")
+    parser.add_argument("--spacy-model", default=DEFAULT_CONFIG['spacy_model'])
+    parser.add_argument("--sentiment-model", default=DEFAULT_CONFIG['sentiment_model'])
+    parser.add_argument("--sentiment-backend", default=DEFAULT_CONFIG['sentiment_backend'],
+                        choices=SENTIMENT_BACKENDS, help="Inference backend for the sentiment model")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CONFIG['batch_size'],
+                        help="Transcripts per batch; the starting size unless --fixed-batch-size is given")
+    parser.add_argument("--fixed-batch-size", action="store_true",
+                        help="Keep the batch size fixed instead of adapting it to memory and latency")
+    parser.add_argument("--memory-budget-mb", type=float, default=DEFAULT_CONFIG['memory_budget_mb'],
+                        help="RSS the batch pipeline aims to stay under; garbage is collected only near it")
+    parser.add_argument("--target-batch-seconds", type=float, default=DEFAULT_CONFIG['target_batch_seconds'],
+                        help="Wall time per batch the adaptive batch size aims for")
+    parser.add_argument("--workers", type=int, default=DEFAULT_CONFIG['workers'],
+                        help="Worker processes, each with its own models (1 runs in-process)")
+    parser.add_argument("--unordered", action="store_true",
+                        help="With --workers, write results as they complete instead of in input order")
+    parser.add_argument("--read-ahead", type=int, default=DEFAULT_CONFIG['read_ahead'],
+                        help="Transcripts read and decoded ahead of the analysis on a background thread")
+    parser.add_argument("--spacy-workers", type=int, default=DEFAULT_CONFIG['spacy_n_process'],
+                        help="Worker processes for SpaCy parsing (in-process mode only)")
+    parser.add_argument("--lexicon", default=DEFAULT_CONFIG['lexicon_path'], help="Keyword lexicon JSON file")
+    parser.add_argument("--max-text-length", type=int, default=DEFAULT_CONFIG['max_text_length'])
+    parser.add_argument("--per-turn", action="store_true",
+                        help="Score each patient turn separately and aggregate")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Analyze whole transcripts in windows cut at speaker turns instead of truncating")
+    parser.add_argument("--speaker-label", type=speaker_label, action="append", default=[], metavar="SPEAKER=LABEL",
+                        help="Also read lines starting with 'LABEL:' as SPEAKER's turns, e.g. Physician=Doctor")
+    parser.add_argument("--chunk-tokens", type=int, default=DEFAULT_CONFIG['chunk_tokens'],
+                        help="Sentiment model tokens per window with --chunked")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Analyze one transcript per group of near-duplicates; the others reuse its SpaCy and "
+                             "sentiment output")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_CONFIG['dedup_threshold'],
+                        help="Estimated word 5-gram Jaccard similarity from which transcripts are near-duplicates")
+    parser.add_argument("--cache", default=DEFAULT_CONFIG['result_cache_path'],
+                        help="Result cache file (SQLite)")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_CONFIG['result_cache_max_mb'])
+    parser.add_argument("--no-cache", action="store_true", help="Disable the persistent result cache")
+    parser.add_argument("--job", help="Checkpoint progress and results to this job manifest (SQLite) and resume "
+                                      "from it: transcripts already done are skipped, the output holds every result")
+    parser.add_argument("--retries", type=int, default=DEFAULT_CONFIG['job_max_attempts'] - 1,
+                        help="With --job, times a failed transcript is retried, alone, after the other transcripts")
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CONFIG['checkpoint_every'],
+                        help="With --job, transcripts per checkpoint")
+    parser.add_argument("--store", help="Also append results to the columnar result store in this directory")
+    parser.add_argument("--profile", help="Write per-stage timings and percentiles to this JSON file")
+    parser.add_argument("--metrics", help="Write per-stage timings to this file in Prometheus text format")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    paths = resolve_inputs(args.inputs)
+    if not paths:
+        print("No transcript files matched the given inputs.", file=sys.stderr)
+        return 1
+
+    config = dict(DEFAULT_CONFIG)
+    config.update({
+        'spacy_model': args.spacy_model,
+        'sentiment_model': args.sentiment_model,
+        'sentiment_backend': args.sentiment_backend,
+        'batch_size': args.batch_size,
+        'adaptive_batching': not args.fixed_batch_size,
+        'memory_budget_mb': args.memory_budget_mb,
+        'target_batch_seconds': args.target_batch_seconds,
+        'workers': args.workers,
+        'spacy_n_process': args.spacy_workers,
+        'max_text_length': args.max_text_length,
+        'lexicon_path': args.lexicon,
+        'sentiment_per_turn': args.per_turn,
+        'chunked': args.chunked,
+        'speaker_labels': with_speaker_labels(args.speaker_label),
+        'chunk_tokens': args.chunk_tokens,
+        'dedup': args.dedup,
+        'dedup_threshold': args.dedup_threshold,
+        'result_cache': not args.no_cache,
+        'result_cache_path': args.cache,
+        'result_cache_max_mb': args.cache_max_mb
+    })
+    profiler = StageProfiler() if args.profile or args.metrics else None
+    if args.workers > 1:
+        analyzer = ProcessPoolAnalyzer(config, workers=args.workers, ordered=not args.unordered, profiler=profiler)
+    else:
+        analyzer = TranscriptAnalyzer(config, profiler=profiler)
+        analyzer.load_models()
+
+    job = None
+    if args.job:
+        try:
+            job = BatchJob(args.job, analyzer.fingerprint(), args.checkpoint_every, args.retries + 1)
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+
+    store_writer = None
+    if args.store:
+        # pyarrow is only needed with --store; a job's results always go to
+        # the same part, however often it is resumed
+        from result_store import ResultStore
+        store_writer = ResultStore(args.store).writer(job.job_id if job is not None else None)
+
+    # Inputs are read lazily, a few transcripts ahead, and each result is
+    # written as soon as it is ready
+    unreadable = []
+
+    def skip(filename, message):
+        unreadable.append(filename)
+        print(f"Failed: {filename}: {message}", file=sys.stderr)
+
+    failed = 0
+    transcripts = read_ahead(iter_transcripts(paths, on_error=skip), args.read_ahead)
+    if job is not None:
+        # Results are checkpointed as they complete; the output is written
+        # from the manifest, with the results of earlier runs, once this run
+        # is over
+        try:
+            for _ in job.run(analyzer, transcripts):
+                pass
+        except BaseException:
+            job.close()
+            raise
+        results = job.results()
+    else:
+        # A transcript that raises is written as an {"filename", "error"}
+        # record instead of ending the run
+        results = analyzer.iter_isolated(transcripts)
+    with JsonlWriter(args.output, profiler=profiler) as writer:
+        for result in results:
+            writer.write(result)
+            if store_writer is not None:
+                store_writer.write(result)
+            if "error" in result:
+                failed += 1
+                print(f"Failed: {result['filename']}: {result['error']}", file=sys.stderr)
+    failed += len(unreadable)
+    if args.workers > 1:
+        analyzer.close()
+    if store_writer is not None:
+        store_writer.close()
+        print(f"Appended {store_writer.count} results to {args.store} as run {store_writer.run_id}.", file=sys.stderr)
+
+    print(f"Processed {writer.count} transcripts, {failed} failed.", file=sys.stderr)
+    if job is not None:
+        progress = job.progress()
+        print(f"Job {job.job_id} ({args.job}): {progress['done']} done, {progress['failed']} failed; "
+              f"{job.skipped} skipped as done in earlier runs.", file=sys.stderr)
+        job.close()
+    if args.workers == 1:
+        scheduler = analyzer.scheduler
+        print(f"Batch size {scheduler.batch_size}, sentiment batch size {scheduler.sentiment_batch_size} "
+              f"after {scheduler.batches} batches; garbage collected {scheduler.gc_runs} times.", file=sys.stderr)
+    if analyzer.duplicate_index is not None:
+        stats = analyzer.duplicate_index.stats()
+        print(f"Near-duplicates: {stats['duplicates']} of {stats['transcripts']} transcripts "
+              f"({stats['dedup_ratio']:.1%}; {stats['exact']} exact, {stats['near']} near) reused the SpaCy and "
+              f"sentiment output of an earlier transcript, saving about {max(0.0, stats['seconds_saved']):.1f}s "
+              f"of analysis.", file=sys.stderr)
+    if analyzer.cache is not None:
+        stats = analyzer.cache.stats()
+        print(f"Result cache: {stats['hits']} hits, {stats['misses']} misses.", file=sys.stderr)
+    if args.profile:
+        write_atomically(args.profile, profiler.to_json())
+    if args.metrics:
+        write_atomically(args.metrics, profiler.to_prometheus())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,529 @@
+"""Single-pass multi-keyword matching for medical transcripts.
+
+Every keyword vocabulary used by the analysis pipeline is compiled into one
+Aho-Corasick automaton, so a transcript is scanned once no matter how many
+terms the lexicon holds. The pure-Python automaton is always available; when
+the optional ``pyahocorasick`` package is installed its C implementation is
+used for the scan instead.
+
+The lexicon lives in a JSON file (``lexicon/medical.json`` by default)::
+
+    {
+      "case_sensitive": ["patient_name"],
+      "categories": {
+        "symptom": [
+          {"label": "Neck pain", "terms": ["neck pain", "cervicalgia"]},
+          ...
+
+Within a category the order is the priority order: when a stage needs a
+single value (current status, intent) the earliest matching entry wins.
+
+``load_lexicon`` compiles a lexicon file once into a binary index, cached
+under a hash of the file's content, and memory-maps it on every later load,
+so start-up does not rebuild the automaton; automaton states are decoded on
+first use. ``medical_matcher`` returns the matcher for a lexicon file and
+swaps in a new one, atomically, when the file changes.
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+try:
+    import ahocorasick
+except ImportError:  # Optional accelerator
+    ahocorasick = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicon", "medical.json")
+INDEX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "physician-notetaker", "lexicon")
+
+KeywordHit = namedtuple("KeywordHit", ["start", "end", "keyword", "category", "label", "rank"])
+
+
+class KeywordHits:
+    """All keyword hits found in one transcript, ordered by position."""
+
+    def __init__(self, hits):
+        self.hits = hits
+
+    def __iter__(self):
+        return iter(self.hits)
+
+    def __len__(self):
+        return len(self.hits)
+
+    @classmethod
+    def join(cls, pieces):
+        # Combine the hits of consecutive pieces of one text, given as
+        # (offset of the piece, its hits), into hits for the whole text
+        return cls([
+            hit._replace(start=hit.start + offset, end=hit.end + offset)
+            for offset, piece in pieces
+            for hit in piece.hits
+        ])
+
+    def category(self, category):
+        return [hit for hit in self.hits if hit.category == category]
+
+    def labels(self, category):
+        # Unique labels in lexicon (priority) order
+        best = {}
+        for hit in self.hits:
+            if hit.category == category:
+                if hit.label not in best or hit.rank < best[hit.label]:
+                    best[hit.label] = hit.rank
+        return sorted(best, key=best.get)
+
+    def first(self, category, default=None):
+        # Highest-priority label in the category, or the default
+        labels = self.labels(category)
+        return labels[0] if labels else default
+
+    def has(self, category, keyword=None):
+        return any(
+            hit.category == category and (keyword is None or hit.keyword == keyword)
+            for hit in self.hits
+        )
+
+    def within(self, spans):
+        # Restrict to hits that lie entirely inside one of the (start, end) spans
+        spans = sorted(spans)
+        starts = [start for start, _ in spans]
+        selected = []
+        for hit in self.hits:
+            index = bisect_right(starts, hit.start) - 1
+            if index >= 0 and hit.end <= spans[index][1]:
+                selected.append(hit)
+        return KeywordHits(selected)
+
+
+# Read a lexicon file as ({category: {keyword: label}}, case-sensitive categories)
+def read_lexicon(path):
+    with open(path, encoding="utf-8") as lexicon_file:
+        document = json.load(lexicon_file)
+    lexicon = {}
+    for category, entries in document["categories"].items():
+        keywords = lexicon[category] = {}
+        for entry in entries:
+            for term in entry["terms"]:
+                keywords.setdefault(term, entry["label"])
+    return lexicon, tuple(document.get("case_sensitive", ()))
+
+
+# Goto, failure and output tables of an Aho-Corasick automaton over patterns
+def build_automaton(patterns):
+    goto = [{}]
+    outputs = [[]]
+    for index, pattern in enumerate(patterns):
+        state = 0
+        for char in pattern:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                next_state = len(goto)
+                goto[state][char] = next_state
+                goto.append({})
+                outputs.append([])
+            state = next_state
+        outputs[state].append(index)
+
+    # Breadth-first pass to compute failure links and merge outputs
+    fail = [0] * len(goto)
+    queue = list(goto[0].values())
+    for state in queue:
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[next_state] = goto[fallback].get(char, 0)
+            outputs[next_state].extend(outputs[fail[next_state]])
+    return goto, fail, outputs
+
+
+class _Matcher:
+    """Scanning shared by in-memory and memory-mapped matchers.
+
+    Subclasses provide ``_iter_matches``, ``_pattern_length`` and
+    ``_pattern_entries``.
+    """
+
+    case_sensitive = frozenset()
+
+    def _native_automaton(self, patterns):
+        automaton = ahocorasick.Automaton(ahocorasick.STORE_INTS)
+        for index, pattern in enumerate(patterns):
+            automaton.add_word(pattern, index)
+        if len(automaton):
+            automaton.make_automaton()
+        return automaton
+
+    def _iter_native(self, text_lower):
+        if len(self._automaton):
+            for last, index in self._automaton.iter(text_lower):
+                yield last + 1, index
+
+    # Every (keyword, category, label, rank) entry of the lexicon
+    def entries(self):
+        for index in range(len(self)):
+            yield from self._pattern_entries(index)
+
+    def scan(self, text, text_lower=None):
+        if text_lower is None:
+            text_lower = text.lower()
+        # Case-sensitive checks compare offsets into the original text,
+        # which is only valid when lower-casing kept the length
+        same_length = len(text_lower) == len(text)
+
+        hits = []
+        for end, index in self._iter_matches(text_lower):
+            start = end - self._pattern_length(index)
+            for keyword, category, label, rank in self._pattern_entries(index):
+                if category in self.case_sensitive:
+                    if not same_length or text[start:end] != keyword:
+                        continue
+                hits.append(KeywordHit(start, end, keyword, category, label, rank))
+        hits.sort(key=lambda hit: (hit.start, hit.end))
+        return KeywordHits(hits)
+
+
+class KeywordMatcher(_Matcher):
+    """Aho-Corasick automaton compiled in memory from a ``{category: {keyword: label}}`` lexicon."""
+
+    def __init__(self, lexicon, case_sensitive=(), accelerated=True):
+        self.case_sensitive = frozenset(case_sensitive)
+        # Identifies the vocabulary, so cached results can be tied to it
+        self.fingerprint = hashlib.sha256(
+            json.dumps([lexicon, sorted(self.case_sensitive)], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        # Lower-cased pattern -> [(keyword, category, label, rank), ...]
+        entries = {}
+        for category, keywords in lexicon.items():
+            for rank, (keyword, label) in enumerate(keywords.items()):
+                entries.setdefault(keyword.lower(), []).append((keyword, category, label, rank))
+
+        self.patterns = list(entries)
+        self._entries = [tuple(entries[pattern]) for pattern in self.patterns]
+        self._lengths = [len(pattern) for pattern in self.patterns]
+
+        if accelerated and ahocorasick is not None:
+            self._automaton = self._native_automaton(self.patterns)
+        else:
+            self._automaton = None
+            self._goto, self._fail, outputs = build_automaton(self.patterns)
+            self._outputs = [tuple(output) if output else None for output in outputs]
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def _pattern_length(self, index):
+        return self._lengths[index]
+
+    def _pattern_entries(self, index):
+        return self._entries[index]
+
+    def _iter_matches(self, text_lower):
+        # Yields (end, pattern_index) for every occurrence, overlaps included
+        if self._automaton is not None:
+            yield from self._iter_native(text_lower)
+            return
+
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for position, char in enumerate(text_lower, 1):
+            transitions = goto[state]
+            while state and char not in transitions:
+                state = fail[state]
+                transitions = goto[state]
+            state = transitions.get(char, 0)
+            if outputs[state] is not None:
+                for index in outputs[state]:
+                    yield position, index
+
+
+# Compiled index layout: a header of int32 counts, then int32 arrays in
+# INDEX_SECTIONS order, then the UTF-8 string blob and a JSON metadata blob.
+# Arrays use the native byte order, which is part of the cache file name.
+INDEX_MAGIC = b"KWIX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("=4s10i")
+INDEX_SECTIONS = (
+    "transition_offsets", "transition_chars", "transition_targets", "fail", "output_offsets",
+    "outputs", "pattern_strings", "pattern_lengths", "entry_offsets", "entries", "string_offsets"
+)
+
+
+# Compile a lexicon file into a binary matcher index at index_path
+def compile_lexicon(path, index_path, fingerprint=None):
+    lexicon, case_sensitive = read_lexicon(path)
+    strings = {}
+
+    def string_id(value):
+        return strings.setdefault(value, len(strings))
+
+    entries = {}
+    for category, keywords in lexicon.items():
+        for rank, (keyword, label) in enumerate(keywords.items()):
+            entries.setdefault(keyword.lower(), []).append(
+                (string_id(keyword), string_id(category), string_id(label), rank)
+            )
+    patterns = list(entries)
+    goto, fail, outputs = build_automaton(patterns)
+
+    sections = {name: array("i") for name in INDEX_SECTIONS}
+    sections["transition_offsets"].append(0)
+    sections["output_offsets"].append(0)
+    for transitions, output in zip(goto, outputs):
+        for char, target in sorted(transitions.items()):
+            sections["transition_chars"].append(ord(char))
+            sections["transition_targets"].append(target)
+        sections["transition_offsets"].append(len(sections["transition_chars"]))
+        sections["outputs"].extend(output)
+        sections["output_offsets"].append(len(sections["outputs"]))
+    sections["fail"].extend(fail)
+    sections["entry_offsets"].append(0)
+    for pattern in patterns:
+        sections["pattern_strings"].append(string_id(pattern))
+        sections["pattern_lengths"].append(len(pattern))
+        for entry in entries[pattern]:
+            sections["entries"].extend(entry)
+        sections["entry_offsets"].append(len(sections["entries"]) // 4)
+    blob = bytearray()
+    sections["string_offsets"].append(0)
+    for value in strings:
+        blob += value.encode("utf-8")
+        sections["string_offsets"].append(len(blob))
+
+    meta = json.dumps({
+        "fingerprint": fingerprint or file_fingerprint(path),
+        "case_sensitive": sorted(case_sensitive),
+        "terms": sum(len(keywords) for keywords in lexicon.values())
+    }).encode("utf-8")
+    header = INDEX_HEADER.pack(
+        INDEX_MAGIC, INDEX_VERSION, len(goto), len(sections["transition_chars"]), len(sections["outputs"]),
+        len(patterns), len(sections["entries"]) // 4, len(strings), len(blob), len(meta), 0
+    )
+    # Written under a temporary name, so readers never map a partial index
+    temporary_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as index_file:
+        index_file.write(header)
+        for name in INDEX_SECTIONS:
+            sections[name].tofile(index_file)
+        index_file.write(blob)
+        index_file.write(meta)
+    os.replace(temporary_path, index_path)
+    return index_path
+
+
+class CompiledMatcher(_Matcher):
+    """Matcher over a memory-mapped index written by ``compile_lexicon``.
+
+    Only the pages that scans touch are read. Each automaton state's
+    transitions are decoded into a dict the first time the scan reaches it,
+    and strings when a hit needs them. With ``accelerated`` and
+    ``pyahocorasick`` installed, the scan runs on a C automaton built from
+    the index's patterns instead.
+    """
+
+    def __init__(self, index_path, accelerated=True):
+        self.index_path = index_path
+        with open(index_path, "rb") as index_file:
+            self._map = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        (magic, version, states, transitions, outputs, patterns, entries, strings,
+         blob_size, meta_size, _) = INDEX_HEADER.unpack_from(view)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{index_path} is not a version {INDEX_VERSION} keyword index")
+        sizes = {
+            "transition_offsets": states + 1, "transition_chars": transitions, "transition_targets": transitions,
+            "fail": states, "output_offsets": states + 1, "outputs": outputs, "pattern_strings": patterns,
+            "pattern_lengths": patterns, "entry_offsets": patterns + 1, "entries": entries * 4,
+            "string_offsets": strings + 1
+        }
+        offset = INDEX_HEADER.size
+        for name in INDEX_SECTIONS:
+            end = offset + sizes[name] * 4
+            setattr(self, f"_{name}", view[offset:end].cast("i"))
+            offset = end
+        self._blob = view[offset:offset + blob_size]
+        meta = json.loads(bytes(view[offset + blob_size:offset + blob_size + meta_size]))
+        self.fingerprint = meta["fingerprint"]
+        self.case_sensitive = frozenset(meta["case_sensitive"])
+        self.terms = meta["terms"]
+
+        self._states = [None] * states
+        self._entry_cache = {}
+        self._strings = {}
+        self._automaton = None
+        if accelerated and ahocorasick is not None:
+            self._automaton = self._native_automaton(
+                self._string(string_id) for string_id in self._pattern_strings
+            )
+
+    def __len__(self):
+        return len(self._pattern_lengths)
+
+    def _string(self, string_id):
+        value = self._strings.get(string_id)
+        if value is None:
+            start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+            value = self._strings[string_id] = str(self._blob[start:end], "utf-8")
+        return value
+
+    # (transitions dict, output pattern indexes or None) of a state
+    def _decode(self, state):
+        start, end = self._transition_offsets[state], self._transition_offsets[state + 1]
+        transitions = dict(zip(map(chr, self._transition_chars[start:end]), self._transition_targets[start:end]))
+        start, end = self._output_offsets[state], self._output_offsets[state + 1]
+        node = self._states[state] = (transitions, tuple(self._outputs[start:end]) if end > start else None)
+        return node
+
+    def _pattern_length(self, index):
+        return self._pattern_lengths[index]
+
+    def _pattern_entries(self, index):
+        entries = self._entry_cache.get(index)
+        if entries is None:
+            data = self._entries
+            entries = self._entry_cache[index] = tuple(
+                (self._string(data[position]), self._string(data[position + 1]),
+                 self._string(data[position + 2]), data[position + 3])
+                for position in range(self._entry_offsets[index] * 4, self._entry_offsets[index + 1] * 4, 4)
+            )
+        return entries
+
+    def _iter_matches(self, text_lower):
+        if self._automaton is not None:
+            yield from self._iter_native(text_lower)
+            return
+
+        states, fail = self._states, self._fail
+        state = 0
+        node = states[0] or self._decode(0)
+        for position, char in enumerate(text_lower, 1):
+            while state and char not in node[0]:
+                state = fail[state]
+                node = states[state] or self._decode(state)
+            state = node[0].get(char, 0)
+            node = states[state] or self._decode(state)
+            if node[1] is not None:
+                for index in node[1]:
+                    yield position, index
+
+
+# SHA-256 of a file's content
+def file_fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Matcher for a lexicon file, compiling its index into cache_dir unless an
+# index of the same content is already there
+def load_lexicon(path, cache_dir=INDEX_CACHE_DIR, accelerated=True):
+    fingerprint = file_fingerprint(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    index_path = os.path.join(
+        cache_dir, f"{stem}-{fingerprint[:16]}-v{INDEX_VERSION}-{sys.byteorder}.kwix"
+    )
+    if not os.path.exists(index_path):
+        compile_lexicon(path, index_path, fingerprint)
+        # Indexes of earlier versions of the file are no longer needed
+        for name in os.listdir(cache_dir):
+            if name.startswith(f"{stem}-") and name.endswith(".kwix") and name != os.path.basename(index_path):
+                try:
+                    os.remove(os.path.join(cache_dir, name))
+                except OSError:
+                    pass
+    return CompiledMatcher(index_path, accelerated)
+
+
+class LexiconWatcher:
+    """Keeps the matcher of a lexicon file current.
+
+    ``current()`` checks the file's modification time at most every
+    ``check_interval`` seconds. When it changed, the new lexicon is compiled
+    and loaded on a background thread while the previous matcher stays in
+    use, then swapped in with one assignment, so callers always get a
+    complete matcher. If the new file cannot be loaded, the previous matcher
+    is kept.
+    """
+
+    def __init__(self, path, cache_dir=INDEX_CACHE_DIR, check_interval=1.0):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stat = self._file_stat()
+        self._matcher = load_lexicon(path, cache_dir)
+        self._checked = time.monotonic()
+
+    def _file_stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _changed(self):
+        try:
+            return self._file_stat() != self._stat
+        except OSError:
+            return False
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            self._checked = now
+            if self._changed() and self._lock.acquire(blocking=False):
+                threading.Thread(target=self._reload_locked, name="lexicon-reload", daemon=True).start()
+        return self._matcher
+
+    # Load the file again now if it changed since the last load; returns True if it did
+    def reload(self):
+        self._lock.acquire()
+        return self._reload_locked()
+
+    # Runs with self._lock held and releases it
+    def _reload_locked(self):
+        try:
+            stat = self._file_stat()
+            if stat == self._stat:
+                return False
+            # Recorded first, so a broken file is reported once, not on every check
+            self._stat = stat
+            matcher = load_lexicon(self.path, self.cache_dir)
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Keeping the current lexicon; failed to load %s: %s", self.path, exc)
+            return False
+        finally:
+            self._lock.release()
+        self._matcher = matcher
+        logger.info("Reloaded lexicon %s (%d terms)", self.path, matcher.terms)
+        return True
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+# The current matcher for a lexicon file, reloaded when the file changes;
+# one watcher is shared per file within a process
+def medical_matcher(path=DEFAULT_LEXICON_PATH):
+    path = os.path.abspath(path)
+    watcher = _watchers.get(path)
+    if watcher is None:
+        with _watchers_lock:
+            watcher = _watchers.get(path)
+            if watcher is None:
+                watcher = _watchers[path] = LexiconWatcher(path)
+    return watcher.current()
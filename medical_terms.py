@@ -0,0 +1,82 @@
+"""SpaCy component that tags lexicon terms during the parse.
+
+The ``medical_terms`` component runs a ``PhraseMatcher`` on the ``LOWER``
+attribute over each Doc, so symptom, treatment and diagnosis terms come out
+of the same tokenization pass as the DATE and TIME entities. Matches respect
+token boundaries, so "pain" no longer matches inside "painkillers". It works
+with ``nlp.pipe`` batching and multiprocessing: the hits are stored as plain
+data in ``Doc._.medical_terms``, together with the fingerprint of the lexicon
+that produced them.
+
+The component reads the current lexicon on every call (see
+``keyword_matcher.medical_matcher``) and builds a new ``PhraseMatcher`` when
+the lexicon file changes, so a lexicon reload does not require reloading the
+SpaCy model.
+"""
+from spacy.language import Language
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Doc
+
+from keyword_matcher import DEFAULT_LEXICON_PATH, medical_matcher
+from transcript_context import MEDICAL_TERMS_COMPONENT as COMPONENT_NAME
+
+# Lexicon categories tagged by the component
+TERM_CATEGORIES = ("symptom", "treatment", "diagnosis")
+
+# {"lexicon": fingerprint, "hits": [[start_char, end_char, keyword, category, label, rank], ...]}
+Doc.set_extension(COMPONENT_NAME, default=None, force=True)
+
+
+class MedicalTerms:
+    """PhraseMatcher over the lexicon's term categories, rebuilt when the lexicon changes."""
+
+    def __init__(self, nlp, lexicon_path=DEFAULT_LEXICON_PATH, categories=TERM_CATEGORIES):
+        self.tokenizer = nlp.tokenizer
+        self.vocab = nlp.vocab
+        self.lexicon_path = lexicon_path
+        self.categories = tuple(categories)
+        # (lexicon fingerprint, PhraseMatcher, {match id: lexicon entry})
+        self._built = (None, None, None)
+
+    def _build(self, lexicon):
+        phrase_matcher = PhraseMatcher(self.vocab, attr="LOWER")
+        entries = [entry for entry in lexicon.entries() if entry[1] in self.categories]
+        for index, (keyword, _, _, _) in enumerate(entries):
+            phrase_matcher.add(str(index), [self.tokenizer(keyword)])
+        # One assignment, so a concurrent call never mixes two lexicons
+        self._built = (
+            lexicon.fingerprint,
+            phrase_matcher,
+            {self.vocab.strings[str(index)]: entry for index, entry in enumerate(entries)}
+        )
+        return self._built
+
+    # Hits of ``lexicon``'s term categories in a Doc, as stored in Doc._.medical_terms
+    def match(self, doc, lexicon):
+        built = self._built
+        if built[0] != lexicon.fingerprint:
+            built = self._build(lexicon)
+        _, phrase_matcher, entries = built
+        hits = []
+        for match_id, start, end in phrase_matcher(doc):
+            keyword, category, label, rank = entries[match_id]
+            span = doc[start:end]
+            hits.append([span.start_char, span.end_char, keyword, category, label, rank])
+        hits.sort(key=lambda hit: (hit[0], hit[1]))
+        return {"lexicon": lexicon.fingerprint, "hits": hits}
+
+    def __call__(self, doc):
+        doc._.medical_terms = self.match(doc, medical_matcher(self.lexicon_path))
+        return doc
+
+
+@Language.factory(COMPONENT_NAME, default_config={"lexicon_path": DEFAULT_LEXICON_PATH})
+def create_medical_terms(nlp, name, lexicon_path):
+    return MedicalTerms(nlp, lexicon_path)
+
+
+# Add the component to a pipeline unless it already has it
+def add_medical_terms(nlp, lexicon_path=DEFAULT_LEXICON_PATH):
+    if COMPONENT_NAME not in nlp.pipe_names:
+        nlp.add_pipe(COMPONENT_NAME, last=True, config={"lexicon_path": lexicon_path})
+    return nlp
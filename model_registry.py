@@ -0,0 +1,250 @@
+"""Process-wide registry of loaded models, shared by every session.
+
+Each model, identified by its kind, name and loader options, is loaded at most
+once per process on a background thread. Every ``TranscriptAnalyzer`` in the
+process (one per Streamlit session, plus any CLI run or service) shares that
+copy:
+
+- Holders: ``acquire`` records which analyzer uses which model of each kind.
+  Acquiring another model of the same kind, for example after a config
+  change, releases the previous one, and so does the analyzer being garbage
+  collected. A model nobody holds is unloaded ``unload_delay`` seconds after
+  its last holder let go.
+- Thread safety: models are handed out wrapped in ``SharedModel``, which
+  serializes calls into the model with a per-model lock, so sessions can
+  share one copy safely while the SpaCy and sentiment models still run in
+  parallel with each other.
+- Idle eviction: a model acquired with ``idle_timeout`` is unloaded once it
+  has not been called for that many seconds, even while held; the next
+  ``acquire`` loads it again.
+
+A background thread sweeps for models to unload every ``sweep_interval``
+seconds; ``evict`` runs a sweep immediately.
+"""
+import gc
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+# Identifies a model in the registry
+def model_key(kind, model_name, options):
+    return (kind, model_name, tuple(sorted(options.items())))
+
+
+class SharedModel:
+    """A loaded model whose calls are serialized by a per-model lock.
+
+    Everything else is forwarded to the wrapped model. ``pipe`` (SpaCy) holds
+    the lock while each batch is processed rather than for the whole stream,
+    and the ``tokenizer`` attribute shares the model's lock.
+    """
+
+    LOCKED_ATTRIBUTES = ("tokenizer",)
+
+    def __init__(self, model, lock=None):
+        self.model = model
+        self.lock = lock if lock is not None else threading.RLock()
+        self.last_used = time.monotonic()
+        self.calls = 0
+        self.wait_seconds = 0.0
+        self.busy = 0
+
+    @contextmanager
+    def locked(self):
+        start = time.monotonic()
+        with self.lock:
+            self.wait_seconds += time.monotonic() - start
+            self.calls += 1
+            self.busy += 1
+            try:
+                yield
+            finally:
+                self.busy -= 1
+                self.last_used = time.monotonic()
+
+    def __call__(self, *args, **kwargs):
+        with self.locked():
+            return self.model(*args, **kwargs)
+
+    def pipe(self, *args, **kwargs):
+        docs = iter(self.model.pipe(*args, **kwargs))
+        while True:
+            with self.locked():
+                doc = next(docs, None)
+            if doc is None:
+                return
+            yield doc
+
+    def __getattr__(self, name):
+        if name == "model":
+            raise AttributeError(name)
+        value = getattr(self.model, name)
+        if name in self.LOCKED_ATTRIBUTES:
+            return SharedModel(value, self.lock)
+        return value
+
+
+class _Entry:
+    def __init__(self, kind, model_name, options):
+        self.kind = kind
+        self.model_name = model_name
+        self.options = options
+        self.future = None
+        self.holders = set()
+        self.released_at = None
+        self.idle_timeout = None
+
+    @property
+    def model(self):
+        if self.future is None or not self.future.done() or self.future.exception() is not None:
+            return None
+        return self.future.result()
+
+    def state(self):
+        if self.future is None:
+            return "unloaded"
+        if not self.future.done():
+            return "loading"
+        return "failed" if self.future.exception() is not None else "ready"
+
+
+class ModelRegistry:
+    """Loads, shares and unloads models; see the module docstring."""
+
+    def __init__(self, loader, unload_delay=60.0, sweep_interval=10.0, max_loaders=2):
+        # ``loader(kind, model_name, prewarm, options)`` returns a loaded model
+        self.loader = loader
+        self.unload_delay = unload_delay
+        self.sweep_interval = sweep_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_loaders, thread_name_prefix="model-loader")
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._holds = {}  # holder id -> {kind: model key}
+        self._loads = {}  # model key -> number of times it was loaded
+        self._sweeper = None
+
+    # Start loading the model unless it is loaded or loading, record
+    # ``holder`` (any weak-referenceable object, or None) as using it, and
+    # return a future of its ``SharedModel``. A failed load is retried on the
+    # next acquire.
+    def acquire(self, holder, kind, model_name, prewarm=False, idle_timeout=None, **options):
+        key = model_key(kind, model_name, options)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(kind, model_name, options)
+            if entry.future is None or (entry.future.done() and entry.future.exception() is not None):
+                entry.future = self._executor.submit(self._load, key, kind, model_name, prewarm, options)
+            entry.idle_timeout = idle_timeout or None
+            if holder is not None:
+                self._hold(holder, kind, key, entry)
+            elif not entry.holders and entry.released_at is None:
+                # Loaded for nobody in particular; unloaded like a released model
+                entry.released_at = time.monotonic()
+            self._start_sweeper()
+            return entry.future
+
+    def _load(self, key, kind, model_name, prewarm, options):
+        model = SharedModel(self.loader(kind, model_name, prewarm, options))
+        with self._lock:
+            self._loads[key] = self._loads.get(key, 0) + 1
+        return model
+
+    def _hold(self, holder, kind, key, entry):
+        holder_id = id(holder)
+        holds = self._holds.get(holder_id)
+        if holds is None:
+            holds = self._holds[holder_id] = {}
+            weakref.finalize(holder, self.release, holder_id)
+        previous = holds.get(kind)
+        if previous != key:
+            if previous is not None:
+                self._drop(holder_id, previous)
+            holds[kind] = key
+        entry.holders.add(holder_id)
+        entry.released_at = None
+
+    def _drop(self, holder_id, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry.holders.discard(holder_id)
+        if not entry.holders:
+            entry.released_at = time.monotonic()
+
+    # Stop holding every model ``holder`` (the object or its id) holds
+    def release(self, holder):
+        holder_id = holder if isinstance(holder, int) else id(holder)
+        with self._lock:
+            for key in self._holds.pop(holder_id, {}).values():
+                self._drop(holder_id, key)
+
+    # Unload the models due for it: unheld for ``unload_delay`` seconds, or
+    # idle for longer than their ``idle_timeout``. Returns their keys.
+    def evict(self):
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.state() == "loading":
+                    continue
+                model = entry.model
+                if not entry.holders and entry.released_at is not None:
+                    if now - entry.released_at >= self.unload_delay:
+                        del self._entries[key]
+                        evicted.append(key)
+                elif (entry.idle_timeout and model is not None and not model.busy
+                      and now - model.last_used >= entry.idle_timeout):
+                    entry.future = None
+                    evicted.append(key)
+        if evicted:
+            logger.info("Unloaded models: %s", ", ".join(f"{kind} {name}" for kind, name, _ in evicted))
+            # Models hold reference cycles; free them now rather than at the next collection
+            gc.collect()
+        return evicted
+
+    def _start_sweeper(self):
+        if self._sweeper is None or not self._sweeper.is_alive():
+            self._sweeper = threading.Thread(target=self._sweep, name="model-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.evict()
+            with self._lock:
+                if not self._entries:
+                    self._sweeper = None
+                    return
+
+    # Futures of every model that is loading or loaded
+    def futures(self):
+        with self._lock:
+            return [entry.future for entry in self._entries.values() if entry.future is not None]
+
+    # One row per model: state, holders, how often it was loaded and called,
+    # and how long callers waited for its lock
+    def stats(self):
+        now = time.monotonic()
+        rows = []
+        with self._lock:
+            for key, entry in self._entries.items():
+                model = entry.model
+                rows.append({
+                    "kind": entry.kind,
+                    "model": entry.model_name,
+                    "options": dict(entry.options),
+                    "state": entry.state(),
+                    "holders": len(entry.holders),
+                    "loads": self._loads.get(key, 0),
+                    "calls": model.calls if model is not None else 0,
+                    "lock_wait_s": round(model.wait_seconds, 3) if model is not None else 0.0,
+                    "idle_s": round(now - model.last_used, 1) if model is not None else None
+                })
+        return rows
@@ -0,0 +1,372 @@
+"""Near-duplicate transcript detection in front of the batch pipeline.
+
+Feeds contain many near-identical transcripts: re-exports, templated
+follow-ups, copies that differ only in whitespace or a header. The result
+cache only catches byte-identical text. ``DuplicateIndex`` finds:
+
+- exact duplicates: transcripts whose normalized text is the same. The
+  normalized text starts at the first speaker label, so headers are left
+  out, and has its whitespace collapsed.
+- near duplicates: transcripts whose word 5-gram sets have an estimated
+  Jaccard similarity of at least ``threshold``. Similarity is estimated
+  from 128-value MinHash signatures, and candidates are found with
+  locality-sensitive hashing: signatures are cut into bands, and
+  transcripts that share a band are compared. The bands are sized so that a
+  pair at the threshold is a candidate with at least 99% probability.
+
+The first transcript of each cluster is analyzed as usual and the others
+reuse its result, flagged with ``"duplicate_of": {"filename",
+"similarity"}``. The caller can pass ``rebuild`` to redo the cheap parts of
+a reused result on the duplicate's own text; the analyzer keeps only the
+SpaCy and sentiment output and rebuilds the clinical fields. A representative whose analysis fails is dropped from the
+index, so later copies are analyzed themselves.
+
+The index keeps the ``max_entries`` most recent representatives, with their
+results JSON-encoded, and is kept across runs by its analyzer so duplicates
+are found across batches too. Its counters report the share of transcripts
+deduplicated and an estimate of the analysis time that saved: duplicates
+times the average pipeline time of an analyzed transcript.
+"""
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict, deque
+
+import numpy as np
+
+from speaker_turns import speaker_patterns
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 128
+# Bands of rows that divide NUM_PERMUTATIONS, from most to fewest rows
+BAND_ROWS = (16, 8, 4, 2, 1)
+# Shingles hashed per block, which bounds the temporary hash matrix
+BLOCK_SHINGLES = 4096
+
+_rng = np.random.default_rng(0x5EED)
+# Multiply-shift hash functions, one per permutation; odd multipliers
+_MULTIPLIERS = _rng.integers(1, 1 << 63, NUM_PERMUTATIONS, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_OFFSETS = _rng.integers(0, 1 << 63, NUM_PERMUTATIONS, dtype=np.uint64)
+# Powers of the base of the rolling shingle hash, one per word of a shingle
+_POWERS = np.array([pow(1000003, power, 1 << 64) for power in range(SHINGLE_WORDS)], dtype=np.uint64)
+
+
+# The text from the first speaker label on, with whitespace collapsed; the
+# whole text, collapsed, if it has no speaker labels
+def normalize(text, speaker_labels=None):
+    first_label, next_label, _ = speaker_patterns(speaker_labels)
+    start = 0
+    if not first_label.match(text):
+        match = next_label.search(text)
+        if match:
+            start = match.start()
+    return " ".join(text[start:].split())
+
+
+# 64-bit hashes of the word 5-grams of normalized text, without repeats.
+# Words are hashed with CRC-32 rather than ``hash``, which differs between
+# processes, so the same feed is always deduplicated the same way.
+def shingles(normalized):
+    # Whitespace is collapsed to single spaces already
+    words = normalized.lower().encode("utf-8").split(b" ") if normalized else []
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.fromiter(map(zlib.crc32, words), dtype=np.uint64, count=len(words))
+    if len(hashes) < SHINGLE_WORDS:
+        hashes = np.concatenate([hashes, np.zeros(SHINGLE_WORDS - len(hashes), dtype=np.uint64)])
+    # Rolling hash of each window of SHINGLE_WORDS words; uint64 arithmetic wraps
+    count = len(hashes) - SHINGLE_WORDS + 1
+    combined = np.zeros(count, dtype=np.uint64)
+    for position, power in enumerate(_POWERS):
+        combined += hashes[position:position + count] * power
+    return np.unique(combined)
+
+
+# MinHash signature: for each hash function, the least hash of any shingle.
+# The hash functions keep the high 32 bits of (a * x + b) mod 2**64; taking
+# them is monotonic, so it is done once, on each function's minimum.
+def signature(shingle_hashes):
+    least = np.full(NUM_PERMUTATIONS, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for start in range(0, len(shingle_hashes), BLOCK_SHINGLES):
+        # One row per hash function, so each minimum runs over contiguous memory
+        hashed = np.multiply.outer(_MULTIPLIERS, shingle_hashes[start:start + BLOCK_SHINGLES])
+        hashed += _OFFSETS[:, None]
+        np.minimum(least, hashed.min(axis=1), out=least)
+    return (least >> np.uint64(32)).astype(np.uint32)
+
+
+# Rows per band for a threshold: the most rows (fewest false candidates) with
+# which a pair at the threshold still shares a band with 99% probability
+def band_rows(threshold):
+    for rows in BAND_ROWS:
+        bands = NUM_PERMUTATIONS // rows
+        if 1 - (1 - threshold ** rows) ** bands >= 0.99:
+            return rows
+    return 1
+
+
+class _Representative:
+    """The first transcript of a cluster, and its result once known."""
+
+    __slots__ = ("filename", "digest", "signature", "bands", "owner", "result", "failed")
+
+    def __init__(self, filename, digest, signature, bands, owner=None):
+        self.filename = filename
+        self.digest = digest
+        self.signature = signature
+        self.bands = bands
+        self.owner = owner  # the run analyzing it
+        self.result = None  # JSON-encoded result without the filename
+        self.failed = False
+
+
+class _Slot:
+    """One input transcript's place in the output: its own result, or the
+    representative whose result it reuses."""
+
+    __slots__ = ("filename", "sequence", "representative", "similarity", "result", "transcript_data")
+
+    def __init__(self, filename, sequence, representative, similarity=None, transcript_data=None):
+        self.filename = filename
+        self.sequence = sequence  # the caller's "sequence" id, if any
+        self.representative = representative
+        self.similarity = similarity  # None for a transcript analyzed itself
+        self.result = None
+        self.transcript_data = transcript_data  # a duplicate's own transcript, for ``rebuild``
+
+    # ``result`` with the caller's sequence id in place of the run's
+    def tagged(self, result):
+        result = {name: value for name, value in result.items() if name != "sequence"}
+        if self.sequence is not None:
+            result["sequence"] = self.sequence
+        return result
+
+    def ready(self):
+        if self.similarity is None:
+            return self.result is not None
+        return self.representative.result is not None or self.representative.failed
+
+    # The representative's result for a duplicate, passed through
+    # ``rebuild(transcript_data, result)`` if given, and flagged; or its error
+    # if the representative failed
+    def reused(self, rebuild=None):
+        flag = {"filename": self.representative.filename, "similarity": self.similarity}
+        if self.representative.failed:
+            result = {"filename": self.filename, "error": "Duplicate of a transcript whose analysis failed"}
+        else:
+            fields = json.loads(self.representative.result)
+            if rebuild is not None:
+                fields = rebuild(self.transcript_data, fields)
+            result = {"filename": self.filename, **fields}
+        self.transcript_data = None
+        return self.tagged(dict(result, duplicate_of=flag))
+
+
+class DuplicateIndex:
+    """Clusters transcripts by near-duplicate text; see the module docstring."""
+
+    def __init__(self, threshold=0.9, max_entries=10000, speaker_labels=None, fingerprint=""):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.speaker_labels = speaker_labels
+        self.fingerprint = fingerprint  # of the settings the stored results were produced with
+        self.rows = band_rows(threshold)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest of normalized text -> representative, oldest first
+        self._buckets = defaultdict(list)  # (band, band values) -> representatives
+        self.counters = {
+            "transcripts": 0, "exact": 0, "near": 0, "analyzed": 0, "pipeline_seconds": 0.0, "match_seconds": 0.0,
+            "rebuild_seconds": 0.0
+        }
+
+    def _bands(self, transcript_signature):
+        rows = self.rows
+        return [
+            (band, transcript_signature[band * rows:(band + 1) * rows].tobytes())
+            for band in range(NUM_PERMUTATIONS // rows)
+        ]
+
+    # Find the representative ``text`` duplicates, as (representative,
+    # similarity): one whose result is known, or one ``owner`` is analyzing.
+    # Otherwise the text is added as a new representative owned by ``owner``, returned
+    # as (representative, None), or as (None, None) if an unusable
+    # representative holds the same normalized text.
+    def match(self, filename, text, owner=None):
+        def usable(candidate):
+            return candidate.result is not None or candidate.owner is owner
+
+        normalized = normalize(text, self.speaker_labels)
+        digest = hashlib.sha256(normalized.encode("utf-8")).digest()
+        with self._lock:
+            self.counters["transcripts"] += 1
+            representative = self._entries.get(digest)
+            if representative is not None:
+                if not usable(representative):
+                    return None, None
+                self._entries.move_to_end(digest)
+                self.counters["exact"] += 1
+                return representative, 1.0
+        transcript_signature = signature(shingles(normalized))
+        bands = self._bands(transcript_signature)
+        with self._lock:
+            best, best_similarity = None, self.threshold
+            seen = set()
+            for band in bands:
+                for candidate in self._buckets.get(band, ()):
+                    if id(candidate) in seen or not usable(candidate):
+                        continue
+                    seen.add(id(candidate))
+                    similarity = float(np.mean(candidate.signature == transcript_signature))
+                    if similarity >= best_similarity:
+                        best, best_similarity = candidate, similarity
+            if best is not None:
+                self._entries.move_to_end(best.digest)
+                self.counters["near"] += 1
+                return best, round(best_similarity, 3)
+            if digest in self._entries:
+                # Added meanwhile by another run
+                return None, None
+            representative = _Representative(filename, digest, transcript_signature, bands, owner)
+            self._entries[digest] = representative
+            for band in bands:
+                self._buckets[band].append(representative)
+            self._trim()
+            return representative, None
+
+    def _remove(self, representative):
+        if self._entries.get(representative.digest) is not representative:
+            return
+        del self._entries[representative.digest]
+        for band in representative.bands:
+            bucket = self._buckets[band]
+            bucket.remove(representative)
+            if not bucket:
+                del self._buckets[band]
+
+    # Forget the least recently matched representatives beyond max_entries;
+    # ones still being analyzed are kept
+    def _trim(self):
+        excess = len(self._entries) - self.max_entries
+        for representative in list(self._entries.values()):
+            if excess <= 0:
+                break
+            if representative.result is not None:
+                self._remove(representative)
+                excess -= 1
+
+    # Record a representative's result; a failed one is forgotten
+    def _resolve(self, representative, result):
+        if representative is None:
+            return
+        with self._lock:
+            if "error" in result:
+                representative.failed = True
+                self._remove(representative)
+            else:
+                representative.result = json.dumps(
+                    {name: value for name, value in result.items() if name not in ("filename", "sequence")}
+                )
+
+    # Results for ``transcripts``, analyzing only the first of each cluster
+    # with ``analyze`` (which yields one result per transcript it is given,
+    # in any order, with the transcript's "sequence" id) and reusing that
+    # result for the rest, through ``rebuild`` if given (see
+    # ``_Slot.reused``). Results come in input order, or as soon as they are
+    # known with ``ordered=False``. ``progress_callback`` gets the number of
+    # results yielded so far.
+    def deduplicate(self, transcripts, analyze, ordered=True, progress_callback=None, rebuild=None):
+        slots = deque()  # every slot not yet yielded, in input order
+        submitted = {}  # sequence id -> slot sent to ``analyze``
+        match_seconds = 0.0
+        run = object()
+
+        def unique():
+            nonlocal match_seconds
+            # Filenames need not be unique, so analyzed transcripts are
+            # tagged with their position in this run instead
+            for sequence, transcript_data in enumerate(transcripts):
+                start = time.perf_counter()
+                representative, similarity = self.match(transcript_data["filename"], transcript_data["content"], run)
+                match_seconds += time.perf_counter() - start
+                slot = _Slot(
+                    transcript_data["filename"],
+                    transcript_data.get("sequence"),
+                    representative,
+                    similarity,
+                    None if similarity is None else transcript_data
+                )
+                slots.append(slot)
+                if similarity is None:
+                    submitted[sequence] = slot
+                    yield dict(transcript_data, sequence=sequence)
+
+        # Pop the slots that can be yielded; duplicates' results are only
+        # built here, so a long run of duplicates holds no results
+        def finished():
+            nonlocal slots
+            if ordered:
+                done = []
+                while slots and slots[0].ready():
+                    done.append(slots.popleft())
+            else:
+                done = [slot for slot in slots if slot.ready()]
+                slots = deque(slot for slot in slots if not slot.ready())
+            start = time.perf_counter()
+            results = [slot.result if slot.similarity is None else slot.reused(rebuild) for slot in done]
+            with self._lock:
+                self.counters["rebuild_seconds"] += time.perf_counter() - start
+            return results
+
+        results = analyze(unique())
+        yielded = 0
+        try:
+            while True:
+                start, matched = time.perf_counter(), match_seconds
+                result = next(results, None)
+                # Time spent matching while the pipeline read its input is not analysis time
+                elapsed = time.perf_counter() - start - (match_seconds - matched)
+                if result is not None:
+                    slot = submitted.pop(result["sequence"])
+                    slot.result = slot.tagged(result)
+                    self._resolve(slot.representative, result)
+                with self._lock:
+                    self.counters["analyzed"] += result is not None
+                    self.counters["pipeline_seconds"] += elapsed
+                    self.counters["match_seconds"] += match_seconds - matched
+                for finished_result in finished():
+                    yielded += 1
+                    yield finished_result
+                if progress_callback is not None:
+                    progress_callback(yielded)
+                if result is None:
+                    return
+        finally:
+            # Representatives of an interrupted run that never got a result
+            # are left for later runs to analyze
+            with self._lock:
+                for slot in submitted.values():
+                    if slot.representative is not None and slot.representative.result is None:
+                        self._remove(slot.representative)
+
+    # Counters as a summary: transcripts seen, duplicates (exact and near),
+    # the share deduplicated and the estimated analysis time saved, net of
+    # the time spent matching and rebuilding duplicates' results; relative to an earlier ``counters`` snapshot
+    # if ``since`` is given
+    def stats(self, since=None):
+        with self._lock:
+            counters = dict(self.counters)
+        if since is not None:
+            counters = {name: value - since.get(name, 0) for name, value in counters.items()}
+        duplicates = counters["exact"] + counters["near"]
+        seconds_per_transcript = counters["pipeline_seconds"] / counters["analyzed"] if counters["analyzed"] else 0.0
+        return {
+            **counters,
+            "duplicates": duplicates,
+            "dedup_ratio": duplicates / counters["transcripts"] if counters["transcripts"] else 0.0,
+            "seconds_saved": (
+                duplicates * seconds_per_transcript - counters["match_seconds"] - counters["rebuild_seconds"]
+            ),
+            "entries": len(self._entries)
+        }
@@ -0,0 +1,289 @@
+"""Parallel batch analysis on a pool of worker processes.
+
+``ProcessPoolAnalyzer`` fans transcripts out to worker processes in chunks of
+``batch_size``. Each worker loads the SpaCy and sentiment models once, in its
+initializer, and runs the regular batched pipeline on every chunk it
+receives. The parent process reads the input lazily, serves result-cache hits
+itself and keeps at most ``max_pending`` transcripts in flight, so memory stays
+bounded however large the batch is.
+
+Results are yielded in input order by default, or as soon as they complete
+with ``ordered=False``. A transcript that raises is reported as a
+``{"filename", "error"}`` record without affecting the rest of its chunk. If a
+worker process dies, the pool is restarted and the transcripts that were in
+flight are retried alone, one at a time, so only the transcript that crashes
+its worker is reported as failed.
+"""
+import logging
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer, result_record
+from profiling import StageProfiler
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of a worker, set up by ``_init_worker``
+_worker_analyzer = None
+_worker_error = None
+
+
+def _init_worker(config, models_factory, threads, profile):
+    global _worker_analyzer, _worker_error
+    # Share the cores between workers instead of every worker using all of them
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    os.environ.setdefault("MKL_NUM_THREADS", str(threads))
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    try:
+        nlp = sentiment_model = None
+        if models_factory is not None:
+            nlp, sentiment_model = models_factory()
+        _worker_analyzer = TranscriptAnalyzer(
+            config,
+            profiler=StageProfiler() if profile else None,
+            nlp=nlp,
+            sentiment_model=sentiment_model
+        )
+        _worker_analyzer.load_models()
+    except Exception as exc:
+        # Reported with every chunk instead of breaking the pool on start-up
+        _worker_error = f"Worker failed to load models: {type(exc).__name__}: {exc}"
+
+
+# Runs in a worker: analyzes one chunk with the parent's current config and
+# returns its results plus any profiler samples recorded meanwhile
+def _analyze_chunk(config, transcripts):
+    if _worker_error is not None:
+        return [result_record(item, {"error": _worker_error}) for item in transcripts], []
+    _worker_analyzer.config = config
+    results = _worker_analyzer.process_isolated(transcripts)
+    samples = _worker_analyzer.profiler.drain() if _worker_analyzer.profiler is not None else []
+    return results, samples
+
+
+class _Slot:
+    """Placeholder for one transcript's result, in input order."""
+
+    __slots__ = ("transcript_data", "key", "result", "attempts")
+
+    def __init__(self, transcript_data, key, result=None):
+        self.transcript_data = transcript_data
+        self.key = key
+        self.result = result
+        self.attempts = 0
+
+
+class ProcessPoolAnalyzer:
+    """Runs batch analysis on ``workers`` processes, each with its own models.
+
+    Like ``TranscriptAnalyzer``, the config dict is read on every call; each
+    chunk is analyzed with the config current when it was submitted.
+    ``models_factory`` is an importable function returning ``(nlp,
+    sentiment_model)``, used by the workers instead of the configured models
+    (for example ``benchmarks.stand_ins.stand_in_models``). ``analyzer`` is
+    an in-process ``TranscriptAnalyzer`` to share, with the same config, for
+    result-cache lookups and near-duplicate detection, so that its duplicate
+    index outlives the pool.
+    """
+
+    def __init__(self, config=None, workers=None, ordered=True, max_pending=None,
+                 max_retries=1, models_factory=None, profiler=None, analyzer=None):
+        self.config = config if config is not None else dict(DEFAULT_CONFIG)
+        self.workers = workers or os.cpu_count() or 1
+        self.ordered = ordered
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.models_factory = models_factory
+        self.profiler = profiler
+        # In-process analyzer for result cache lookups, deduplication and profiling
+        self._analyzer = analyzer if analyzer is not None else TranscriptAnalyzer(self.config, profiler=profiler)
+        self._executor = None
+
+    @property
+    def cache(self):
+        return self._analyzer.cache
+
+    def _worker_config(self):
+        # Workers parse in-process and leave caching and deduplication to the parent
+        return dict(self.config, result_cache=False, dedup=False, spacy_n_process=1)
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Forking a process that already runs model threads is unsafe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(
+                    self._worker_config(),
+                    self.models_factory,
+                    max(1, (os.cpu_count() or 1) // self.workers),
+                    self.profiler is not None
+                )
+            )
+        return self
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _submit(self, pending, slots):
+        future = self._executor.submit(
+            _analyze_chunk, self._worker_config(), [slot.transcript_data for slot in slots]
+        )
+        pending[future] = slots
+
+    # Submit queued chunks; after a crash, the suspected transcripts run
+    # alone, one at a time, until each has succeeded or failed
+    def _dispatch(self, pending, queued, suspects):
+        if suspects:
+            if not pending:
+                self._submit(pending, [suspects.popleft()])
+            return
+        while queued:
+            self._submit(pending, queued.popleft())
+
+    # Restart a broken pool. A transcript that crashed a worker while running
+    # alone is retried up to max_retries times and then failed; otherwise
+    # everything that was in flight becomes a suspect
+    def _recover(self, pending, suspects):
+        in_flight = [slot for slots in pending.values() for slot in slots]
+        pending.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.start()
+        if len(in_flight) == 1:
+            slot = in_flight[0]
+            slot.attempts += 1
+            if slot.attempts > self.max_retries:
+                slot.result = result_record(
+                    slot.transcript_data, {"error": "Worker process crashed while analyzing this transcript"}
+                )
+            else:
+                suspects.appendleft(slot)
+        else:
+            suspects.extend(in_flight)
+
+    # Wait for at least one chunk and fill in the slots of every finished one
+    def _collect(self, pending, suspects):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        crashed = False
+        for future in done:
+            try:
+                results, samples = future.result()
+            except BrokenProcessPool:
+                crashed = True
+                continue
+            slots = pending.pop(future)
+            cache = self.cache
+            for slot, result in zip(slots, results):
+                slot.result = result
+                if cache is not None and "error" not in result:
+                    cache.put(
+                        slot.key,
+                        {name: value for name, value in result.items() if name not in ("filename", "sequence")}
+                    )
+            if self.profiler is not None:
+                self.profiler.merge(samples)
+        if crashed:
+            logger.warning("A worker process crashed; restarting the pool and retrying its transcripts")
+            self._recover(pending, suspects)
+
+    def fingerprint(self):
+        return self._analyzer.fingerprint()
+
+    # Same as iter_results, which already isolates failed transcripts;
+    # ``chunk_size`` is ignored, chunks are ``batch_size`` transcripts
+    def iter_isolated(self, transcripts, chunk_size=None, progress_callback=None):
+        return self.iter_results(transcripts, progress_callback)
+
+    # Streaming parallel batch pipeline with the same contract as
+    # ``TranscriptAnalyzer.iter_results``, near-duplicates included; failed
+    # transcripts are yielded as {"filename", "error"} records
+    def iter_results(self, transcripts, progress_callback=None):
+        index = self.duplicate_index
+        if index is None:
+            return self._iter_analyzed(transcripts, progress_callback)
+        # The models live in the workers, so duplicates' terms come from the
+        # keyword scan here
+        rebuild = partial(self._analyzer._rebuild_isolated, tokenize=False)
+        return index.deduplicate(transcripts, self._iter_analyzed, self.ordered, progress_callback, rebuild=rebuild)
+
+    @property
+    def duplicate_index(self):
+        return self._analyzer.duplicate_index
+
+    def _iter_analyzed(self, transcripts, progress_callback=None):
+        self.start()
+        batch_size = self.config['batch_size']
+        max_pending = self.max_pending or self.workers * batch_size * 2
+        cache = self.cache
+        fingerprint = self._analyzer.fingerprint()
+        transcripts = iter(transcripts)
+
+        unfinished = deque()  # every slot not yet yielded, in input order
+        queued = deque()  # chunks waiting to be submitted
+        suspects = deque()  # slots that were in flight when a worker crashed
+        pending = {}  # future -> the slots of its chunk
+        chunk = []
+        processed = 0
+        exhausted = False
+        try:
+            while True:
+                # Read ahead until max_pending transcripts are in flight
+                while not exhausted and len(unfinished) < max_pending:
+                    transcript_data = next(transcripts, None)
+                    if transcript_data is None:
+                        exhausted = True
+                        break
+                    key, result = self._analyzer._cache_lookup(
+                        transcript_data["content"], cache, fingerprint, transcript_data["filename"]
+                    )
+                    slot = _Slot(transcript_data, key)
+                    if result is not None:
+                        slot.result = result_record(transcript_data, result)
+                    else:
+                        chunk.append(slot)
+                    unfinished.append(slot)
+                    if len(chunk) == batch_size:
+                        queued.append(chunk)
+                        chunk = []
+                if chunk:
+                    queued.append(chunk)
+                    chunk = []
+                self._dispatch(pending, queued, suspects)
+
+                # Ordered mode waits for the head of the queue; otherwise any
+                # finished slot can go
+                if self.ordered:
+                    finished = []
+                    while unfinished and unfinished[0].result is not None:
+                        finished.append(unfinished.popleft())
+                else:
+                    finished = [slot for slot in unfinished if slot.result is not None]
+                    unfinished = deque(slot for slot in unfinished if slot.result is None)
+
+                for slot in finished:
+                    processed += 1
+                    yield slot.result
+                    if progress_callback is not None:
+                        progress_callback(processed)
+
+                if exhausted and not unfinished:
+                    break
+                if not finished:
+                    self._collect(pending, suspects)
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,164 @@
+"""Per-stage latency and memory instrumentation for the analysis pipeline.
+
+A ``StageProfiler`` records wall time, CPU time and RSS delta every time a
+pipeline stage runs, attributed to the transcripts it processed. Batched
+stages (SpaCy's ``nlp.pipe``, batched sentiment) are split evenly across the
+transcripts in the batch, so every sample is per transcript. Samples are
+aggregated into p50/p95/p99 tables and exported as JSON or in the Prometheus
+text exposition format.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+import psutil
+
+# Pipeline stages in execution order, used to order reports
+STAGES = ("cache", "spacy", "extract", "summary", "sentiment", "soap", "serialization")
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+StageSample = namedtuple("StageSample", ["stage", "transcript", "wall", "cpu", "rss_delta"])
+
+
+# Sort key putting pipeline stages in execution order, then any others by name
+def _stage_order(stage):
+    return (STAGES.index(stage) if stage in STAGES else len(STAGES), stage)
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values, quantile):
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(quantile * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StageProfiler:
+    """Thread-safe recorder of per-stage, per-transcript timings.
+
+    Only the most recent ``max_samples`` samples are kept, so profiling a
+    long streaming batch uses bounded memory. Running per-stage totals cover
+    every sample ever recorded, for the Prometheus ``_sum`` and ``_count``.
+    """
+
+    def __init__(self, max_samples=100000):
+        self.samples = deque(maxlen=max_samples)
+        # {stage: [count, wall, cpu, rss_delta]}, neither bounded nor reset
+        self.totals = {}
+        self._process = psutil.Process(os.getpid())
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, transcripts=None):
+        # ``transcripts`` is one transcript id or a list of the ids a batched
+        # stage processed; the measurement is split evenly between them
+        if transcripts is None or isinstance(transcripts, str):
+            transcripts = [transcripts]
+        rss_before = self._process.memory_info().rss
+        cpu_before = time.process_time()
+        wall_before = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_before
+            cpu = time.process_time() - cpu_before
+            rss_delta = self._process.memory_info().rss - rss_before
+            self.record(name, transcripts, wall, cpu, rss_delta)
+
+    def record(self, name, transcripts, wall, cpu, rss_delta):
+        count = max(len(transcripts), 1)
+        with self._lock:
+            for transcript in transcripts:
+                self._add(StageSample(name, transcript, wall / count, cpu / count, rss_delta / count))
+
+    # Adds samples recorded elsewhere, such as by a worker process
+    def merge(self, samples):
+        with self._lock:
+            for sample in samples:
+                self._add(StageSample(*sample))
+
+    # Call with the lock held
+    def _add(self, sample):
+        self.samples.append(sample)
+        totals = self.totals.setdefault(sample.stage, [0, 0.0, 0.0, 0.0])
+        totals[0] += 1
+        totals[1] += sample.wall
+        totals[2] += sample.cpu
+        totals[3] += sample.rss_delta
+
+    # Removes and returns every sample recorded so far
+    def drain(self):
+        with self._lock:
+            samples = list(self.samples)
+            self.samples.clear()
+        return samples
+
+    # Clears the samples; the running totals are kept
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+    def _by_stage(self):
+        with self._lock:
+            samples = list(self.samples)
+        grouped = {}
+        for sample in samples:
+            grouped.setdefault(sample.stage, []).append(sample)
+        return sorted(grouped.items(), key=lambda item: _stage_order(item[0]))
+
+    # One row per stage with sample count, totals and wall/CPU percentiles
+    def summary(self):
+        rows = []
+        for stage, samples in self._by_stage():
+            walls = sorted(sample.wall for sample in samples)
+            cpus = sorted(sample.cpu for sample in samples)
+            rss = [sample.rss_delta for sample in samples]
+            row = {"stage": stage, "count": len(samples), "total_wall_s": sum(walls), "total_cpu_s": sum(cpus)}
+            for quantile in QUANTILES:
+                label = f"p{int(quantile * 100)}"
+                row[f"wall_{label}_ms"] = percentile(walls, quantile) * 1000
+                row[f"cpu_{label}_ms"] = percentile(cpus, quantile) * 1000
+            row["rss_delta_mean_mb"] = sum(rss) / len(rss) / 1024 / 1024
+            row["rss_delta_max_mb"] = max(rss) / 1024 / 1024
+            rows.append(row)
+        return rows
+
+    def to_json(self, include_samples=True):
+        profile = {"stages": self.summary()}
+        if include_samples:
+            with self._lock:
+                profile["samples"] = [sample._asdict() for sample in self.samples]
+        return json.dumps(profile, indent=2)
+
+    # Prometheus text exposition format: one summary metric per measurement.
+    # Quantiles are over the kept samples; ``_sum`` and ``_count`` come from
+    # the running totals, so they only ever grow, as Prometheus expects.
+    def to_prometheus(self, prefix="notetaker"):
+        metrics = [
+            ("stage_wall_seconds", "Wall time per transcript spent in each pipeline stage.", "wall", 1),
+            ("stage_cpu_seconds", "CPU time per transcript spent in each pipeline stage.", "cpu", 2),
+            ("stage_rss_delta_bytes", "RSS change per transcript across each pipeline stage.", "rss_delta", 3),
+        ]
+        by_stage = dict(self._by_stage())
+        with self._lock:
+            totals = {stage: list(values) for stage, values in self.totals.items()}
+        stages = sorted(totals, key=_stage_order)
+        lines = []
+        for metric, description, field, total in metrics:
+            name = f"{prefix}_{metric}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} summary")
+            for stage in stages:
+                values = sorted(getattr(sample, field) for sample in by_stage.get(stage, []))
+                for quantile in QUANTILES:
+                    # NaN, as Prometheus clients report, once a stage's samples were reset
+                    value = f"{percentile(values, quantile):.9g}" if values else "NaN"
+                    lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {value}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {totals[stage][total]:.9g}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {totals[stage][0]}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,118 @@
+"""Persistent, content-addressed cache of full pipeline results.
+
+Results are stored in SQLite, keyed by a hash of the transcript text and a
+fingerprint of everything else that shapes the output (model names, analysis
+settings, lexicon). Reprocessing an unchanged transcript with the same
+configuration skips model inference entirely, across restarts and processes.
+The cache is bounded by size and evicts the least recently used entries.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Bump when a pipeline change alters results for the same text and config
+PIPELINE_VERSION = 3
+
+
+# Stable hash of the settings and lexicon that determine a result
+def config_fingerprint(config, lexicon_fingerprint="", spacy_scope="document"):
+    relevant = {
+        "pipeline_version": PIPELINE_VERSION,
+        "spacy_model": config['spacy_model'],
+        "sentiment_model": config['sentiment_model'],
+        "sentiment_backend": config['sentiment_backend'],
+        "max_text_length": config['max_text_length'],
+        "sentiment_per_turn": config['sentiment_per_turn'],
+        "chunked": config['chunked'],
+        "chunk_tokens": config['chunk_tokens'] if config['chunked'] else None,
+        "speaker_labels": config['speaker_labels'],
+        "lexicon": lexicon_fingerprint,
+        "spacy_scope": spacy_scope
+    }
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of pipeline results in a SQLite file."""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        self._total_bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()[0]
+
+    @staticmethod
+    def key(transcript_text, fingerprint):
+        digest = hashlib.sha256(fingerprint.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(transcript_text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._connection.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        data = json.dumps(value).encode("utf-8")
+        with self._lock:
+            previous = self._connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time())
+            )
+            self._total_bytes += len(data) - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is under 90% of its budget
+        target = self.max_bytes * 0.9
+        rows = self._connection.execute("SELECT key, size FROM results ORDER BY last_access").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM results")
+            self._total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_mb": self._total_bytes / 1024 / 1024
+        }
@@ -0,0 +1,228 @@
+"""Columnar store of batch results in Arrow IPC files.
+
+Every batch run appends one Arrow IPC file (``part-<run id>.arrow``) to the
+store directory with typed columns: filename, patient, diagnoses, symptoms,
+treatments, sentiment, confidence, the SOAP note fields, and for a
+near-duplicate that reused another transcript's result, that transcript's
+filename (``duplicate_of``, null otherwise). A part is written
+under a temporary name and renamed when complete, so readers only ever see
+whole files, and concurrent runs never write to the same file.
+
+Parts are uncompressed and read through memory maps, so a query only touches
+the pages of the columns and record batches it needs:
+
+    store = ResultStore("results_store")
+    store.query(symptom="neck pain", columns=["filename", "patient", "diagnosis"])
+
+Failed transcripts (``{"filename", "error"}`` records) are not stored.
+"""
+import os
+import uuid
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# One row per analyzed transcript
+SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("filename", pa.string()),
+    ("patient", pa.string()),
+    ("diagnosis", pa.string()),
+    ("diagnoses", pa.list_(pa.string())),
+    ("symptoms", pa.list_(pa.string())),
+    ("treatments", pa.list_(pa.string())),
+    ("timeframes", pa.list_(pa.string())),
+    ("current_status", pa.string()),
+    ("prognosis", pa.string()),
+    ("sentiment", pa.string()),
+    ("intent", pa.string()),
+    ("confidence", pa.float64()),
+    ("soap_chief_complaint", pa.string()),
+    ("soap_history", pa.string()),
+    ("soap_physical_exam", pa.string()),
+    ("soap_observations", pa.string()),
+    ("soap_diagnosis", pa.string()),
+    ("soap_severity", pa.string()),
+    ("soap_treatment", pa.string()),
+    ("soap_follow_up", pa.string()),
+    ("duplicate_of", pa.string())
+])
+
+
+# Flatten one pipeline result into a store row
+def result_row(result, run_id):
+    summary = result["summary"]
+    medical_details = result["medical_details"]
+    sentiment_analysis = result["sentiment_analysis"]
+    soap_note = result["soap_note"]
+    return {
+        "run_id": run_id,
+        "filename": result["filename"],
+        "patient": summary["Patient_Name"],
+        "diagnosis": summary["Diagnosis"],
+        "diagnoses": medical_details["Diagnosis"],
+        "symptoms": medical_details["Symptoms"],
+        "treatments": medical_details["Treatment"],
+        "timeframes": medical_details["Timeframes"],
+        "current_status": summary["Current_Status"],
+        "prognosis": summary["Prognosis"],
+        "sentiment": sentiment_analysis["Sentiment"],
+        "intent": sentiment_analysis["Intent"],
+        "confidence": sentiment_analysis["Confidence"],
+        "soap_chief_complaint": soap_note["Subjective"]["Chief_Complaint"],
+        "soap_history": soap_note["Subjective"]["History_of_Present_Illness"],
+        "soap_physical_exam": soap_note["Objective"]["Physical_Exam"],
+        "soap_observations": soap_note["Objective"]["Observations"],
+        "soap_diagnosis": soap_note["Assessment"]["Diagnosis"],
+        "soap_severity": soap_note["Assessment"]["Severity"],
+        "soap_treatment": soap_note["Plan"]["Treatment"],
+        "soap_follow_up": soap_note["Plan"]["Follow_Up"],
+        "duplicate_of": result["duplicate_of"]["filename"] if "duplicate_of" in result else None
+    }
+
+
+# Rows of a record batch whose list column contains ``value``, ignoring case
+def _list_contains(column, value):
+    flat = pc.list_flatten(column)
+    parents = pc.list_parent_indices(column)
+    matches = pc.filter(parents, pc.equal(pc.utf8_lower(flat), value.lower()))
+    return pc.is_in(pa.array(range(len(column)), pa.int64()), value_set=pc.cast(matches, pa.int64()))
+
+
+# A record batch with every column of SCHEMA; parts written before a column
+# was added read it as nulls
+def _conform(batch):
+    if batch.schema.names == SCHEMA.names:
+        return batch
+    names = set(batch.schema.names)
+    return pa.RecordBatch.from_arrays(
+        [batch.column(field.name) if field.name in names else pa.nulls(batch.num_rows, field.type)
+         for field in SCHEMA],
+        schema=SCHEMA
+    )
+
+
+class StoreWriter:
+    """Appends results to a new part of a ``ResultStore``, ``batch_rows`` rows per record batch.
+
+    Has the ``write``/``close`` interface of ``batch_io.JsonlWriter``.
+    """
+
+    def __init__(self, directory, run_id, batch_rows=1024):
+        self.run_id = run_id
+        self.path = os.path.join(directory, f"part-{run_id}.arrow")
+        self.batch_rows = batch_rows
+        self.count = 0
+        self._temporary_path = self.path + ".tmp"
+        self._sink = pa.OSFile(self._temporary_path, "wb")
+        self._writer = pa.ipc.new_file(self._sink, SCHEMA)
+        self._rows = []
+
+    def write(self, result):
+        if "error" in result:
+            return
+        self._rows.append(result_row(result, self.run_id))
+        self.count += 1
+        if len(self._rows) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_batch(pa.RecordBatch.from_pylist(self._rows, schema=SCHEMA))
+            self._rows = []
+
+    def close(self):
+        if self._writer is None:
+            return
+        self._flush()
+        self._writer.close()
+        self._sink.close()
+        self._writer = None
+        if self.count:
+            os.replace(self._temporary_path, self.path)
+        else:
+            os.remove(self._temporary_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ResultStore:
+    """Directory of Arrow IPC parts holding the results of every batch run."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    # Start a new part for one run; results are visible once the writer is closed
+    def writer(self, run_id=None, batch_rows=1024):
+        if run_id is None:
+            # Sorts in the order runs started
+            run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+        return StoreWriter(self.directory, run_id, batch_rows)
+
+    def parts(self):
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith("part-") and name.endswith(".arrow")
+        )
+
+    def run_ids(self):
+        return [os.path.basename(path)[len("part-"):-len(".arrow")] for path in self.parts()]
+
+    # Memory-mapped record batches matching every given filter, restricted to
+    # ``columns``; filters compare case-insensitively, list columns match if
+    # any element does
+    def scan(self, diagnosis=None, symptom=None, run_id=None, columns=None):
+        paths = self.parts()
+        if run_id is not None:
+            paths = [os.path.join(self.directory, f"part-{run_id}.arrow")]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                for index in range(reader.num_record_batches):
+                    batch = _conform(reader.get_batch(index))
+                    mask = None
+                    if diagnosis is not None:
+                        mask = _list_contains(batch.column("diagnoses"), diagnosis)
+                    if symptom is not None:
+                        matches = _list_contains(batch.column("symptoms"), symptom)
+                        mask = matches if mask is None else pc.and_(mask, matches)
+                    if mask is not None:
+                        batch = batch.filter(mask)
+                    if columns is not None:
+                        batch = batch.select(columns)
+                    if batch.num_rows:
+                        yield batch
+
+    # Matching rows as one table; zero-copy for unfiltered columns while the
+    # table is alive
+    def query(self, diagnosis=None, symptom=None, run_id=None, columns=None):
+        schema = SCHEMA if columns is None else pa.schema([SCHEMA.field(name) for name in columns])
+        batches = list(self.scan(diagnosis, symptom, run_id, columns))
+        return pa.Table.from_batches(batches, schema=schema)
+
+    def count(self):
+        total = 0
+        for path in self.parts():
+            with pa.memory_map(path) as source:
+                reader = pa.ipc.open_file(source)
+                total += sum(reader.get_batch(index).num_rows for index in range(reader.num_record_batches))
+        return total
+
+    # Distinct values of a string or list column across the store, for pickers
+    def distinct(self, column):
+        values = set()
+        for batch in self.scan(columns=[column]):
+            array = batch.column(0)
+            if pa.types.is_list(array.type):
+                array = pc.list_flatten(array)
+            values.update(value for value in array.to_pylist() if value)
+        return sorted(values)
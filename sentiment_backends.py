@@ -0,0 +1,53 @@
+"""Interchangeable inference backends for the sentiment classifier.
+
+Every backend returns a Hugging Face text-classification pipeline, so the
+sentiment stage calls them the same way (``pipeline(texts, batch_size=...)``
+and ``pipeline.tokenizer``) whichever one is selected:
+
+* ``pytorch``: full-precision (fp32) PyTorch model, the default;
+* ``pytorch-int8``: the same model with its linear layers dynamically
+  quantized to int8, which is smaller and usually faster on CPU;
+* ``onnx``: the model exported to ONNX and run by ONNX Runtime. Requires the
+  optional ``optimum[onnxruntime]`` package. The export is done once and
+  kept in ``ONNX_CACHE_DIR``.
+"""
+import os
+
+SENTIMENT_BACKENDS = ("pytorch", "pytorch-int8", "onnx")
+
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "physician-notetaker", "onnx")
+
+
+def _load_onnx_model(model_name):
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as e:
+        raise ImportError(
+            "The 'onnx' sentiment backend requires optimum with ONNX Runtime: "
+            "pip install optimum[onnxruntime]"
+        ) from e
+
+    export_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+    if os.path.isdir(export_dir):
+        return ORTModelForSequenceClassification.from_pretrained(export_dir)
+
+    model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def load_sentiment_pipeline(model_name, backend="pytorch"):
+    from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+
+    if backend not in SENTIMENT_BACKENDS:
+        raise ValueError(f"Unknown sentiment backend '{backend}', expected one of {', '.join(SENTIMENT_BACKENDS)}")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "onnx":
+        model = _load_onnx_model(model_name)
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        if backend == "pytorch-int8":
+            import torch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
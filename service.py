@@ -0,0 +1,263 @@
+"""Asynchronous HTTP API for transcript analysis.
+
+An aiohttp service that runs the same pipeline as the Streamlit app for
+other systems:
+
+    python service.py --port 8080 --max-batch-size 16 --max-wait-ms 10
+
+Endpoints:
+
+* ``POST /analyze`` with ``{"text": ..., "filename": ...}`` returns one result;
+* ``POST /analyze/batch`` with ``{"transcripts": [{"filename", "content"}, ...]}``
+  (or a list of strings) returns ``{"results": [...]}`` in input order, with
+  failed transcripts as ``{"filename", "error"}`` records;
+* ``GET /health`` reports model loading status, ``GET /stats`` micro-batching
+  statistics and ``GET /metrics`` per-stage timings in Prometheus format.
+
+Every transcript, from single and bulk requests alike, goes through one
+``MicroBatcher`` queue. Transcripts that arrive within ``max_wait_ms`` of each
+other are coalesced into one batch of up to ``max_batch_size``, so concurrent
+requests share batched SpaCy and transformer calls. Batches run on a bounded
+thread pool, so the event loop never blocks on a model.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from analyzer import DEFAULT_CONFIG, TranscriptAnalyzer
+from profiling import StageProfiler
+from sentiment_backends import SENTIMENT_BACKENDS
+from speaker_turns import speaker_label, with_speaker_labels
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesces concurrently submitted transcripts into batches.
+
+    A batch is dispatched once it holds ``max_batch_size`` transcripts or
+    ``max_wait`` seconds after its first transcript arrived, whichever comes
+    first. At most ``executor_workers`` batches run at once; while they do,
+    new transcripts queue up (at most ``max_queue``, after which submitters
+    wait), so batches grow with the load.
+    """
+
+    def __init__(self, analyzer, max_batch_size=16, max_wait=0.01, executor_workers=1, max_queue=1024):
+        self.analyzer = analyzer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="analysis")
+        self._slots = asyncio.Semaphore(executor_workers)
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._running = set()
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+    # Queue one transcript and wait for its result
+    async def submit(self, transcript_data):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((transcript_data, future))
+        return await future
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            batch = await self._next_batch()
+            task = asyncio.get_running_loop().create_task(self._process(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _process(self, batch):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.analyzer.process_isolated, [transcript_data for transcript_data, _ in batch]
+            )
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "transcripts": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+            "running_batches": len(self._running)
+        }
+
+
+ANALYZER = web.AppKey("analyzer", TranscriptAnalyzer)
+BATCHER = web.AppKey("batcher", MicroBatcher)
+PROFILER = web.AppKey("profiler", StageProfiler)
+
+
+def _transcript(item, index):
+    if isinstance(item, str):
+        return {"filename": f"transcript_{index}", "content": item}
+    content = item.get("content", item.get("text"))
+    if not isinstance(content, str):
+        raise web.HTTPBadRequest(text="Each transcript needs a 'content' string")
+    return {"filename": str(item.get("filename", f"transcript_{index}")), "content": content}
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Request body must be JSON")
+
+
+async def analyze(request):
+    body = await _json_body(request)
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Expected a JSON object with a 'text' field")
+    transcript_data = _transcript(body, 0)
+    result = await request.app[BATCHER].submit(transcript_data)
+    return web.json_response(result, status=500 if "error" in result else 200)
+
+
+async def analyze_batch(request):
+    body = await _json_body(request)
+    items = body.get("transcripts") if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise web.HTTPBadRequest(text="Expected {'transcripts': [...]} or a JSON list")
+    transcripts = [_transcript(item, index) for index, item in enumerate(items)]
+    batcher = request.app[BATCHER]
+    results = await asyncio.gather(*(batcher.submit(transcript_data) for transcript_data in transcripts))
+    return web.json_response({"results": results})
+
+
+async def health(request):
+    status = request.app[ANALYZER].model_status()
+    ready = all(value == "Ready" for value in status.values())
+    return web.json_response({"ready": ready, "models": status}, status=200 if ready else 503)
+
+
+async def stats(request):
+    stats = request.app[BATCHER].stats()
+    index = request.app[ANALYZER].duplicate_index
+    if index is not None:
+        stats["dedup"] = index.stats()
+    return web.json_response(stats)
+
+
+async def metrics(request):
+    lines = [request.app[PROFILER].to_prometheus()]
+    for name, value in request.app[BATCHER].stats().items():
+        lines.append(f"# TYPE notetaker_service_{name} gauge\nnotetaker_service_{name} {value}\n")
+    return web.Response(text="".join(lines), content_type="text/plain")
+
+
+def create_app(analyzer, max_batch_size=16, max_wait=0.01, executor_workers=1, max_queue=1024):
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app[ANALYZER] = analyzer
+    app[BATCHER] = MicroBatcher(analyzer, max_batch_size, max_wait, executor_workers, max_queue)
+    app[PROFILER] = analyzer.profiler or StageProfiler()
+
+    async def start_batcher(app):
+        analyzer.start_loading()
+        app[BATCHER].start()
+
+    async def stop_batcher(app):
+        await app[BATCHER].close()
+
+    app.on_startup.append(start_batcher)
+    app.on_cleanup.append(stop_batcher)
+    app.add_routes([
+        web.post("/analyze", analyze),
+        web.post("/analyze/batch", analyze_batch),
+        web.get("/health", health),
+        web.get("/stats", stats),
+        web.get("/metrics", metrics)
+    ])
+    return app
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve transcript analysis over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=16, help="Most transcripts per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0,
+                        help="Longest a transcript waits for others to share its batch")
+    parser.add_argument("--executor-workers", type=int, default=1, help="Batches analyzed at the same time")
+    parser.add_argument("--max-queue", type=int, default=1024, help="Transcripts queued before submitters wait")
+    parser.add_argument("--spacy-model", default=DEFAULT_CONFIG['spacy_model'])
+    parser.add_argument("--sentiment-model", default=DEFAULT_CONFIG['sentiment_model'])
+    parser.add_argument("--sentiment-backend", default=DEFAULT_CONFIG['sentiment_backend'], choices=SENTIMENT_BACKENDS)
+    parser.add_argument("--lexicon", default=DEFAULT_CONFIG['lexicon_path'],
+                        help="Keyword lexicon JSON file, reloaded when it changes")
+    parser.add_argument("--speaker-label", type=speaker_label, action="append", default=[], metavar="SPEAKER=LABEL",
+                        help="Also read lines starting with 'LABEL:' as SPEAKER's turns, e.g. Physician=Doctor")
+    parser.add_argument("--chunked", action="store_true", help="Analyze whole transcripts in windows")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the persistent result cache")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Reuse SpaCy and sentiment output for near-duplicates; the index is shared by all "
+                             "callers, so a transcript can reuse another caller's earlier output")
+    return parser
+
+
+# Analyzer settings from the command line
+def build_config(args):
+    config = dict(DEFAULT_CONFIG)
+    config.update({
+        'spacy_model': args.spacy_model,
+        'sentiment_model': args.sentiment_model,
+        'sentiment_backend': args.sentiment_backend,
+        'batch_size': args.max_batch_size,
+        'chunked': args.chunked,
+        'speaker_labels': with_speaker_labels(args.speaker_label),
+        'lexicon_path': args.lexicon,
+        'result_cache': not args.no_cache,
+        'dedup': args.dedup
+    })
+    return config
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    analyzer = TranscriptAnalyzer(build_config(args), profiler=StageProfiler())
+    app = create_app(analyzer, args.max_batch_size, args.max_wait_ms / 1000, args.executor_workers, args.max_queue)
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Speaker-turn segmentation with offsets into the transcript.
+
+A turn starts on a line that begins with a speaker label ("Physician:",
+"Patient:") and runs up to the next such line. The unlabelled lines of a
+turn that wraps onto several lines therefore belong to it, and text before
+the first label belongs to no turn. Labels are found by one regular
+expression search over the whole text for a newline followed by a label,
+rather than line by line.
+
+``segment`` returns a ``TurnTable``: the speaker, start, content start and
+end of every turn, kept in flat ``array`` columns of offsets into the text.
+No turn text is copied until a stage asks for it: keyword hits and parse
+windows are selected by offset, and only the sentiment stage slices out the
+texts it hands to the model.
+
+``TurnSegmenter`` does the same for text that arrives in pieces. ``feed``
+returns a table of the turns completed so far, and ``close`` returns the
+last ones. It keeps only the turn still being read, and offsets count from
+the start of the stream.
+
+Speaker labels are configurable as ``{speaker: [label, ...]}``. Every label
+of a speaker maps to that speaker, so ``{"Physician": ["Physician",
+"Doctor", "Dr."], "Patient": ["Patient"]}`` reads "Doctor:" turns as the
+physician's. The pipeline reads the "Patient" speaker's turns.
+"""
+import re
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+DEFAULT_SPEAKER_LABELS = {"Physician": ["Physician"], "Patient": ["Patient"]}
+
+SpeakerTurn = namedtuple("SpeakerTurn", ["speaker", "start", "content_start", "end"])
+
+
+@lru_cache(maxsize=32)
+def _compile(labels):
+    # One group per speaker, longest labels first so "Dr." wins over "Dr"
+    groups = [
+        "(" + "|".join(re.escape(label) for label in sorted(speaker_labels, key=len, reverse=True)) + ")"
+        for _, speaker_labels in labels
+    ]
+    label = r"[ \t]*(?:" + "|".join(groups) + r")[ \t]*:[ \t]*"
+    # Starting with a literal newline lets the search skip ahead to line
+    # breaks instead of trying every position, as a "^" anchor would
+    return re.compile(label), re.compile("\n" + label), tuple(speaker for speaker, _ in labels)
+
+
+# Patterns for a label at the start of the text and for a label after a
+# newline, and the speaker names, for ``{speaker: [label, ...]}``; each
+# pattern's n-th group matches the n-th speaker's labels
+def speaker_patterns(speaker_labels=None):
+    speaker_labels = speaker_labels or DEFAULT_SPEAKER_LABELS
+    return _compile(tuple((speaker, tuple(labels)) for speaker, labels in speaker_labels.items()))
+
+
+# Parses a "Speaker=Label" option
+def speaker_label(option):
+    speaker, separator, label = option.partition("=")
+    if not separator or not speaker.strip() or not label.strip():
+        raise ValueError(f"expected Speaker=Label, got {option!r}")
+    return speaker.strip(), label.strip()
+
+
+# The default speaker labels plus the given (speaker, label) pairs
+def with_speaker_labels(pairs, base=None):
+    labels = {speaker: list(names) for speaker, names in (base or DEFAULT_SPEAKER_LABELS).items()}
+    for speaker, label in pairs:
+        if label not in labels.setdefault(speaker, []):
+            labels[speaker].append(label)
+    return labels
+
+
+class TurnTable:
+    """Speaker turns as parallel arrays of offsets into ``text``.
+
+    Offsets are relative to the whole transcript or stream; ``text`` starts
+    at ``offset`` (0 for a whole transcript). ``starts`` are where each turn's
+    first line starts, and ``content_starts`` and ``ends`` delimit its text
+    without the label and surrounding whitespace.
+    """
+
+    def __init__(self, text, speakers, offset=0):
+        self.text = text
+        self.speakers = speakers
+        self.offset = offset
+        self.speaker_ids = array("B")
+        self.starts = array("q")
+        self.content_starts = array("q")
+        self.ends = array("q")
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for index in range(len(self.starts)):
+            yield SpeakerTurn(
+                self.speakers[self.speaker_ids[index]],
+                self.starts[index],
+                self.content_starts[index],
+                self.ends[index]
+            )
+
+    # Indices of the turns of ``speaker``, or of every turn
+    def indices(self, speaker=None):
+        if speaker is None:
+            return range(len(self.starts))
+        if speaker not in self.speakers:
+            return []
+        speaker_id = self.speakers.index(speaker)
+        return [index for index, turn_speaker in enumerate(self.speaker_ids) if turn_speaker == speaker_id]
+
+    # (start, end) of each turn, label included
+    def spans(self, speaker=None):
+        return [(self.starts[index], self.ends[index]) for index in self.indices(speaker)]
+
+    # (start, end) of each turn's text
+    def content_spans(self, speaker=None):
+        return [(self.content_starts[index], self.ends[index]) for index in self.indices(speaker)]
+
+    def texts(self, speaker=None):
+        offset = self.offset
+        return [self.text[start - offset:end - offset] for start, end in self.content_spans(speaker)]
+
+    # The texts of ``speaker``'s turns joined by ``separator``, cut to
+    # ``limit`` characters; stops slicing once the limit is reached
+    def joined(self, speaker, limit=None, separator=" "):
+        if limit is None:
+            return separator.join(self.texts(speaker))
+        offset = self.offset
+        pieces = []
+        length = 0
+        for start, end in self.content_spans(speaker):
+            if length >= limit:
+                break
+            end = min(end, start + limit - length)
+            pieces.append(self.text[start - offset:end - offset])
+            length += end - start + len(separator)
+        return separator.join(pieces)[:limit]
+
+
+class TurnSegmenter:
+    """Segments text fed in pieces into speaker turns; see the module docstring."""
+
+    def __init__(self, speaker_labels=None):
+        self.first_label, self.next_label, self.speakers = speaker_patterns(speaker_labels)
+        self._buffer = ""
+        self._offset = 0  # stream offset of the buffer's first character
+        self._scanned = 0  # buffer index up to which labels have been searched for
+        self._open = None  # (speaker id, start, end of label) of the turn being read, in the buffer
+
+    # Add the next piece of text; returns the turns it completed. Labels are
+    # looked for on complete lines only.
+    def feed(self, text):
+        self._buffer += text
+        return self._advance(self._buffer.rfind("\n") + 1)
+
+    # Add the last piece of text; returns the remaining turns and resets the
+    # segmenter for a new stream
+    def close(self, text=""):
+        self._buffer += text
+        table = self._advance(len(self._buffer), final=True)
+        self._buffer = ""
+        self._offset = self._scanned = 0
+        return table
+
+    def _advance(self, stop, final=False):
+        buffer = self._buffer
+        table = TurnTable("", self.speakers, self._offset)
+        open_turn = self._open
+        if self._scanned == 0:
+            # The buffer starts on a line no label was looked for on yet
+            match = self.first_label.match(buffer, 0, stop)
+            if match:
+                open_turn = (match.lastindex - 1, 0, match.end())
+        for match in self.next_label.finditer(buffer, max(0, self._scanned - 1), stop):
+            if open_turn is not None:
+                # The turn ends before the newline the next label follows
+                self._append(table, buffer, open_turn, match.start())
+            open_turn = (match.lastindex - 1, match.start() + 1, match.end())
+        self._scanned = stop
+        if final and open_turn is not None:
+            self._append(table, buffer, open_turn, len(buffer))
+            open_turn = None
+
+        # Release the text up to the turn still being read
+        release = open_turn[1] if open_turn is not None else stop
+        table.text = buffer[:release]
+        self._buffer = buffer[release:]
+        self._offset += release
+        self._scanned -= release
+        self._open = None
+        if open_turn is not None:
+            speaker_id, start, content_start = open_turn
+            self._open = (speaker_id, start - release, content_start - release)
+        return table
+
+    # Add a turn to ``table``, without the whitespace around its text
+    def _append(self, table, buffer, turn, end):
+        speaker_id, start, content_start = turn
+        while end > content_start and buffer[end - 1].isspace():
+            end -= 1
+        while content_start < end and buffer[content_start].isspace():
+            content_start += 1
+        offset = self._offset
+        table.speaker_ids.append(speaker_id)
+        table.starts.append(offset + start)
+        table.content_starts.append(offset + content_start)
+        table.ends.append(offset + end)
+
+
+# The speaker turns of a whole transcript
+def segment(text, speaker_labels=None):
+    return TurnSegmenter(speaker_labels).close(text)
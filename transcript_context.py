@@ -0,0 +1,337 @@
+"""Per-transcript analysis context shared by every pipeline stage.
+
+A ``TranscriptContext`` is built once per transcript and lazily computes, then
+memoizes, everything the stages derive from the raw text: the lower-cased
+text, the speaker turns (offsets from ``speaker_turns.segment``), the spaCy
+entities and medical terms, and the keyword hits. Each piece is computed at
+most once, on first use.
+
+By default spaCy sees only the first ``MAX_SPACY_CHARS`` characters. A
+``chunked`` context instead parses the whole transcript in windows of at most
+that size, cut at speaker-turn boundaries, and keeps only the entities and
+terms of each window, so memory follows the window size rather than the
+transcript length. Medical terms are always found in the whole transcript:
+beyond the parsed prefix, a tokenizer-only pass feeds the ``medical_terms``
+component.
+
+With a ``turn_cache.TurnCache``, entities, terms and keyword hits are computed
+one speaker turn at a time and cached by the turn's content, so an edited
+transcript only re-processes the turns that changed.
+"""
+from collections import namedtuple
+from functools import cached_property
+from itertools import tee
+
+from keyword_matcher import KeywordHit, KeywordHits, medical_matcher
+from speaker_turns import segment
+
+# Longest text handed to spaCy at once, to avoid memory issues on very long
+# texts: the prefix that is parsed, or the window size in chunked mode
+MAX_SPACY_CHARS = 10000
+
+# spaCy component that tags lexicon terms (see medical_terms.py)
+MEDICAL_TERMS_COMPONENT = "medical_terms"
+
+# spaCy components that produce the entities (DATE/TIME) and medical terms
+# the pipeline reads
+REQUIRED_SPACY_COMPONENTS = ("ner", "entity_ruler", MEDICAL_TERMS_COMPONENT)
+
+Window = namedtuple("Window", ["start", "end", "text"])
+
+Entity = namedtuple("Entity", ["start", "end", "text", "label"])
+
+
+def unused_spacy_components(nlp):
+    # Everything except the entity components and any embedding layer they listen to
+    keep = set(REQUIRED_SPACY_COMPONENTS)
+    for name, component in nlp.pipeline:
+        if keep.intersection(getattr(component, "listening_components", ())):
+            keep.add(name)
+    return [name for name in nlp.pipe_names if name not in keep]
+
+
+# Identifies a spaCy pipeline in turn cache keys
+def spacy_identity(nlp):
+    return f"{nlp.meta.get('lang')}_{nlp.meta.get('name')}-{nlp.meta.get('version')}"
+
+
+# Greedily group consecutive items into runs whose total size stays within
+# ``budget``; an item over budget forms a run of its own
+def pack(items, sizes, budget):
+    group = []
+    total = 0
+    for item, size in zip(items, sizes):
+        if group and total + size > budget:
+            yield group
+            group = []
+            total = 0
+        group.append(item)
+        total += size
+    if group:
+        yield group
+
+
+# Entities of a window's Doc, with offsets into the whole transcript
+def window_entities(window, doc):
+    return [
+        Entity(window.start + ent.start_char, window.start + ent.end_char, ent.text, ent.label_)
+        for ent in doc.ents
+    ]
+
+
+# Entities and medical-term hits of a Doc parsed from ``window``, with offsets
+# into the transcript. The hits are None when the pipeline has no
+# medical_terms component.
+def window_parse(window, doc, nlp, matcher):
+    entities = window_entities(window, doc)
+    if not type(doc).has_extension(MEDICAL_TERMS_COMPONENT) or doc._.medical_terms is None:
+        return entities, None
+    terms = doc._.medical_terms
+    if terms["lexicon"] != matcher.fingerprint:
+        # Parsed while the lexicon was being reloaded; match the run's lexicon
+        terms = nlp.get_pipe(MEDICAL_TERMS_COMPONENT).match(doc, matcher)
+    return entities, [
+        KeywordHit(window.start + start, window.start + end, keyword, category, label, rank)
+        for start, end, keyword, category, label, rank in terms["hits"]
+    ]
+
+
+# Entity or keyword hit tuples moved by ``offset``
+def shifted(items, offset):
+    return [item._replace(start=item.start + offset, end=item.end + offset) for item in items]
+
+
+# Merge the (entities, terms) of consecutive windows; terms are None if any
+# window has none
+def merge_parses(parses):
+    entities = []
+    terms = []
+    for parse_entities, parse_terms in parses:
+        entities.extend(parse_entities)
+        if terms is not None and parse_terms is not None:
+            terms.extend(parse_terms)
+        else:
+            terms = None
+    return entities, terms
+
+
+class TranscriptContext:
+    """Lazily derived views of one transcript, computed once and shared."""
+
+    def __init__(self, text, nlp=None, matcher=None, chunked=False, turn_cache=None, speaker_labels=None):
+        self.text = text
+        self.nlp = nlp
+        self.matcher = matcher if matcher is not None else medical_matcher()
+        self.chunked = chunked
+        self.turn_cache = turn_cache
+        self.speaker_labels = speaker_labels
+
+    # Contexts compare by text so they can key the stage caches
+    def __eq__(self, other):
+        return isinstance(other, TranscriptContext) and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+    @cached_property
+    def lower(self):
+        return self.text.lower()
+
+    # Offsets of every speaker turn, segmented once
+    @cached_property
+    def turns(self):
+        return segment(self.text, self.speaker_labels)
+
+    @cached_property
+    def patient_text(self):
+        return self.turns.joined("Patient")
+
+    @property
+    def spacy_text(self):
+        return self.text[:MAX_SPACY_CHARS]
+
+    # Spans between consecutive speaker-turn starts, covering the whole text
+    def segments(self):
+        starts = sorted({0, *self.turns.starts})
+        return list(zip(starts, starts[1:] + [len(self.text)]))
+
+    # Segments cut to at most MAX_SPACY_CHARS; a longer turn is cut at a space
+    def spacy_spans(self):
+        spans = []
+        for start, end in self.segments():
+            while end - start > MAX_SPACY_CHARS:
+                cut = self.text.rfind(" ", start + 1, start + MAX_SPACY_CHARS)
+                if cut == -1:
+                    cut = start + MAX_SPACY_CHARS
+                spans.append((start, cut))
+                start = cut
+            spans.append((start, end))
+        return spans
+
+    # Windows of at most MAX_SPACY_CHARS covering the whole transcript, cut
+    # where a speaker turn starts
+    def spacy_windows(self):
+        spans = self.spacy_spans()
+        for group in pack(spans, [end - start for start, end in spans], MAX_SPACY_CHARS):
+            start, end = group[0][0], group[-1][1]
+            yield Window(start, end, self.text[start:end])
+
+    @cached_property
+    def doc(self):
+        if self.nlp is None:
+            raise ValueError("TranscriptContext has no spaCy pipeline to parse with")
+        return self.nlp(self.spacy_text, disable=unused_spacy_components(self.nlp))
+
+    # (entities, medical-term hits or None) from the spaCy parse
+    @cached_property
+    def parsed(self):
+        if self.nlp is None:
+            raise ValueError("TranscriptContext has no spaCy pipeline to parse with")
+        if self.turn_cache is not None:
+            entities, terms = self._turn_parse()
+        elif not self.chunked:
+            window = Window(0, len(self.spacy_text), self.spacy_text)
+            entities, terms = window_parse(window, self.doc, self.nlp, self.matcher)
+        else:
+            windows, texts = tee(self.spacy_windows())
+            docs = self.nlp.pipe((window.text for window in texts), disable=unused_spacy_components(self.nlp))
+            return merge_parses(window_parse(window, doc, self.nlp, self.matcher) for window, doc in zip(windows, docs))
+        if terms is not None and not self.chunked and len(self.spacy_text) < len(self.text):
+            terms = self._with_tail_terms(terms)
+        return entities, terms
+
+    @property
+    def entities(self):
+        return self.parsed[0]
+
+    # Medical terms tagged during the parse, or None if the pipeline has no
+    # medical_terms component
+    @cached_property
+    def term_hits(self):
+        terms = self.parsed[1]
+        return None if terms is None else KeywordHits(terms)
+
+    # Windows parsed one turn at a time, reusing the turn cache; without
+    # chunking only the turns within the first MAX_SPACY_CHARS are parsed
+    def _turn_parse(self):
+        limit = len(self.text) if self.chunked else len(self.spacy_text)
+        windows = [
+            Window(start, min(end, limit), self.text[start:min(end, limit)])
+            for start, end in self.spacy_spans()
+            if start < limit
+        ]
+        # Medical terms depend on the lexicon as well as the model
+        identity = f"{spacy_identity(self.nlp)}:{self.matcher.fingerprint}"
+        keys = [self.turn_cache.key("parse", identity, window.text) for window in windows]
+        parses = [self.turn_cache.get(key) for key in keys]
+        missing = [index for index, parse in enumerate(parses) if parse is None]
+        docs = self.nlp.pipe(
+            (windows[index].text for index in missing), disable=unused_spacy_components(self.nlp)
+        )
+        for index, doc in zip(missing, docs):
+            # Cached relative to the turn, so the turn can move within the text
+            text = windows[index].text
+            parses[index] = window_parse(Window(0, len(text), text), doc, self.nlp, self.matcher)
+            self.turn_cache.put(keys[index], parses[index])
+        return merge_parses(
+            (shifted(entities, window.start), None if terms is None else shifted(terms, window.start))
+            for window, (entities, terms) in zip(windows, parses)
+        )
+
+    # Add the medical terms beyond the parsed prefix, found by a tokenizer-only
+    # pass over the rest of the transcript. A term cut off by the end of the
+    # prefix is replaced by the one found in the full word.
+    def _with_tail_terms(self, terms):
+        limit = len(self.spacy_text)
+        tail = self._tokenized_terms(limit)
+        word_cut = self.text[limit - 1].isalnum() and self.text[limit].isalnum()
+        return (
+            [hit for hit in terms if hit.end < limit or not word_cut]
+            + [hit for hit in tail if hit.end > limit]
+        )
+
+    # Medical terms of the turns ending after ``limit``, tagged by the
+    # medical_terms component alone on turn-aligned windows
+    def _tokenized_terms(self, limit=0):
+        spans = [(start, end) for start, end in self.spacy_spans() if end > limit]
+        windows = [
+            Window(group[0][0], group[-1][1], self.text[group[0][0]:group[-1][1]])
+            for group in pack(spans, [end - start for start, end in spans], MAX_SPACY_CHARS)
+        ]
+        disable = [name for name in self.nlp.pipe_names if name != MEDICAL_TERMS_COMPONENT]
+        docs = self.nlp.pipe((window.text for window in windows), disable=disable)
+        return merge_parses(window_parse(window, doc, self.nlp, self.matcher) for window, doc in zip(windows, docs))[1]
+
+    # Medical terms from a tokenizer-only pass, without the entity
+    # components, for a transcript whose entities are reused from another;
+    # None without a pipeline or if it has no medical_terms component
+    @cached_property
+    def tokenized_term_hits(self):
+        if self.nlp is None or MEDICAL_TERMS_COMPONENT not in self.nlp.pipe_names:
+            return None
+        return KeywordHits(self._tokenized_terms())
+
+    @cached_property
+    def keyword_hits(self):
+        if self.turn_cache is None:
+            return self.matcher.scan(self.text, self.lower)
+        # Keywords never span lines, so scanning turn by turn finds the same hits
+        pieces = []
+        for start, end in self.segments():
+            segment = self.text[start:end]
+            key = self.turn_cache.key("keywords", self.matcher.fingerprint, segment)
+            hits = self.turn_cache.get(key)
+            if hits is None:
+                hits = self.matcher.scan(segment)
+                self.turn_cache.put(key, hits)
+            pieces.append((start, hits))
+        return KeywordHits.join(pieces)
+
+    @cached_property
+    def patient_hits(self):
+        return self.keyword_hits.within(self.turns.spans("Patient"))
+
+
+def parse_contexts(contexts, nlp, batch_size=8, n_process=1, chunked=False):
+    # Streams contexts through nlp.pipe, yielding each one with its Doc attached.
+    # nlp.pipe keeps input order, so the read-ahead contexts are paired back
+    # up in the parent process instead of being pickled to the workers.
+    if chunked:
+        yield from _parse_chunked_contexts(contexts, nlp, batch_size, n_process)
+        return
+    to_parse, pending = tee(contexts)
+    docs = nlp.pipe(
+        (context.spacy_text for context in to_parse),
+        batch_size=batch_size,
+        n_process=n_process,
+        disable=unused_spacy_components(nlp)
+    )
+    for doc, context in zip(docs, pending):
+        context.doc = doc
+        yield context
+
+
+def _parse_chunked_contexts(contexts, nlp, batch_size, n_process):
+    # Every window of every context goes through one nlp.pipe stream; each
+    # context is yielded with its merged parse once its last window is done
+    windows = ((context, window) for context in contexts for window in context.spacy_windows())
+    to_parse, pending = tee(windows)
+    docs = nlp.pipe(
+        (window.text for _, window in to_parse),
+        batch_size=batch_size,
+        n_process=n_process,
+        disable=unused_spacy_components(nlp)
+    )
+    current = None
+    parses = []
+    for doc, (context, window) in zip(docs, pending):
+        if context is not current:
+            if current is not None:
+                current.parsed = merge_parses(parses)
+                yield current
+            current = context
+            parses = []
+        parses.append(window_parse(window, doc, nlp, context.matcher))
+    if current is not None:
+        current.parsed = merge_parses(parses)
+        yield current
@@ -0,0 +1,53 @@
+"""In-memory cache of per-turn analysis results for incremental re-analysis.
+
+Editing a transcript usually changes one or two speaker turns. The spaCy
+entities and keyword hits of every turn, and the sentiment of every text
+handed to the model, are cached under a hash of their content, so
+re-analyzing an edited transcript only recomputes what actually changed and
+re-aggregates the rest. Entries are evicted least recently used first.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class TurnCache:
+    """Bounded LRU of per-turn results keyed by (kind, model identity, content hash)."""
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind, identity, text):
+        return kind, identity, hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}